@@ -0,0 +1,82 @@
+#!/usr/bin/python3.9
+# Benchmark and self-test for host_probe.py against loopback addresses.
+# Every address in 127.0.0.0/8 is local on Linux, so a whole /16 of them can be probed without touching the
+# network: with nothing listening on the port every one of them refuses the connection straight away, which
+# measures how fast the prober gets through a big list. A listener on 127.0.0.1 is then probed many times to
+# check connections that succeed, and a listener that never accepts checks the timeouts.
+
+import argparse
+import asyncio
+import socket
+import time
+import host_probe
+
+def free_port():
+    """
+    Return a loopback port with nothing listening on it.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def run(hosts, check, concurrency):
+    """
+    Probe the hosts and return the summary and the seconds taken.
+    """
+    summary = host_probe.Summary()
+    start = time.perf_counter()
+    await host_probe.probe_hosts(hosts, check, concurrency, summary.add)
+    return summary, time.perf_counter() - start
+
+def report(name, summary, seconds, expected):
+    checked = sum(summary.statuses.values())
+    counts = ", ".join(f"{status} {count:,}" for status, count in sorted(summary.statuses.items()))
+    latency = f"{summary.percentile(0.5) * 1000:8.2f} {summary.percentile(0.99) * 1000:8.2f}" if summary.latencies \
+        else f"{'':>8} {'':>8}"
+    check = "ok" if summary.statuses.get(expected) == checked else "UNEXPECTED"
+    print(f"{name:<22} {checked:>8,} {seconds:>8.2f} {checked / seconds:>10,.0f} {latency}  {counts} [{check}]")
+
+async def benchmark(args):
+    print(f"{'test':<22} {'hosts':>8} {'seconds':>8} {'hosts/s':>10} {'p50 ms':>8} {'p99 ms':>8}  statuses")
+
+    # A /16 of loopback addresses with nothing listening
+    closed = free_port()
+    hosts = host_probe.iter_hosts([args.network])
+    summary, seconds = await run(hosts, lambda host: host_probe.tcp_probe(host, closed, args.timeout),
+                                 args.concurrency)
+    report(f"{args.network} closed", summary, seconds, host_probe.REFUSED)
+
+    # A listener that accepts every connection
+    server = await asyncio.start_server(lambda reader, writer: writer.close(), '127.0.0.1', 0, backlog=4096)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        summary, seconds = await run(["127.0.0.1"] * args.connections,
+                                     lambda host: host_probe.tcp_probe(host, port, args.timeout), args.concurrency)
+    report("127.0.0.1 listening", summary, seconds, host_probe.UP)
+
+    # A listener that never accepts: once its backlog is full, new connections get no answer
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(0)
+        port = sock.getsockname()[1]
+        summary, seconds = await run(["127.0.0.1"] * args.stalled, lambda host: host_probe.tcp_probe(host, port, 0.2),
+                                     args.stalled)
+    print(f"{'127.0.0.1 stalled':<22} {args.stalled:>8,} {seconds:>8.2f} {'':>10} {'':>8} {'':>8}  "
+          + ", ".join(f"{status} {count:,}" for status, count in sorted(summary.statuses.items())))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark host_probe.py against loopback addresses.")
+    parser.add_argument('--network', default="127.42.0.0/16", help="Loopback network to probe (default: %(default)s)")
+    parser.add_argument('--connections', type=int, default=20_000,
+                        help="Connections to make to the listener (default: %(default)s)")
+    parser.add_argument('--stalled', type=int, default=50,
+                        help="Connections to make to the listener that never accepts (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=host_probe.CONCURRENCY,
+                        help="Hosts checked at once (default: %(default)s)")
+    parser.add_argument('--timeout', type=float, default=host_probe.TIMEOUT,
+                        help="Seconds to wait for each host (default: %(default)s)")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/python3.9
+# Load test for game_server.py.
+# Starts the server in a subprocess on a free localhost port (or uses --connect host:port) and runs many
+# scripted players against it at once: number guessers that try 1, 2, 3, ... on the easy level, and pairs of
+# Rock Paper Scissors players that play a few random rounds. Reports sessions per second and the latency of
+# each move, measured from sending the move to receiving the server's next prompt. Rock Paper Scissors
+# latencies include waiting for the opponent's move, which the scripted players send straight away.
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+async def read_prompt(reader):
+    """
+    Read lines up to and including the next prompt (a line ending in ':'). Returns the lines, and stops early
+    if the server closes the connection.
+    """
+    lines = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            return lines
+        line = line.decode('utf-8').rstrip("\n")
+        lines.append(line)
+        if line.endswith(':'):
+            return lines
+
+async def answer(writer, reader, text, latencies):
+    """
+    Send an answer and read up to the next prompt, recording how long the server took.
+    """
+    start = time.perf_counter()
+    writer.write(f"{text}\n".encode('utf-8'))
+    await writer.drain()
+    lines = await read_prompt(reader)
+    latencies.append(time.perf_counter() - start)
+    return lines
+
+async def guess_player(host, port, number, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        await read_prompt(reader)
+        await answer(writer, reader, f"guesser{number}", latencies)
+        await answer(writer, reader, "G", latencies)
+        await answer(writer, reader, "E", latencies)
+        for guess in range(1, 11):
+            lines = await answer(writer, reader, str(guess), latencies)
+            if any("correct" in line for line in lines):
+                return True
+        return False
+    finally:
+        writer.close()
+
+async def rps_player(host, port, number, rounds, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        await read_prompt(reader)
+        await answer(writer, reader, f"player{number}", latencies)
+        # The lobby pairs this player with the next to arrive, then asks for the first move
+        lines = await answer(writer, reader, "R", latencies)
+        if not lines or not lines[-1].endswith(':'):
+            return False
+        for played in range(1, rounds + 1):
+            await answer(writer, reader, random.choice("RPS"), latencies)
+            lines = await answer(writer, reader, "yes" if played < rounds else "no", latencies)
+            if not lines or not lines[-1].endswith(':'):
+                return played == rounds
+        return True
+    finally:
+        writer.close()
+
+async def run_load(host, port, sessions, concurrency, game, rounds):
+    """
+    Run sessions scripted players, at most concurrency at a time, and return the results.
+    """
+    latencies = []
+    limit = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def run_one(player):
+        nonlocal failures
+        async with limit:
+            try:
+                if not await player:
+                    failures += 1
+            except (OSError, asyncio.IncompleteReadError):
+                failures += 1
+
+    players = []
+    number = 0
+    while number < sessions:
+        if game == 'guess' or (game == 'both' and number % 4 < 2):
+            players.append(run_one(guess_player(host, port, number, latencies)))
+            number += 1
+        else:
+            # Rock Paper Scissors players start in pairs so every one of them gets an opponent
+            async def pair(first=number):
+                results = await asyncio.gather(rps_player(host, port, first, rounds, latencies),
+                                               rps_player(host, port, first + 1, rounds, latencies))
+                return all(results)
+            players.append(run_one(pair()))
+            number += 2
+    start = time.perf_counter()
+    await asyncio.gather(*players)
+    return number, failures, time.perf_counter() - start, latencies
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def start_server():
+    """
+    Start game_server.py on a free port and return the process and the port it listens on.
+    """
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, 'game_server.py'), '--port', '0'],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Listening on "):
+        process.kill()
+        raise RuntimeError(f"the server didn't start: {line!r}")
+    return process, int(line.rsplit(':', 1)[1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the game server with scripted players.")
+    parser.add_argument('--sessions', type=int, default=2000, help="players to run (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=500,
+                        help="players (or pairs of players) connected at once (default: %(default)s)")
+    parser.add_argument('--game', choices=['guess', 'rps', 'both'], default='both',
+                        help="which game the players play (default: %(default)s)")
+    parser.add_argument('--rounds', type=int, default=3,
+                        help="Rock Paper Scissors rounds per match (default: %(default)s)")
+    parser.add_argument('--connect', help="host:port of a running server instead of starting one")
+    args = parser.parse_args()
+
+    process = None
+    if args.connect:
+        host, port = args.connect.rsplit(':', 1)
+        port = int(port)
+    else:
+        process, port = start_server()
+        host = '127.0.0.1'
+    try:
+        sessions, failures, seconds, latencies = asyncio.run(
+            run_load(host, port, args.sessions, args.concurrency, args.game, args.rounds))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(f"{sessions:,} sessions ({failures} failed) in {seconds:.2f} s: {sessions / seconds:,.0f} sessions/s")
+    if latencies:
+        print(f"{len(latencies):,} moves: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, max {max(latencies) * 1000:.2f} ms")
+
+if __name__ == '__main__':
+    main()
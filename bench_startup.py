@@ -0,0 +1,75 @@
+#!/usr/bin/python3.9
+# Cold-start benchmark for the timetable scripts.
+# Every measurement runs in a fresh interpreter, the same way cron starts the scripts, and reports the median
+# time spent importing modules and building the Google API clients.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+LOAD_SCRIPT = """
+import importlib.util
+spec = importlib.util.spec_from_file_location('script', {path!r})
+module = importlib.util.module_from_spec(spec)
+"""
+
+# name: (setup code, timed code)
+BENCHMARKS = {
+    'import timetable-docs.py': (LOAD_SCRIPT.format(path=os.path.join(HERE, 'timetable-docs.py')),
+                                 "spec.loader.exec_module(module)"),
+    'import timetable-input.py': (LOAD_SCRIPT.format(path=os.path.join(HERE, 'timetable-input.py')),
+                                  "spec.loader.exec_module(module)"),
+    'import googleapiclient.discovery': ("", "import googleapiclient.discovery"),
+    'import google_auth_oauthlib.flow': ("", "import google_auth_oauthlib.flow"),
+    'import google.auth.transport.requests': ("", "import google.auth.transport.requests"),
+    'build docs v1': ("from google.auth.credentials import AnonymousCredentials\n"
+                      "import googleapiclient.discovery, timetable_sync\n"
+                      "creds = AnonymousCredentials()",
+                      "timetable_sync.build_service('docs', 'v1', creds)"),
+    'build calendar v3': ("from google.auth.credentials import AnonymousCredentials\n"
+                          "import googleapiclient.discovery, timetable_sync\n"
+                          "creds = AnonymousCredentials()",
+                          "timetable_sync.build_service('calendar', 'v3', creds)"),
+    'lazy calendar client, unused': ("from google.auth.credentials import AnonymousCredentials\n"
+                                     "import timetable_sync\n"
+                                     "creds = AnonymousCredentials()",
+                                     "timetable_sync.LazyService('calendar', 'v3', creds)"),
+}
+
+TIMER = """
+import sys, time
+sys.path.insert(0, {here!r})
+{setup}
+start = time.perf_counter()
+{timed}
+print((time.perf_counter() - start) * 1000)
+"""
+
+def measure(setup, timed):
+    """
+    Run one benchmark in a fresh interpreter and return the time taken by the timed code in milliseconds.
+    """
+    code = TIMER.format(here=HERE, setup=setup, timed=timed)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=HERE, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import and client build times.")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters per benchmark (default: %(default)s)")
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<40} {'median ms':>10} {'min ms':>10}")
+    for name, (setup, timed) in BENCHMARKS.items():
+        try:
+            times = [measure(setup, timed) for _ in range(args.runs)]
+        except subprocess.CalledProcessError as err:
+            print(f"{name:<40} failed: {err.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{name:<40} {statistics.median(times):>10.1f} {min(times):>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/python3.9
+# Offline benchmark for the timetable sync.
+# Runs main() from timetable-docs.py and timetable-input.py against fake_google.FakeGoogle instead of Google,
+# with synthetic schedules of different sizes, and reports wall time, HTTP round-trips, bytes transferred and
+# parse throughput. Each result is also appended as one JSON line to the output file so runs can be compared.
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+import timetable_sync
+from fake_google import FakeGoogle
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DAYS = ["Mo", "Tu", "We", "Th", "Fr"]
+DOCUMENT_ID = 'BENCHMARKDOC'
+
+def synthetic_schedule(entries, year=None):
+    """
+    Build a pasted roster with the given number of entries.
+    Shifts are spread over the weekdays of one year, with extra shifts on the same day a minute apart.
+    """
+    year = year or datetime.date.today().year
+    dates = [datetime.date(year, 1, 1) + datetime.timedelta(days=n) for n in range(365)]
+    dates = [date for date in dates if date.weekday() < 5]
+    lines = []
+    for n in range(entries):
+        date = dates[n % len(dates)]
+        start = 6 * 60 + n // len(dates)
+        end = start + 8 * 60
+        lines.append(f"{DAYS[date.weekday()]} {date.day}/{date.month}: "
+                     f"{start // 60 % 24:02d}:{start % 60:02d}->{end // 60 % 24:02d}:{end % 60:02d}")
+    return "\n".join(lines) + "\n"
+
+def load_script(name):
+    """
+    Import one of the hyphenated timetable scripts as a module without running it.
+    """
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(HERE, f'{name}.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def use_fake(module, fake):
+    """
+    Point a script and timetable_sync at the fake backend instead of Google.
+    """
+    creds = AnonymousCredentials()
+    module.authenticate_google = lambda *args, **kwargs: creds
+    module.get_docs_url = lambda: f'https://docs.google.com/document/d/{DOCUMENT_ID}/edit'
+    timetable_sync.build_service = lambda name, version, creds: build(name, version, http=fake,
+                                                                      static_discovery=True)
+    timetable_sync.ApiExecutor.new_http = lambda self: fake
+
+def parse_throughput(text):
+    """
+    Return how many roster lines per second iter_schedule parses.
+    """
+    lines = text.splitlines()
+    start = time.perf_counter()
+    for _ in timetable_sync.iter_schedule(lines):
+        pass
+    return len(lines) / (time.perf_counter() - start)
+
+def run(script, entries, latency, error_rate, rate):
+    """
+    Run one script's main() against a fresh fake backend and return the measurements.
+    """
+    text = synthetic_schedule(entries)
+    fake = FakeGoogle(latency=latency, error_rate=error_rate)
+    module = load_script(script)
+    use_fake(module, fake)
+
+    if script == 'timetable-docs':
+        fake.add_document(DOCUMENT_ID, text)
+    stdin = sys.stdin
+    sys.stdin = io.StringIO(text + "\n")
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            module.main([])
+    finally:
+        sys.stdin = stdin
+    wall = time.perf_counter() - start
+
+    return {
+        'script': script,
+        'entries': entries,
+        'latency': latency,
+        'error_rate': error_rate,
+        'rate': rate,
+        'wall_seconds': round(wall, 4),
+        'round_trips': fake.round_trips,
+        'bytes_sent': fake.bytes_sent,
+        'bytes_received': fake.bytes_received,
+        'calls': fake.calls,
+        'events_created': len(fake.work_events()),
+        'parse_lines_per_second': round(parse_throughput(text)),
+    }
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=HERE)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the timetable sync against a local fake Google API.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000],
+                        help="schedule sizes to run (default: %(default)s)")
+    parser.add_argument('--scripts', nargs='+', default=['timetable-docs', 'timetable-input'],
+                        help="scripts to drive (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every HTTP round-trip")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="fraction of API calls that fail with a 503")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="requests per second allowed by the executor's rate limiter; 0 turns it off so only "
+                             "the code is measured (default: %(default)s)")
+    parser.add_argument('--output', default='bench_results.jsonl',
+                        help="file the results are appended to as JSON lines (default: %(default)s)")
+    args = parser.parse_args()
+
+    # Retries and per-call errors are part of what is measured, not something to print
+    logging.disable(logging.CRITICAL)
+    timetable_sync.BACKOFF_BASE = min(timetable_sync.BACKOFF_BASE, args.latency or 0.001)
+    timetable_sync.REQUESTS_PER_SECOND = args.rate or 1e9
+    output = os.path.abspath(args.output)
+    revision = git_revision()
+    timestamp = datetime.datetime.now().isoformat(timespec='seconds')
+
+    print(f"{'script':<16} {'entries':>8} {'wall s':>9} {'round-trips':>12} {'KB sent':>10} {'KB recv':>10} {'lines/s':>10}")
+    cwd = os.getcwd()
+    for script in args.scripts:
+        for entries in args.sizes:
+            # Each run gets an empty directory, so no event index or token from another run is picked up
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)
+                try:
+                    result = run(script, entries, args.latency, args.error_rate, args.rate)
+                finally:
+                    os.chdir(cwd)
+            result.update(timestamp=timestamp, revision=revision)
+            with open(output, 'a') as file:
+                file.write(json.dumps(result) + "\n")
+            print(f"{script:<16} {entries:>8} {result['wall_seconds']:>9.3f} {result['round_trips']:>12} "
+                  f"{result['bytes_sent'] / 1024:>10.1f} {result['bytes_received'] / 1024:>10.1f} "
+                  f"{result['parse_lines_per_second']:>10}")
+
+if __name__ == '__main__':
+    main()
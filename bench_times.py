@@ -0,0 +1,67 @@
+#!/usr/bin/python3.9
+# Benchmark for times_tables.py.
+# Writes the same tables to /dev/null with the per-line print() loop times.py uses and with the block
+# generator in times_tables.py, and reports lines per second for both. The generator's peak memory is
+# measured separately with tracemalloc, to show it doesn't grow with the size of the table.
+
+import argparse
+import os
+import time
+import tracemalloc
+import times_tables
+
+def print_path(stream, tables, multipliers):
+    """
+    The times.py way: one print() per line.
+    """
+    for table in range(tables[0], tables[1] + 1):
+        l = []
+        l.extend(range(multipliers[0], multipliers[1] + 1))
+        for i in l:
+            print("%d x %d = %d" % (i, table, i * table), file=stream)
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+def peak_memory(tables, multipliers):
+    """
+    Return the peak bytes allocated while generating the tables into /dev/null.
+    """
+    with open(os.devnull, 'wb') as stream:
+        tracemalloc.start()
+        try:
+            times_tables.write_tables(stream, tables, multipliers)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare times table generation with times.py's print loop.")
+    parser.add_argument('--sizes', nargs='+', default=["1x12", "12x12", "100x10000", "1000x10000"],
+                        help="tables x multipliers to generate, e.g. 12x12 (default: %(default)s)")
+    parser.add_argument('--print-limit', type=int, default=10_000_000,
+                        help="skip the print loop above this many lines, as it gets slow (default: %(default)s)")
+    args = parser.parse_args()
+
+    print(f"{'size':>12} {'lines':>12} {'print lines/s':>15} {'block lines/s':>15} {'speed-up':>9} {'peak KB':>9}")
+    for size in args.sizes:
+        table_count, multiplier_count = (int(part) for part in size.lower().split('x'))
+        tables, multipliers = (1, table_count), (1, multiplier_count)
+        lines = table_count * multiplier_count
+        with open(os.devnull, 'wb') as stream:
+            block_seconds = timed(times_tables.write_tables, stream, tables, multipliers)
+        print_rate = ''
+        speed_up = ''
+        if lines <= args.print_limit:
+            with open(os.devnull, 'w') as stream:
+                print_seconds = timed(print_path, stream, tables, multipliers)
+            print_rate = f"{lines / print_seconds:,.0f}"
+            speed_up = f"{print_seconds / block_seconds:.1f}x"
+        peak = peak_memory(tables, multipliers)
+        print(f"{size:>12} {lines:>12,} {print_rate:>15} {lines / block_seconds:>15,.0f} {speed_up:>9} "
+              f"{peak / 1024:>9,.0f}")
+
+if __name__ == '__main__':
+    main()
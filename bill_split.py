@@ -0,0 +1,463 @@
+#!/usr/bin/python3.9
+# Bulk bill splitting for moo.py.
+# Reads bills from a CSV or JSONL file, one bill per row, and works out who owes whom in each group. Amounts
+# are kept as whole cents, so every bill is split exactly: each person's share is the amount divided by the
+# number of people, and the cents left over go one each to the next people in line, starting at a position
+# that moves along with every bill so the same person doesn't always pay the extra cent. Bills are streamed
+# in chunks. With --numpy each chunk is split with array arithmetic, and chunks of clean rows are checked a
+# column at a time rather than row by row. At the end every group's balances are settled with as few
+# transfers as possible.
+#
+# CSV rows are group,payer,amount,participants with participants separated by ';', for example
+#   flat,alex,100.00,alex;sam;jo
+# and JSONL rows are objects like {"group": "flat", "payer": "alex", "amount": "100.00", "participants": [...]}.
+#
+# Run it directly, or through moo.py: python3 moo.py bills.csv --numpy
+
+import argparse
+import csv
+import heapq
+import itertools
+import json
+import logging
+import operator
+import os
+import re
+import sys
+import time
+
+# Global variables
+CHUNK_SIZE = 100_000  # Bills split per chunk
+AMOUNT_PATTERN = re.compile(r'^\s*\$?(\d+)(?:\.(\d{1,2}))?\s*$')
+# Whole columns of a chunk, one value per line, that the NumPy path can take as they are. Amounts are limited
+# to 13 digits of dollars so they convert to cents exactly through float64.
+AMOUNTS = re.compile(r'(?:\$?\d{1,13}(?:\.\d{1,2})?\n)*\$?\d{1,13}(?:\.\d{1,2})?')
+SPACES = re.compile(r'[^\S\n]')
+EDGE_SPACES = re.compile(r'^[^\S\n]|[^\S\n]$', re.MULTILINE)
+EXACT_SETTLE_LIMIT = 8  # Groups with up to this many unsettled people get the provably smallest set of transfers
+
+def parse_amount(text):
+    """
+    Convert an amount like "12.5", "12.50" or "$12" to whole cents. Raises ValueError for anything else,
+    including negative amounts and fractions of a cent.
+    """
+    match = AMOUNT_PATTERN.match(str(text))
+    if match is None:
+        raise ValueError(f"'{text}' is not an amount in dollars and cents")
+    return int(match.group(1)) * 100 + int((match.group(2) or '0').ljust(2, '0'))
+
+def format_cents(cents):
+    sign = '-' if cents < 0 else ''
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+def make_bill(group, payer, amount, participants):
+    """
+    Check one bill and return it as (group, payer, cents, participants). People listed twice are only counted
+    once. Raises ValueError if the bill can't be split.
+    """
+    participants = list(dict.fromkeys(person.strip() for person in participants if person.strip()))
+    if not str(group).strip() or not str(payer).strip():
+        raise ValueError("the group and payer are required")
+    if not participants:
+        raise ValueError("nobody to split the bill between")
+    return str(group).strip(), str(payer).strip(), parse_amount(amount), participants
+
+def parse_csv_record(row):
+    """
+    Read a bill from a CSV row of group,payer,amount,participants.
+    """
+    if len(row) < 4:
+        raise ValueError("expected group, payer, amount and participants")
+    return make_bill(row[0], row[1], row[2], row[3].split(';'))
+
+def parse_jsonl_record(line):
+    """
+    Read a bill from a JSON line with group, payer, amount and participants keys. The participants can be a
+    list of names or a ';'-separated string.
+    """
+    bill = json.loads(line)
+    if not isinstance(bill, dict):
+        raise ValueError("expected a JSON object")
+    missing = [key for key in ('group', 'payer', 'amount', 'participants') if key not in bill]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    participants = bill['participants']
+    if isinstance(participants, str):
+        participants = participants.split(';')
+    if not isinstance(participants, list) or not all(isinstance(person, str) for person in participants):
+        raise ValueError("participants must be a list of names or names separated by ';'")
+    return make_bill(bill['group'], bill['payer'], bill['amount'], participants)
+
+def iter_record_chunks(stream, file_format, size):
+    """
+    Yield (row numbers, records) for chunks of up to size rows that aren't blank. A record is a list of fields
+    for CSV, or the line for JSONL. A CSV header row is skipped, and a row of empty fields is left for
+    parse_records() to report.
+    """
+    rows = stream if file_format == 'jsonl' else csv.reader(stream)
+    number = 1
+    while True:
+        records = list(itertools.islice(rows, size))
+        if not records:
+            return
+        numbers = range(number, number + len(records))
+        number += len(records)
+        blank = not all(map(str.strip, records)) if file_format == 'jsonl' else not all(records)
+        if blank:
+            kept = [(row_number, record) for row_number, record in zip(numbers, records)
+                    if (record.strip() if file_format == 'jsonl' else record)]
+            numbers = [row_number for row_number, _ in kept]
+            records = [record for _, record in kept]
+        if file_format == 'csv' and numbers and numbers[0] == 1 and records[0][0].strip().lower() == 'group':
+            numbers, records = numbers[1:], records[1:]
+        if records:
+            yield numbers, records
+
+def parse_records(numbers, records, file_format):
+    """
+    Parse a chunk of records into bills one at a time, logging and skipping the ones that can't be split.
+    """
+    parse = parse_jsonl_record if file_format == 'jsonl' else parse_csv_record
+    bills = []
+    for number, record in zip(numbers, records):
+        try:
+            bills.append(parse(record))
+        except ValueError as e:
+            if file_format == 'jsonl':
+                logging.error(f"Skipping line {number}. Error: {e}")
+            else:
+                logging.error(f"Skipping row {number}: {','.join(record)}. Error: {e}")
+    return bills
+
+def clean_names(text):
+    """
+    Return True if none of the names in text, one per line, is empty or has spaces at either end.
+    """
+    if not text or text[0] == "\n" or text[-1] == "\n" or "\n\n" in text:
+        return False
+    return not SPACES.search(text) or not EDGE_SPACES.search(text)
+
+def clean_columns(records, file_format):
+    """
+    Return a chunk of records as lists of groups, payers, amounts and ';'-separated participants, or None if
+    any record needs the care of parse_records(): spaces around a name, empty names, amounts with spaces or
+    too many digits, missing fields and so on. Rather than checking the records one at a time, each column is
+    joined into one string and checked with a single regular expression.
+    """
+    try:
+        if file_format == 'jsonl':
+            bills = json.loads("[" + ",".join(records) + "]")
+            rows = list(map(operator.itemgetter('group', 'payer', 'amount', 'participants'), bills))
+            groups, payers, amounts, people = (list(column) for column in zip(*rows))
+            lists = [participants for participants in people if not isinstance(participants, str)]
+            if lists:
+                # Participants given as a list are joined with ';', which mustn't be in their names
+                if ';' in "".join(itertools.chain.from_iterable(lists)):
+                    return None
+                people = [text if isinstance(text, str) else ';'.join(text) for text in people]
+        else:
+            if any(len(row) != 4 for row in records):
+                return None
+            groups, payers, amounts, people = (list(column) for column in zip(*records))
+        names = "\n".join(groups + payers)
+        amount_text = "\n".join(amounts)
+        participants = "\n".join(people)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    if len(groups) != len(records) or amount_text.count("\n") != len(amounts) - 1:
+        return None
+    if not clean_names(names) or not clean_names(participants.replace(';', "\n")):
+        return None
+    if not AMOUNTS.fullmatch(amount_text):
+        return None
+    return groups, payers, amounts, people
+
+def record_columns(numbers, records, file_format):
+    """
+    Return a chunk of records as the columns Ledger.add_numpy() takes. Clean chunks have their amounts
+    converted as one array, and any other chunk is parsed one record at a time.
+    """
+    import numpy as np
+    columns = clean_columns(records, file_format)
+    if columns is None:
+        bills = parse_records(numbers, records, file_format)
+        return ([bill[0] for bill in bills], [bill[1] for bill in bills],
+                np.array([bill[2] for bill in bills], dtype=np.int64), [len(bill[3]) for bill in bills],
+                [name for bill in bills for name in bill[3]])
+    groups, payers, amounts, people = columns
+    amounts = np.array([amount.lstrip('$') for amount in amounts], dtype=np.float64)
+    cents = np.rint(amounts * 100).astype(np.int64)
+    return groups, payers, cents, [text.count(';') + 1 for text in people], ';'.join(people).split(';')
+
+def intern_codes(table, values):
+    """
+    Return the codes of values as an int64 array, giving new values the next codes in table.
+    """
+    import numpy as np
+    codes = list(map(table.get, values))
+    if None in codes:
+        codes = [table.setdefault(value, len(table)) if code is None else code for value, code in zip(values, codes)]
+    return np.array(codes, dtype=np.int64)
+
+def split_cents(cents, count, start):
+    """
+    Split cents between count people. Everyone gets cents // count, and the remaining cents go one each to the
+    people at positions start, start + 1, ... wrapping around.
+    """
+    share, remainder = divmod(cents, count)
+    return [share + ((position - start) % count < remainder) for position in range(count)]
+
+class Ledger:
+    """
+    Running balances in cents, positive for people who are owed money, kept per group.
+    People are numbered as they first appear, so the NumPy path can keep all balances in one array.
+    """
+
+    def __init__(self):
+        self.people = {}  # (group, person) -> number
+        self.balances = []  # Balance of each numbered person, for the plain Python path
+        self.array = None  # The same for the NumPy path
+        self.bills = 0  # Bills split so far, which also decides where each bill's leftover cents start
+        self.group_codes = {}  # Group -> code, for the NumPy path
+        self.name_codes = {}  # Name -> code
+        self.pair_numbers = {}  # Group code << 32 | name code -> number
+
+    def person(self, group, name):
+        number = self.people.get((group, name))
+        if number is None:
+            number = self.people[(group, name)] = len(self.people)
+            self.balances.append(0)
+        return number
+
+    def add(self, bills):
+        """
+        Split a chunk of bills one at a time.
+        """
+        for group, payer, cents, participants in bills:
+            self.balances[self.person(group, payer)] += cents
+            shares = split_cents(cents, len(participants), self.bills % len(participants))
+            for name, share in zip(participants, shares):
+                self.balances[self.person(group, name)] -= share
+            self.bills += 1
+
+    def numbers(self, group_codes, names, groups, bill_of=None):
+        """
+        Return the numbers of people as an array, numbering the ones not seen before. Entry i is names[i] in the
+        group with code group_codes[i], which is groups[i], or groups[bill_of[i]] when bill_of is given.
+        Names are coded like groups, so the distinct people of the chunk can be found by sorting integers, and
+        only those are looked up.
+        """
+        import numpy as np
+        name_codes = intern_codes(self.name_codes, names)
+        keys, first, inverse = np.unique(group_codes << 32 | name_codes, return_index=True, return_inverse=True)
+        numbers = [self.pair_numbers.get(key) for key in keys.tolist()]
+        for index, number in enumerate(numbers):
+            if number is None:
+                position = int(first[index])
+                group = groups[position if bill_of is None else int(bill_of[position])]
+                numbers[index] = self.pair_numbers[int(keys[index])] = self.person(group, names[position])
+        return np.array(numbers, dtype=np.int64)[inverse]
+
+    def add_numpy(self, groups, payers, cents, counts, names):
+        """
+        Split a chunk of bills with NumPy, giving the same shares as add(). The bills come as the columns
+        record_columns() returns: groups, payers, cents and participant counts have one entry per bill, and
+        names holds each bill's participants one after the other.
+        Every participant of every bill becomes one entry of a flat array, and the payments and shares are
+        summed per person with bincount. Its float64 sums are exact below 2**53 cents.
+        """
+        import numpy as np
+        if not groups:
+            return
+        counts = np.asarray(counts, dtype=np.int64)
+        bill_of = np.repeat(np.arange(len(groups)), counts)
+        group_codes = intern_codes(self.group_codes, groups)
+        payers = self.numbers(group_codes, payers, groups)
+        people = self.numbers(group_codes[bill_of], names, groups, bill_of)
+        # People listed twice in a bill only count once, where they were first listed
+        first = np.unique(bill_of * len(self.people) + people, return_index=True)[1]
+        if len(first) < len(people):
+            first.sort()
+            people, bill_of = people[first], bill_of[first]
+            counts = np.bincount(bill_of, minlength=len(groups))
+
+        starts = np.arange(self.bills, self.bills + len(groups)) % counts
+        shares, remainders = np.divmod(cents, counts)
+        positions = np.arange(len(people)) - np.repeat(np.cumsum(counts) - counts, counts)
+        owed = shares[bill_of] + ((positions - starts[bill_of]) % counts[bill_of] < remainders[bill_of])
+
+        size = len(self.people)
+        if self.array is None:
+            self.array = np.zeros(size, dtype=np.int64)
+        elif len(self.array) < size:
+            self.array = np.concatenate([self.array, np.zeros(size - len(self.array), dtype=np.int64)])
+        paid = np.bincount(payers, weights=cents, minlength=size)
+        spent = np.bincount(people, weights=owed, minlength=size)
+        self.array += np.rint(paid - spent).astype(np.int64)
+        self.bills += len(groups)
+
+    def group_balances(self):
+        """
+        Return {group: {person: cents}} with everyone whose balance isn't zero.
+        """
+        balances = self.balances if self.array is None else self.array.tolist()
+        groups = {}
+        for (group, name), number in self.people.items():
+            groups.setdefault(group, {})
+            if balances[number]:
+                groups[group][name] = balances[number]
+        return groups
+
+def settle_greedy(balances):
+    """
+    Settle balances by repeatedly having the biggest debtor pay the biggest creditor.
+    Returns (debtor, creditor, cents) transfers, at most one fewer than the number of people.
+    """
+    debtors = [(cents, name) for name, cents in balances.items() if cents < 0]
+    creditors = [(-cents, name) for name, cents in balances.items() if cents > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+    transfers = []
+    while debtors and creditors:
+        debt, debtor = heapq.heappop(debtors)
+        credit, creditor = heapq.heappop(creditors)
+        amount = min(-debt, -credit)
+        transfers.append((debtor, creditor, amount))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+    return transfers
+
+def zero_sum_groups(names, balances):
+    """
+    Split people into as many groups with balances summing to zero as possible, using a dynamic program over
+    subsets. Each such group of k people settles in k - 1 transfers, so more groups means fewer transfers.
+    """
+    count = len(names)
+    full = (1 << count) - 1
+    sums = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        lowest = (mask & -mask).bit_length() - 1
+        sums[mask] = sums[mask & (mask - 1)] + balances[names[lowest]]
+    # best[mask] is the most zero-sum groups the people in mask can be split into, when sums[mask] == 0
+    best = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        if sums[mask] != 0:
+            continue
+        best[mask] = 1
+        # Try every zero-sum part containing the lowest person, and split the rest further
+        lowest = mask & -mask
+        rest = mask ^ lowest
+        part = rest
+        while True:
+            remainder = rest & ~part
+            if remainder and sums[remainder] == 0 and best[remainder] + 1 > best[mask]:
+                best[mask] = best[remainder] + 1
+            if part == 0:
+                break
+            part = (part - 1) & rest
+    groups = []
+    mask = full
+    while mask:
+        lowest = mask & -mask
+        rest = mask ^ lowest
+        part = rest
+        chosen = mask
+        while True:
+            remainder = rest & ~part
+            if remainder and sums[remainder] == 0 and best[remainder] + 1 == best[mask]:
+                chosen = mask ^ remainder
+                break
+            if part == 0:
+                break
+            part = (part - 1) & rest
+        groups.append([names[i] for i in range(count) if chosen >> i & 1])
+        mask ^= chosen
+    return groups
+
+def settle(balances):
+    """
+    Work out transfers that settle a group's balances.
+    Finding the fewest transfers means finding the most subsets of people whose balances cancel out, which
+    is only practical for small groups: up to EXACT_SETTLE_LIMIT unsettled people this is done exactly and
+    each subset settled greedily. Bigger groups settle pairs with exactly opposite balances first and the
+    rest greedily.
+    """
+    balances = {name: cents for name, cents in balances.items() if cents}
+    if len(balances) <= EXACT_SETTLE_LIMIT:
+        transfers = []
+        for part in zero_sum_groups(sorted(balances), balances):
+            transfers += settle_greedy({name: balances[name] for name in part})
+        return transfers
+    transfers = []
+    creditors = {}
+    for name, cents in sorted(balances.items()):
+        if cents > 0:
+            creditors.setdefault(cents, []).append(name)
+    for name, cents in sorted(balances.items()):
+        if cents < 0 and creditors.get(-cents):
+            creditor = creditors[-cents].pop()
+            transfers.append((name, creditor, -cents))
+            balances[name] = balances[creditor] = 0
+    return transfers + settle_greedy(balances)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Split bills exactly and settle who owes whom.")
+    parser.add_argument('file', help="CSV or JSONL file of bills, or - for standard input")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format (default: from the file name)")
+    parser.add_argument('--numpy', action='store_true', help="Split each chunk of bills with NumPy")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Bills per chunk (default: %(default)s)")
+    parser.add_argument('--output', help="Write the transfers as CSV (group,from,to,amount) to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Split a file of bills and print the settlements and throughput.
+    """
+    args = parse_args(argv)
+    file_format = args.format or ('jsonl' if args.file.lower().endswith(('.jsonl', '.json')) else 'csv')
+    if args.file != '-' and not os.path.isfile(args.file):
+        print(f"File '{args.file}' doesn't exist.")
+        return
+    if args.numpy:
+        try:
+            import numpy
+        except ImportError:
+            print("Error: --numpy needs NumPy installed")
+            return
+
+    start = time.perf_counter()
+    ledger = Ledger()
+    stream = sys.stdin if args.file == '-' else open(args.file, 'r', newline='')
+    try:
+        for numbers, records in iter_record_chunks(stream, file_format, max(args.chunk_size, 1)):
+            if args.numpy:
+                ledger.add_numpy(*record_columns(numbers, records, file_format))
+            else:
+                ledger.add(parse_records(numbers, records, file_format))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    split_seconds = time.perf_counter() - start
+
+    settlements = {group: settle(balances) for group, balances in sorted(ledger.group_balances().items())}
+    seconds = time.perf_counter() - start
+    transfers = sum(len(group_transfers) for group_transfers in settlements.values())
+
+    if args.output:
+        with open(args.output, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['group', 'from', 'to', 'amount'])
+            for group, group_transfers in settlements.items():
+                for debtor, creditor, cents in group_transfers:
+                    writer.writerow([group, debtor, creditor, format_cents(cents)])
+    else:
+        for group, group_transfers in settlements.items():
+            for debtor, creditor, cents in group_transfers:
+                print(f"{group}: {debtor} pays {creditor} {format_cents(cents)}")
+    print(f"{ledger.bills:,} bills in {len(settlements):,} groups settled with {transfers:,} transfers "
+          f"in {seconds:.2f} s ({ledger.bills / max(split_seconds, 1e-9):,.0f} rows/s split)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
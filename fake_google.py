@@ -0,0 +1,238 @@
+# A local stand-in for the Google Docs and Calendar REST endpoints.
+# FakeGoogle looks like an httplib2.Http object, so services built with build(..., http=fake)
+# talk to it instead of Google. It counts round-trips and bytes, and can inject latency and errors.
+
+import datetime
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.parse
+from email.parser import FeedParser
+import httplib2
+
+CALENDAR_PREFIX = '/calendar/v3/calendars/'
+DOCS_PREFIX = '/v1/documents/'
+PAGE_SIZE = 250
+
+def parse_time(value):
+    """
+    Parse an RFC 3339 timestamp into a naive datetime, ignoring the UTC offset.
+    """
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')[:19])
+
+class FakeGoogle:
+    """
+    In-memory Docs and Calendar backend that implements the httplib2.Http request() interface.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calendars = {}
+        self.changes = {}
+        self.documents = {}
+        self.ids = itertools.count(1)
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.calls = {}
+
+    def add_document(self, document_id, text):
+        self.documents[document_id] = {'text': text, 'revision': 1}
+
+    def add_event(self, calendar_id, summary, start, end):
+        body = {'summary': summary,
+                'start': {'dateTime': start.isoformat()},
+                'end': {'dateTime': end.isoformat()}}
+        return self._insert_event(calendar_id, body)[1]
+
+    def document_text(self, document_id):
+        return self.documents[document_id]['text']
+
+    def work_events(self, calendar_id='primary'):
+        events = self.calendars.get(calendar_id, {}).values()
+        return sorted((parse_time(e['start']['dateTime']), parse_time(e['end']['dateTime']))
+                      for e in events if e['status'] != 'cancelled' and e.get('summary') == 'Work')
+
+    # httplib2.Http interface
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        parsed = urllib.parse.urlparse(uri)
+        with self.lock:
+            self.round_trips += 1
+            self.bytes_sent += len(uri) + len(body or b'')
+            if parsed.path.startswith('/batch/'):
+                status, content_type, content = self._batch(headers, body)
+            else:
+                status, payload = self._call(method, parsed.path, parsed.query, body)
+                content_type, content = 'application/json', json.dumps(payload).encode('utf-8')
+            self.bytes_received += len(content)
+        response = httplib2.Response({'status': status, 'content-type': content_type})
+        return response, content
+
+    def close(self):
+        pass
+
+    # Request dispatch
+
+    def _call(self, method, path, query, body):
+        params = dict(urllib.parse.parse_qsl(query))
+        data = json.loads(body) if body else {}
+        name = self._method_name(method, path)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.error_rate and self.random.random() < self.error_rate:
+            return 503, {'error': {'code': 503, 'message': 'Backend Error'}}
+        if path.startswith(CALENDAR_PREFIX):
+            parts = [urllib.parse.unquote(p) for p in path[len(CALENDAR_PREFIX):].split('/')]
+            calendar_id = parts[0]
+            if len(parts) == 2 and method == 'GET':
+                return self._list_events(calendar_id, params)
+            if len(parts) == 2 and method == 'POST':
+                return self._insert_event(calendar_id, data)
+            if len(parts) == 3 and method == 'PATCH':
+                return self._patch_event(calendar_id, parts[2], data)
+            if len(parts) == 3 and method == 'DELETE':
+                return self._delete_event(calendar_id, parts[2])
+        elif path.startswith(DOCS_PREFIX):
+            document_id = urllib.parse.unquote(path[len(DOCS_PREFIX):])
+            if document_id.endswith(':batchUpdate') and method == 'POST':
+                return self._batch_update(document_id[:-len(':batchUpdate')], data)
+            if method == 'GET':
+                return self._get_document(document_id)
+        return 404, {'error': {'code': 404, 'message': f'No fake for {method} {path}'}}
+
+    def _method_name(self, method, path):
+        if path.startswith(CALENDAR_PREFIX):
+            depth = path[len(CALENDAR_PREFIX):].count('/')
+            names = {('GET', 1): 'events.list', ('POST', 1): 'events.insert',
+                     ('PATCH', 2): 'events.patch', ('DELETE', 2): 'events.delete'}
+            return names.get((method, depth), 'calendar.unknown')
+        if path.startswith(DOCS_PREFIX):
+            return 'documents.batchUpdate' if path.endswith(':batchUpdate') else 'documents.get'
+        return 'unknown'
+
+    def _batch(self, headers, body):
+        content_type = {k.lower(): v for k, v in (headers or {}).items()}['content-type']
+        parser = FeedParser()
+        parser.feed(f'content-type: {content_type}\r\n\r\n' + body.decode('utf-8'))
+        message = parser.close()
+        boundary = 'fake_google_batch_boundary'
+        out = []
+        for part in message.get_payload():
+            request_line, rest = part.get_payload().split('\n', 1)
+            method, target, _ = request_line.split(' ', 2)
+            request_body = rest.split('\n\n', 1)[1] if '\n\n' in rest else ''
+            parsed = urllib.parse.urlparse(target)
+            status, payload = self._call(method, parsed.path, parsed.query, request_body.encode('utf-8') or None)
+            content_id = part['Content-ID'].replace('<', '<response-', 1)
+            payload_text = json.dumps(payload) if payload is not None else ''
+            out.append(f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n'
+                       f'HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{payload_text}\r\n')
+        out.append(f'--{boundary}--\r\n')
+        return 200, f'multipart/mixed; boundary={boundary}', ''.join(out).encode('utf-8')
+
+    # Calendar
+
+    def _record_change(self, calendar_id, event):
+        log = self.changes.setdefault(calendar_id, [])
+        log.append(event['id'])
+
+    def _list_events(self, calendar_id, params):
+        events = self.calendars.get(calendar_id, {})
+        log = self.changes.get(calendar_id, [])
+        if 'syncToken' in params:
+            position = int(params['syncToken'])
+            if position > len(log):
+                return 410, {'error': {'code': 410, 'message': 'Sync token is no longer valid'}}
+            changed = list(dict.fromkeys(log[position:]))
+            items = [events[event_id] for event_id in changed]
+        else:
+            items = [e for e in events.values() if e['status'] != 'cancelled' or params.get('showDeleted') == 'true']
+            if 'timeMin' in params:
+                items = [e for e in items if parse_time(e['end']['dateTime']) > parse_time(params['timeMin'])]
+            if 'timeMax' in params:
+                items = [e for e in items if parse_time(e['start']['dateTime']) < parse_time(params['timeMax'])]
+            if 'q' in params:
+                items = [e for e in items if params['q'].lower() in e.get('summary', '').lower()]
+            items.sort(key=lambda e: e['start']['dateTime'])
+        offset = int(params.get('pageToken', 0))
+        page_size = int(params.get('maxResults', PAGE_SIZE))
+        result = {'items': items[offset:offset + page_size]}
+        if offset + page_size < len(items):
+            result['nextPageToken'] = str(offset + page_size)
+        else:
+            result['nextSyncToken'] = str(len(log))
+        return 200, result
+
+    def _insert_event(self, calendar_id, body):
+        events = self.calendars.setdefault(calendar_id, {})
+        event_id = body.get('id') or f'fake{next(self.ids)}'
+        if event_id in events:
+            return 409, {'error': {'code': 409, 'message': 'The requested identifier already exists.'}}
+        event = dict(body, id=event_id, status='confirmed')
+        events[event_id] = event
+        self._record_change(calendar_id, event)
+        return 200, event
+
+    def _patch_event(self, calendar_id, event_id, body):
+        event = self.calendars.get(calendar_id, {}).get(event_id)
+        if event is None:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+        event.update(body)
+        event.setdefault('status', 'confirmed')
+        self._record_change(calendar_id, event)
+        return 200, event
+
+    def _delete_event(self, calendar_id, event_id):
+        event = self.calendars.get(calendar_id, {}).get(event_id)
+        if event is None or event['status'] == 'cancelled':
+            return 410, {'error': {'code': 410, 'message': 'Resource has been deleted'}}
+        event['status'] = 'cancelled'
+        self._record_change(calendar_id, event)
+        return 204, None
+
+    # Docs
+
+    def _get_document(self, document_id):
+        document = self.documents.get(document_id)
+        if document is None:
+            return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+        content = [{'endIndex': 1, 'sectionBreak': {}}]
+        index = 1
+        for line in document['text'].splitlines(keepends=True) or ['\n']:
+            if not line.endswith('\n'):
+                line += '\n'
+            content.append({'startIndex': index, 'endIndex': index + len(line),
+                            'paragraph': {'elements': [{'startIndex': index, 'endIndex': index + len(line),
+                                                        'textRun': {'content': line, 'textStyle': {}}}]}})
+            index += len(line)
+        return 200, {'documentId': document_id, 'revisionId': str(document['revision']),
+                     'title': 'Timetable', 'body': {'content': content}}
+
+    def _batch_update(self, document_id, data):
+        document = self.documents.get(document_id)
+        if document is None:
+            return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+        required = data.get('writeControl', {}).get('requiredRevisionId')
+        if required is not None and required != str(document['revision']):
+            return 400, {'error': {'code': 400, 'message': 'The required revision ID does not match.'}}
+        text = document['text']
+        for request in data.get('requests', []):
+            if 'deleteContentRange' in request:
+                r = request['deleteContentRange']['range']
+                text = text[:r['startIndex'] - 1] + text[r['endIndex'] - 1:]
+            elif 'insertText' in request:
+                i = request['insertText']['location']['index'] - 1
+                text = text[:i] + request['insertText']['text'] + text[i:]
+        document['text'] = text
+        document['revision'] += 1
+        return 200, {'documentId': document_id, 'replies': [{} for _ in data.get('requests', [])],
+                     'writeControl': {'requiredRevisionId': str(document['revision'])}}
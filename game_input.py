@@ -0,0 +1,108 @@
+#!/usr/bin/python3.9
+# Shared input handling for the games.
+# getT, getN and getC used to be copied into guess.py, guessing.py, rps.py and times.py, each calling input()
+# directly and compiling its regular expression again on every answer. They live here now, with the patterns
+# compiled once, and game_server.py checks answers with the same patterns.
+# Answers come from the current input source: the keyboard by default, or any iterable of lines, such as a
+# list, an open file or the answers of a recorded session, which is how game_replay.py runs sessions
+# through the games without anyone typing. pause() only waits when a person is playing.
+
+import re
+import sys
+import time
+
+# Global variables
+MAX_ERRORS = 3  # Invalid answers before the game gives up on the player
+NAME_PATTERN = re.compile(r'[a-zA-Z]')  # A name needs at least one letter
+NUMBER_PATTERN = re.compile(r'^\d+$')
+CHOICE_PATTERN = re.compile(r'^[RPS]$', re.IGNORECASE)
+LEVEL_PATTERN = re.compile(r'^[EH]$', re.IGNORECASE)
+GAME_PATTERN = re.compile(r'^[RG]$', re.IGNORECASE)
+YES_PATTERN = re.compile(r'^Y(ES)?$', re.IGNORECASE)
+NAME_COMPLAINT = "Not a valid name."
+NUMBER_COMPLAINT = "That's not a number."
+CHOICE_COMPLAINT = "Only enter R, P or S."
+GIVE_UP = "You are an idiot."
+
+class KeyboardSource:
+    """
+    Answers typed by the player.
+    """
+    interactive = True
+
+    def read(self, prompt):
+        return input(prompt)
+
+class LineSource:
+    """
+    Answers taken in turn from an iterable of lines. Each prompt is printed with its answer after it, so the
+    output reads like the session did on screen. Raises EOFError when the answers run out, as input() does at
+    the end of a file.
+    """
+    interactive = False
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+
+    def read(self, prompt):
+        line = next(self.lines, None)
+        if line is None:
+            raise EOFError("ran out of answers")
+        line = line.rstrip("\r\n")
+        sys.stdout.write(f"{prompt}{line}\n")
+        return line
+
+# Where answers come from, changed with use()
+source = KeyboardSource()
+
+def use(new_source):
+    """
+    Take answers from new_source from now on, and return the source used until now.
+    """
+    global source
+    old_source, source = source, new_source
+    return old_source
+
+def ask(text):
+    return source.read(text)
+
+def pause(seconds):
+    # Give the player time to read, but don't hold up scripted sessions
+    if source.interactive:
+        time.sleep(seconds)
+
+def ask_until(text, valid, complaint=None, limit=None):
+    """
+    Ask until valid(answer) is true, printing complaint after each invalid answer.
+    After limit invalid answers the game ends, as the games' exit() after three errors did.
+    """
+    errors = 0
+    answer = ask(text)
+    while not valid(answer):
+        if complaint:
+            print(complaint)
+        errors += 1
+        if limit is not None and errors == limit:
+            print(GIVE_UP)
+            sys.exit()
+        answer = ask(text)
+    return answer
+
+# Validate text input, make sure the name has a letter in it at least
+def getT(text):
+    return ask_until(text, NAME_PATTERN.search, NAME_COMPLAINT, MAX_ERRORS)
+
+# Validate number input, optionally between low and high
+def getN(text, low=None, high=None, complaint=NUMBER_COMPLAINT):
+    def valid(answer):
+        if not NUMBER_PATTERN.search(answer):
+            return False
+        number = int(answer)
+        return (low is None or number >= low) and (high is None or number <= high)
+
+    return int(ask_until(text, valid, complaint, MAX_ERRORS))
+
+# Get choice and do some validation
+def getC():
+    print("Please choose:\n[R]ock\n[P]aper\n[S]cissors")
+    return ask_until(": ", CHOICE_PATTERN.search, CHOICE_COMPLAINT).upper()
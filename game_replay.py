@@ -0,0 +1,304 @@
+#!/usr/bin/python3.9
+# Recorded sessions for the games, replayed in-process for regression and load tests.
+# A session is the game it was played on, the random seed, every answer given and everything the game
+# printed. Sessions are stored one per line in a JSONL transcript file. They are recorded by playing a game
+# ("record"), or made up by scripted players that try valid and invalid answers ("generate"), and "replay"
+# runs them through the games again and reports any session whose output has changed.
+# Each game script is compiled once and run with exec() for every session, with its answers fed in through
+# game_input.py and its output captured, so the real game code runs without a terminal, a subprocess or any
+# sleeping, and thousands of sessions go through per second.
+#
+# Record a session: python3 game_replay.py record guess sessions.jsonl
+# Make up 10000 sessions: python3 game_replay.py generate rps sessions.jsonl --sessions 10000
+# Replay them: python3 game_replay.py replay sessions.jsonl
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+import game_input
+
+# Global variables
+HERE = os.path.dirname(os.path.abspath(__file__))
+GAMES = {'guess': 'guess.py', 'guessing': 'guessing.py', 'rps': 'rps.py', 'times': 'times.py'}
+FINISHED = 'finished'  # How a session ends when the game stops by itself
+RAN_OUT = 'ran out of answers'
+compiled = {}  # Game -> code object of its script
+
+class Transcript:
+    """
+    One recorded session.
+    """
+    __slots__ = ('game', 'seed', 'answers', 'output', 'ending')
+
+    def __init__(self, game, seed, answers, output=None, ending=None):
+        self.game = game
+        self.seed = seed
+        self.answers = answers
+        self.output = output
+        self.ending = ending
+
+    def as_dict(self):
+        return {'game': self.game, 'seed': self.seed, 'answers': self.answers, 'output': self.output,
+                'ending': self.ending}
+
+def load_transcripts(path):
+    """
+    Yield the sessions in a transcript file.
+    """
+    with open(path, 'r') as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                session = json.loads(line)
+                if session['game'] not in GAMES:
+                    raise ValueError(f"unknown game {session['game']}")
+                yield Transcript(session['game'], session['seed'], session['answers'], session.get('output'),
+                                 session.get('ending'))
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"line {number} of {path} isn't a session: {e}")
+
+def save_transcripts(path, transcripts):
+    """
+    Append sessions to a transcript file and return how many were written.
+    """
+    count = 0
+    with open(path, 'a') as file:
+        for transcript in transcripts:
+            file.write(json.dumps(transcript.as_dict()) + "\n")
+            count += 1
+    return count
+
+def game_code(game):
+    """
+    Return the compiled script of a game, compiling it the first time.
+    """
+    code = compiled.get(game)
+    if code is None:
+        path = os.path.join(HERE, GAMES[game])
+        with open(path, 'r', encoding='utf-8') as file:
+            code = compiled[game] = compile(file.read(), path, 'exec')
+    return code
+
+def run_session(game, source, seed, output=None):
+    """
+    Run a game from start to finish, taking its answers from source, with random seeded with seed.
+    Everything the game prints goes to output, a new StringIO by default. Returns the output and how the
+    session ended: FINISHED, RAN_OUT or the error the game raised.
+    """
+    code = game_code(game)
+    output = io.StringIO() if output is None else output
+    # Run as if started with no arguments, so the scripts play rather than take their command line options;
+    # exit() and quit() are replaced because the built-in ones close standard input
+    namespace = {'__name__': '__main__', '__file__': code.co_filename, 'exit': sys.exit, 'quit': sys.exit}
+    arguments = sys.argv
+    sys.argv = [code.co_filename]
+    old_source = game_input.use(source)
+    random.seed(seed)
+    ending = FINISHED
+    try:
+        with contextlib.redirect_stdout(output):
+            exec(code, namespace)
+    except SystemExit:
+        pass
+    except EOFError:
+        ending = RAN_OUT
+    except Exception as e:
+        ending = f"{type(e).__name__}: {e}"
+    finally:
+        game_input.use(old_source)
+        sys.argv = arguments
+    return output.getvalue(), ending
+
+def replay(transcript):
+    """
+    Run a recorded session again and return its output and ending.
+    """
+    return run_session(transcript.game, game_input.LineSource(transcript.answers), transcript.seed)
+
+def first_difference(expected, actual):
+    """
+    Return a description of the first line that differs between two outputs.
+    """
+    expected_lines = expected.split("\n")
+    actual_lines = actual.split("\n")
+    for number, (old, new) in enumerate(zip(expected_lines, actual_lines), 1):
+        if old != new:
+            return f"line {number}: expected {old!r}, got {new!r}"
+    return f"expected {len(expected_lines)} lines, got {len(actual_lines)}"
+
+class Tee(io.StringIO):
+    """
+    Captures output while still showing it.
+    """
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text)
+        return super().write(text)
+
+    def keep(self, text):
+        # Capture without showing, for what the terminal has shown already
+        return super().write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+class RecordingSource(game_input.KeyboardSource):
+    """
+    Answers typed by the player, kept for the transcript. Each answer is added to the captured output (a Tee)
+    after its prompt, as LineSource prints it on replay.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.answers = []
+
+    def read(self, prompt):
+        answer = input(prompt)
+        self.answers.append(answer)
+        self.output.keep(answer + "\n")
+        return answer
+
+def record(game):
+    """
+    Play a game at the keyboard and return the session.
+    """
+    seed = random.SystemRandom().randrange(2**32)
+    output = Tee(sys.stdout)
+    source = RecordingSource(output)
+    try:
+        text, ending = run_session(game, source, seed, output)
+    except KeyboardInterrupt:
+        text, ending = output.getvalue(), RAN_OUT
+    return Transcript(game, seed, source.answers, text, ending)
+
+# Scripted players for generate. Each returns the answers for one session, mostly valid with some mistakes.
+
+def some_name(rng, number):
+    answers = []
+    while rng.random() < 0.15:
+        answers.append(rng.choice(["", "42", "!!", " "]))
+    return answers + [f"{rng.choice(['Sam', 'Alex', 'Jo', 'Kim', 'Lee'])}{number}"]
+
+def some_number(rng, text):
+    answers = []
+    while rng.random() < 0.1:
+        answers.append(rng.choice(["", "abc", "-1", "1.5"]))
+    return answers + [text]
+
+def guess_answers(rng, number):
+    level = rng.choice("EeHh")
+    answers = some_name(rng, number) + (["x"] if rng.random() < 0.1 else []) + [level]
+    guesses = list(range(1, 11 if level in "Ee" else 101))
+    rng.shuffle(guesses)
+    for guess in guesses:
+        answers += some_number(rng, str(guess))
+    return answers
+
+def guessing_answers(rng, number):
+    level = rng.choice("EH")
+    return some_name(rng, number) + [level] + some_number(rng, str(rng.randint(1, 10 if level == "E" else 100)))
+
+def rps_answers(rng, number):
+    answers = some_name(rng, number) + some_name(rng, number + 1)
+    rounds = rng.randint(1, 4)
+    for played in range(1, rounds + 1):
+        for _ in range(2):
+            if rng.random() < 0.1:
+                answers.append(rng.choice(["", "x", "rock"]))
+            answers.append(rng.choice("RPSrps"))
+        answers.append(rng.choice(["y", "Yes"]) if played < rounds else rng.choice(["n", "no", ""]))
+    return answers
+
+def times_answers(rng, number):
+    answers = some_name(rng, number)
+    while rng.random() < 0.1:
+        answers.append(rng.choice(["0", "13", "x"]))
+    answers.append(str(rng.randint(1, 12)))
+    while rng.random() < 0.2:
+        answers.append(rng.choice(["n", "later"]))
+    return answers + ["y", rng.choice(["y", "n", "Y"])]
+
+PLAYERS = {'guess': guess_answers, 'guessing': guessing_answers, 'rps': rps_answers, 'times': times_answers}
+
+def generate(game, sessions, seed=None):
+    """
+    Yield sessions of game played by the scripted players, with the output the games give now.
+    """
+    rng = random.Random(seed)
+    for number in range(sessions):
+        transcript = Transcript(game, rng.randrange(2**32), PLAYERS[game](rng, number))
+        transcript.output, transcript.ending = replay(transcript)
+        yield transcript
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Record, generate and replay sessions of the games.")
+    parser.add_argument('command', choices=['record', 'generate', 'replay'],
+                        help="'record' a game you play, 'generate' sessions with scripted players, or 'replay' "
+                             "the sessions in a file")
+    parser.add_argument('arguments', nargs='+', metavar='GAME FILE',
+                        help="the game and transcript file for record and generate, the file for replay")
+    parser.add_argument('--sessions', type=int, default=1000, help="Sessions to generate (default: %(default)s)")
+    parser.add_argument('--seed', type=int, help="Seed for generate, for the same sessions every time")
+    parser.add_argument('--repeat', type=int, default=1, help="Times to replay the file (default: %(default)s)")
+    parser.add_argument('--show', type=int, default=5, help="Changed sessions to describe (default: %(default)s)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.command == 'replay':
+            if len(args.arguments) != 1:
+                raise ValueError("replay takes one transcript file")
+            path = args.arguments[0]
+        else:
+            if len(args.arguments) != 2:
+                raise ValueError(f"{args.command} takes a game and a transcript file")
+            game, path = args.arguments
+            if game not in GAMES:
+                raise ValueError(f"the game must be one of {', '.join(sorted(GAMES))}")
+        if args.command == 'replay':
+            transcripts = list(load_transcripts(path))
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}")
+        return
+
+    if args.command == 'record':
+        transcript = record(game)
+        save_transcripts(path, [transcript])
+        print(f"\nSaved the session to {path} ({transcript.ending}).")
+        return
+    if args.command == 'generate':
+        start = time.perf_counter()
+        count = save_transcripts(path, generate(game, args.sessions, args.seed))
+        print(f"Saved {count:,} sessions to {path} in {time.perf_counter() - start:.2f} s.")
+        return
+
+    changed = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for transcript in transcripts:
+            output, ending = replay(transcript)
+            if output == transcript.output and ending == transcript.ending:
+                continue
+            changed += 1
+            if changed <= args.show:
+                difference = (f"ended with '{ending}' instead of '{transcript.ending}'" if output == transcript.output
+                              else first_difference(transcript.output or "", output))
+                print(f"Changed {transcript.game} session (seed {transcript.seed}): {difference}")
+    seconds = time.perf_counter() - start
+    sessions = len(transcripts) * args.repeat
+    print(f"{sessions:,} sessions replayed in {seconds:.2f} s ({sessions / max(seconds, 1e-9):,.0f} sessions/s), "
+          f"{changed:,} changed")
+
+if __name__ == '__main__':
+    main()
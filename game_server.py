@@ -0,0 +1,298 @@
+#!/usr/bin/python3.9
+# Network server for the games.
+# Hosts Rock Paper Scissors matches and number guessing sessions over a plain line protocol, so players can
+# connect with telnet or nc (nc 127.0.0.1 8765). Every line the server sends ends in a newline, and a line
+# asking for input ends in ':'. Each connection is served by one asyncio task, and all waiting is done with
+# timeouts on the event loop instead of sleeping. Rock Paper Scissors players are paired as they arrive and
+# both moves are collected before either is shown, so no one has to look away while the other chooses.
+# Answers are checked with the same patterns as the games' getT, getN and getC, from game_input.py.
+#
+# Run the server with: python3 game_server.py --port 8765
+# Load test it with: python3 bench_server.py
+
+import argparse
+import asyncio
+import logging
+import random
+import rps_engine
+from game_input import (CHOICE_COMPLAINT, CHOICE_PATTERN, GAME_PATTERN, GIVE_UP, LEVEL_PATTERN, MAX_ERRORS,
+                        NAME_COMPLAINT, NAME_PATTERN, NUMBER_COMPLAINT, NUMBER_PATTERN, YES_PATTERN)
+
+# Global variables
+HOST = '127.0.0.1'
+PORT = 8765
+LEVELS = {'E': "1-10", 'H': "1-100"}  # The difficulty settings of guess.py
+INPUT_TIMEOUT = 300  # Seconds a player has to answer before they are disconnected
+PAIR_TIMEOUT = 60  # Seconds to wait for a Rock Paper Scissors opponent
+
+class Disconnect(Exception):
+    """
+    The player left, took too long to answer or gave too many invalid answers.
+    """
+
+class Session:
+    """
+    One connected player.
+    """
+    __slots__ = ('reader', 'writer', 'name')
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.name = None
+
+    async def send(self, *lines):
+        self.writer.write(("\n".join(lines) + "\n").encode('utf-8'))
+        await self.writer.drain()
+
+    async def ask(self, prompt):
+        """
+        Send a prompt and return the stripped answer line.
+        """
+        await self.send(prompt)
+        try:
+            line = await asyncio.wait_for(self.reader.readline(), INPUT_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self.send("Too slow, goodbye.")
+            raise Disconnect()
+        except ValueError:
+            # The line was longer than the stream limit
+            raise Disconnect()
+        if not line:
+            raise Disconnect()
+        return line.decode('utf-8', errors='replace').strip()
+
+async def ask_until(session, prompt, pattern, complaint=None, limit=None):
+    """
+    Ask until the answer matches pattern, sending complaint after each invalid answer.
+    After limit invalid answers the player is disconnected, as game_input.ask_until() ends the games.
+    """
+    errors = 0
+    answer = await session.ask(prompt)
+    while not pattern.search(answer):
+        if complaint:
+            await session.send(complaint)
+        errors += 1
+        if limit is not None and errors == limit:
+            await session.send(GIVE_UP)
+            raise Disconnect()
+        answer = await session.ask(prompt)
+    return answer
+
+async def get_name(session, prompt):
+    # The rules of getT: a name needs at least one letter
+    return await ask_until(session, prompt, NAME_PATTERN, NAME_COMPLAINT, MAX_ERRORS)
+
+async def get_number(session, prompt):
+    # The rules of getN in guess.py: digits only
+    return int(await ask_until(session, prompt, NUMBER_PATTERN, NUMBER_COMPLAINT, MAX_ERRORS))
+
+async def get_choice(session):
+    # The rules of getC: R, P or S
+    choice = await ask_until(session, "Please choose [R]ock, [P]aper or [S]cissors :", CHOICE_PATTERN,
+                             CHOICE_COMPLAINT)
+    return choice.upper()
+
+class Match:
+    """
+    A Rock Paper Scissors match between two sessions.
+    Both players answer each question at the same time through exchange(), which hands back both answers
+    once the second one is in.
+    """
+    __slots__ = ('players', 'scores', 'values', 'result')
+
+    def __init__(self, first, second):
+        self.players = (first, second)
+        self.scores = [0, 0]
+        self.values = [None, None]
+        self.result = asyncio.get_running_loop().create_future()
+
+    async def exchange(self, index, value, settle=None):
+        """
+        Submit player index's answer and wait for the other player's.
+        Returns both answers, or what settle(answers) makes of them (worked out once for both players), or
+        None if the other player left.
+        """
+        result = self.result
+        self.values[index] = value
+        if None not in self.values:
+            values, self.values = self.values, [None, None]
+            self.result = asyncio.get_running_loop().create_future()
+            result.set_result(settle(values) if settle else values)
+        try:
+            # Shielded so a player timing out doesn't cancel the result for the other one
+            return await asyncio.wait_for(asyncio.shield(result), INPUT_TIMEOUT * 2)
+        except asyncio.TimeoutError:
+            return None
+
+    def leave(self):
+        """
+        Tell the other player, if they are waiting on an answer, that this one has gone.
+        """
+        if not self.result.done():
+            self.result.set_result(None)
+
+    def settle_round(self, moves):
+        """
+        Resolve a round and update the scores. Returns the outcome and the winner's verdict.
+        """
+        outcome, verdict = rps_engine.resolve(*moves)
+        if outcome == rps_engine.FIRST:
+            self.scores[0] += 1
+        elif outcome == rps_engine.SECOND:
+            self.scores[1] += 1
+        return outcome, verdict
+
+class Lobby:
+    """
+    Pairs Rock Paper Scissors players in the order they arrive.
+    """
+    __slots__ = ('waiting',)
+
+    def __init__(self):
+        self.waiting = None  # (session, future) of the player waiting for an opponent
+
+    async def pair(self, session):
+        """
+        Wait for an opponent and return the match and this player's index in it.
+        Raises asyncio.TimeoutError if no one turns up within PAIR_TIMEOUT.
+        """
+        if self.waiting is not None and not self.waiting[1].done():
+            other, future = self.waiting
+            self.waiting = None
+            match = Match(other, session)
+            future.set_result(match)
+            return match, 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiting = (session, future)
+        try:
+            return await asyncio.wait_for(future, PAIR_TIMEOUT), 0
+        finally:
+            if self.waiting is not None and self.waiting[1] is future:
+                self.waiting = None
+
+async def play_rps(session, lobby):
+    """
+    Play Rock Paper Scissors against the next player to arrive, until either of them stops.
+    """
+    await session.send("Waiting for an opponent...")
+    try:
+        match, index = await lobby.pair(session)
+    except asyncio.TimeoutError:
+        await session.send("No opponent turned up, try again later.")
+        return
+    opponent = match.players[1 - index]
+    try:
+        await session.send(f"You are playing against {opponent.name}.")
+        while True:
+            move = await get_choice(session)
+            result = await match.exchange(index, move, match.settle_round)
+            if result is None:
+                await session.send(f"{opponent.name} has left the game.")
+                return
+            outcome, verdict = result
+            if outcome == rps_engine.TIE:
+                await session.send("It's a tie!")
+            else:
+                winner = match.players[0 if outcome == rps_engine.FIRST else 1]
+                await session.send(f"[ {winner.name} ] WINS! {verdict}")
+            first, second = match.players
+            await session.send(f"Scores: [{first.name} has {match.scores[0]} point(s)] and "
+                               f"[{second.name} - {match.scores[1]} point(s)]")
+
+            again = bool(YES_PATTERN.search(await session.ask("Play again? :")))
+            answers = await match.exchange(index, again)
+            if answers is None:
+                await session.send(f"{opponent.name} has left the game.")
+                return
+            if not answers[1 - index] and again:
+                await session.send(f"{opponent.name} doesn't want to play again.")
+            if not all(answers):
+                return
+    finally:
+        match.leave()
+
+async def play_guess(session):
+    """
+    Play guess.py: pick a level, then guess until the number is right.
+    """
+    await session.send("What level game do you want to play?", "(H)ard", "(E)asy")
+    level = await ask_until(session, ":", LEVEL_PATTERN)
+    numbers = LEVELS[level.upper()]
+    low, high = numbers.split("-")
+    secret = random.randint(int(low), int(high))
+    while True:
+        guess = await get_number(session, f"Enter a number between {numbers} :")
+        if guess == secret:
+            await session.send("Yay you got it correct!")
+            return
+
+class GameServer:
+    """
+    Accepts connections and runs one game session on each.
+    """
+
+    def __init__(self):
+        self.lobby = Lobby()
+        self.active = 0
+        self.finished = 0
+
+    async def handle(self, reader, writer):
+        session = Session(reader, writer)
+        self.active += 1
+        try:
+            await session.send("Games V.1", "")
+            session.name = await get_name(session, "What is your name? :")
+            await session.send(f"Hi {session.name}!", "What do you want to play?", "[R]ock Paper Scissors",
+                               "[G]uess the number")
+            game = await ask_until(session, ":", GAME_PATTERN)
+            if game.upper() == "R":
+                await play_rps(session, self.lobby)
+            else:
+                await play_guess(session)
+            await session.send("Goodbye!")
+            self.finished += 1
+        except (Disconnect, ConnectionError):
+            pass
+        except Exception as e:
+            logging.error(f"Session for {session.name} failed. Error: {e}")
+        finally:
+            self.active -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host=HOST, port=PORT, ready=None):
+        """
+        Serve until cancelled. ready, if given, is called with the bound (host, port), which tells callers the
+        port when port 0 was asked for.
+        """
+        server = await asyncio.start_server(self.handle, host, port, limit=1024, backlog=4096)
+        address = server.sockets[0].getsockname()[:2]
+        if ready:
+            ready(address)
+        async with server:
+            await server.serve_forever()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Host Rock Paper Scissors and number guessing over TCP.")
+    parser.add_argument('--host', default=HOST, help="Address to listen on (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=PORT, help="Port to listen on, 0 for any (default: %(default)s)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = GameServer()
+
+    def ready(address):
+        print(f"Listening on {address[0]}:{address[1]}", flush=True)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        print("Stopped.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/python3.9
+# Headless simulation of the number guessing games.
+# Plays millions of games without input() and reports how many guesses they took and how often they were
+# won. Secrets and guesses are drawn for a whole batch of games at once with NumPy, and batches can be spread
+# over several processes. Two sets of rules are simulated:
+#   single - guessing.py: one guess, which is either right or wrong;
+#   loop   - guess.py: guess until right. The game only says whether a guess is right, so strategies that
+#            need to be told "higher" or "lower" are only available with --hints.
+# Ranges use the games' "min-max" format and may span up to 64 bits. A range starting with a minus sign has to be
+# joined to the option with '=' so it isn't read as another option, e.g.
+#   --range=-9223372036854775808-9223372036854775807
+#
+# Run it directly, or through the games: python3 guess.py --simulate --strategy human --games 1000000
+
+import argparse
+import math
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Global variables
+LEVELS = {'E': "1-10", 'H': "1-100"}  # The games' difficulty settings, used when no --range is given
+RANGE_PATTERN = re.compile(r'^\s*(-?\d+)\s*-\s*(-?\d+)\s*$')
+MAX_SPAN = 2**64 - 1  # Secrets are drawn as unsigned 64-bit offsets from the bottom of the range
+CHUNK_SIZE = 1_000_000  # Games simulated per NumPy batch
+EXACT_LIMIT = 4096  # Guess counts up to this are tallied exactly; longer games only by power of two
+POWER_BUCKETS = 80  # Random guessing over a 64-bit range can take well over 2**64 guesses
+HUMAN_SLIP = 0.1  # Chance a human-like guesser repeats a number they already tried
+HUMAN_SPREAD = 6  # A human's first guess is spread around the middle with a standard deviation of range/6
+
+def parse_range(text):
+    """
+    Read a "min-max" range and return (low, high) as integers. Raises ValueError if it isn't one.
+    """
+    match = RANGE_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"'{text}' is not a range like 1-100")
+    low, high = int(match.group(1)), int(match.group(2))
+    if high < low:
+        raise ValueError(f"the range {text} ends before it starts")
+    if high - low > MAX_SPAN:
+        raise ValueError(f"the range {text} is wider than 64 bits")
+    return low, high
+
+def bisect_counts(secrets, span, rng, pick):
+    """
+    Count the guesses needed to find each secret when told "higher" or "lower" after every guess.
+    pick(rng, lo, hi) chooses the next guesses inside the remaining [lo, hi] intervals. Won games are dropped
+    from the arrays once they make up half of them, so the long tail of rounds only works on the games still
+    going without paying for a copy every round.
+    """
+    counts = np.zeros(len(secrets), dtype=np.float64)
+    positions = np.arange(len(secrets))
+    lo = np.zeros(len(secrets), dtype=np.uint64)
+    hi = np.full(len(secrets), span, dtype=np.uint64)
+    going = np.ones(len(secrets), dtype=bool)
+    guesses = 0
+    while len(positions):
+        guesses += 1
+        guess = pick(rng, lo, hi)
+        found = (guess == secrets) & going
+        counts[positions[found]] = guesses
+        going &= ~found
+        higher = secrets > guess
+        # A won game's interval is left as it is, so lo never passes hi and guess - 1 never wraps below 0
+        lo = np.where(higher & going, guess + np.uint64(1), lo)
+        hi = np.where(~higher & going, guess - np.uint64(1), hi)
+        if np.count_nonzero(going) * 2 <= len(going):
+            positions, secrets, lo, hi = positions[going], secrets[going], lo[going], hi[going]
+            going = np.ones(len(positions), dtype=bool)
+    return counts
+
+def midpoints(rng, lo, hi):
+    return lo + (hi - lo) // np.uint64(2)
+
+def uniform_between(rng, lo, hi):
+    return rng.integers(lo, hi, endpoint=True, dtype=np.uint64)
+
+def uniform_offsets(rng, span, size):
+    """
+    Draw size offsets uniformly from 0..span as uint64.
+    """
+    return rng.integers(0, span, size=size, endpoint=True, dtype=np.uint64)
+
+class RandomGuesser:
+    """
+    Guess any number in the range each time, forgetting earlier guesses and ignoring hints.
+    """
+
+    def first_guesses(self, rng, span, size):
+        return uniform_offsets(rng, span, size)
+
+    def guess_counts(self, rng, secrets, span, hints):
+        # Every guess is right with chance 1/(span + 1), so the count is geometric. It is drawn by inversion
+        # in floating point because for 64-bit ranges it doesn't fit in an integer.
+        chance = 1.0 / (float(span) + 1.0)
+        if chance == 1.0:
+            return np.ones(len(secrets))
+        draws = 1.0 - rng.random(len(secrets))
+        return np.floor(np.log(draws) / math.log1p(-chance)) + 1.0
+
+class SweepGuesser:
+    """
+    Try every number from the bottom of the range up, never repeating one.
+    """
+
+    def first_guesses(self, rng, span, size):
+        return np.zeros(size, dtype=np.uint64)
+
+    def guess_counts(self, rng, secrets, span, hints):
+        return secrets.astype(np.float64) + 1.0
+
+class BinaryGuesser:
+    """
+    Guess the middle of the numbers still possible. Needs to be told "higher" or "lower".
+    """
+
+    def first_guesses(self, rng, span, size):
+        return np.full(size, span // 2, dtype=np.uint64)
+
+    def guess_counts(self, rng, secrets, span, hints):
+        if not hints:
+            raise ValueError("binary search needs --hints, since guess.py only says whether a guess is right")
+        return bisect_counts(secrets, span, rng, midpoints)
+
+class HumanGuesser:
+    """
+    A rough model of a person playing.
+    The first guess tends to be near the middle of the range. Told "higher" or "lower", they pick any number
+    in what is left rather than the exact middle. Without hints they try new numbers but now and then repeat
+    one they already tried (HUMAN_SLIP).
+    """
+
+    def first_guesses(self, rng, span, size):
+        guesses = rng.normal(float(span) / 2, float(span) / HUMAN_SPREAD + 0.5, size)
+        # float(span) can round up to 2**64, which doesn't fit in a uint64, so stop at the float below it
+        top = min(float(span), np.nextafter(2.0 ** 64, 0))
+        guesses = np.clip(np.rint(guesses), 0, top)
+        return np.minimum(guesses.astype(np.uint64), np.uint64(span))
+
+    def guess_counts(self, rng, secrets, span, hints):
+        if hints:
+            return bisect_counts(secrets, span, rng, uniform_between)
+        # New numbers are tried in a random order, so the secret is the k-th new number with k uniform. Each
+        # new number after the first costs a geometric number of turns because of the repeats in between.
+        new = uniform_offsets(rng, span, len(secrets)).astype(np.float64) + 1.0
+        before = new - 1.0
+        small = before < 1e6
+        repeats = np.zeros(len(secrets))
+        chance = 1.0 - HUMAN_SLIP
+        repeats[small] = rng.negative_binomial(np.maximum(before[small], 1), chance) * (before[small] > 0)
+        # Too many draws for the exact distribution, so use its normal approximation
+        mean = before[~small] * HUMAN_SLIP / chance
+        spread = np.sqrt(before[~small] * HUMAN_SLIP) / chance
+        repeats[~small] = np.maximum(np.rint(rng.normal(mean, spread)), 0)
+        return new + repeats
+
+STRATEGIES = {
+    'random': RandomGuesser(),
+    'sweep': SweepGuesser(),
+    'binary': BinaryGuesser(),
+    'human': HumanGuesser(),
+}
+
+class Tally:
+    """
+    Totals for a batch of games that can be merged with other batches.
+    Guess counts are kept as an exact histogram up to EXACT_LIMIT and a power-of-two histogram beyond it,
+    so percentiles can be worked out without keeping every game.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.most = 0.0
+        self.exact = np.zeros(EXACT_LIMIT + 2, dtype=np.int64)
+        self.powers = np.zeros(POWER_BUCKETS, dtype=np.int64)
+
+    def add(self, counts, wins):
+        self.games += len(counts)
+        self.wins += int(wins)
+        self.total += float(counts.sum())
+        self.total_squares += float(np.square(counts).sum())
+        self.most = max(self.most, float(counts.max(initial=0)))
+        self.exact += np.bincount(np.minimum(counts, EXACT_LIMIT + 1).astype(np.int64), minlength=EXACT_LIMIT + 2)
+        powers = np.minimum(np.floor(np.log2(counts)), POWER_BUCKETS - 1).astype(np.int64)
+        self.powers += np.bincount(powers, minlength=POWER_BUCKETS)
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins += other.wins
+        self.total += other.total
+        self.total_squares += other.total_squares
+        self.most = max(self.most, other.most)
+        self.exact += other.exact
+        self.powers += other.powers
+
+    def mean(self):
+        return self.total / self.games
+
+    def stdev(self):
+        return math.sqrt(max(self.total_squares / self.games - self.mean() ** 2, 0.0))
+
+    def percentile(self, fraction):
+        """
+        Return the guess count below which fraction of the games finished. Exact when every game took at
+        most EXACT_LIMIT guesses, otherwise the top of the power-of-two bucket it falls in.
+        """
+        wanted = fraction * self.games
+        histogram = self.exact if self.most <= EXACT_LIMIT else self.powers
+        position = int(np.searchsorted(np.cumsum(histogram), wanted))
+        return position if self.most <= EXACT_LIMIT else 2 ** (position + 1) - 1
+
+    def buckets(self):
+        """
+        Return (label, games) rows for the guess count distribution: one row per count when there are only a
+        few, otherwise one row per power of two from the shortest game on.
+        """
+        if self.most <= 16:
+            return [(f"{count}", int(self.exact[count])) for count in range(1, int(self.most) + 1)]
+        rows = []
+        first = int(np.flatnonzero(self.powers)[0])
+        for power in range(first, int(math.log2(self.most)) + 1):
+            low, high = 2 ** power, 2 ** (power + 1) - 1
+            rows.append((f"{format_count(low)}" if low == high else f"{format_count(low)}-{format_count(high)}",
+                         int(self.powers[power])))
+        return rows
+
+def play_chunk(rules, span, strategy_name, size, hints, max_guesses, seed):
+    """
+    Simulate one batch of games and return its Tally. Runs in worker processes, so it only takes picklable
+    arguments.
+    """
+    rng = np.random.default_rng(seed)
+    strategy = STRATEGIES[strategy_name]
+    secrets = uniform_offsets(rng, span, size)
+    tally = Tally()
+    if rules == 'single':
+        wins = np.count_nonzero(strategy.first_guesses(rng, span, size) == secrets)
+        tally.add(np.ones(size), wins)
+    else:
+        counts = strategy.guess_counts(rng, secrets, span, hints)
+        wins = size if max_guesses is None else np.count_nonzero(counts <= max_guesses)
+        tally.add(counts, wins)
+    return tally
+
+def simulate(rules, low, high, strategy_name, games, hints=False, max_guesses=None, seed=None, processes=1,
+             chunk_size=CHUNK_SIZE):
+    """
+    Simulate games under rules ('single' or 'loop') for secrets drawn from low..high and return a Tally.
+    The games are split into batches of chunk_size, each with its own random stream from seed, so the result
+    for a given seed is the same however many processes are used.
+    """
+    span = high - low
+    sizes = [min(chunk_size, games - start) for start in range(0, games, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(rules, span, strategy_name, size, hints, max_guesses, chunk_seed)
+            for size, chunk_seed in zip(sizes, seeds)]
+    tally = Tally()
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for result in pool.map(play_chunk, *zip(*jobs)):
+                tally.merge(result)
+    else:
+        for job in jobs:
+            tally.merge(play_chunk(*job))
+    return tally
+
+def format_count(value):
+    """
+    Format a guess count or statistic, switching to scientific notation for the huge counts of 64-bit ranges.
+    """
+    if value >= 1e9:
+        return f"{float(value):.3e}"
+    if value == int(value):
+        return f"{int(value):,}"
+    return f"{value:,.2f}"
+
+def print_report(tally, rules, low, high, strategy_name, hints, max_guesses, seconds):
+    """
+    Print the win rate and guess count distribution of a simulation.
+    """
+    game = 'guessing.py (one guess)' if rules == 'single' else 'guess.py (guess until right)'
+    how = strategy_name + (' with higher/lower hints' if hints and rules == 'loop' else '')
+    print(f"{game}, range {low}-{high}, {how}")
+    print(f"{tally.games:,} games in {seconds:.2f} s ({tally.games / max(seconds, 1e-9):,.0f} games/s)")
+    limit = f" within {max_guesses} guesses" if max_guesses is not None and rules == 'loop' else ''
+    print(f"Win rate{limit}: {100.0 * tally.wins / tally.games:.4f}%")
+    if rules == 'single':
+        return
+    approximate = '' if tally.most <= EXACT_LIMIT else '<='
+    print(f"Guesses: mean {format_count(tally.mean())}, sd {format_count(tally.stdev())}, "
+          f"median {approximate}{format_count(tally.percentile(0.5))}, "
+          f"p90 {approximate}{format_count(tally.percentile(0.9))}, "
+          f"p99 {approximate}{format_count(tally.percentile(0.99))}, max {format_count(tally.most)}")
+    rows = tally.buckets()
+    width = max(len(label) for label, _ in rows)
+    print("Games by number of guesses:")
+    for label, count in rows:
+        share = count / tally.games
+        print(f"  {label:>{width}}  {100.0 * share:7.3f}%  {'#' * round(share * 50)}")
+
+def parse_args(argv=None, rules=None):
+    parser = argparse.ArgumentParser(description="Simulate the number guessing games without playing them.")
+    if rules is None:
+        parser.add_argument('--rules', choices=['single', 'loop'], default='loop',
+                            help="'single' for guessing.py's one guess, 'loop' for guess.py (default)")
+    parser.add_argument('--simulate', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--level', choices=sorted(LEVELS), type=str.upper, default='H',
+                        help="Use a game difficulty: E for easy, H for hard (default)")
+    parser.add_argument('--range', help="Range of secrets as min-max, up to 64 bits wide; overrides --level. "
+                                        "Write --range=MIN-MAX when MIN is negative")
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='random', help="How the player guesses")
+    parser.add_argument('--hints', action='store_true', help="Tell the player 'higher' or 'lower' after a guess")
+    parser.add_argument('--max-guesses', type=int, help="Count a guess.py game as lost after this many guesses")
+    parser.add_argument('--games', type=int, default=CHUNK_SIZE, help="Number of games to simulate")
+    parser.add_argument('--seed', type=int, help="Random seed, for repeatable results")
+    parser.add_argument('--processes', type=int, default=1, help="Worker processes to spread the games over")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Games per NumPy batch")
+    args = parser.parse_args(argv)
+    if rules is not None:
+        args.rules = rules
+    return args
+
+def main(argv=None, rules=None, levels=None):
+    """
+    Run a simulation from the command line. The games pass their own rules and difficulty settings.
+    """
+    if levels:
+        LEVELS.update(levels)
+    args = parse_args(argv, rules)
+    try:
+        low, high = parse_range(args.range or LEVELS[args.level])
+        if args.games < 1 or args.chunk_size < 1 or args.processes < 1:
+            raise ValueError("--games, --chunk-size and --processes must be at least 1")
+        start = time.perf_counter()
+        tally = simulate(args.rules, low, high, args.strategy, args.games, args.hints, args.max_guesses,
+                         args.seed, args.processes, args.chunk_size)
+        seconds = time.perf_counter() - start
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    print_report(tally, args.rules, low, high, args.strategy, args.hints, args.max_guesses, seconds)
+
+if __name__ == '__main__':
+    main()
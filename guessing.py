@@ -1,59 +1,24 @@
 #!/usr/bin/python3.9
-import re
+import sys
 import random
+from game_input import ask_until, getN, getT, LEVEL_PATTERN
 
 # Difficulty settings
 easy = "1-10"
 hard = "1-100"
 
-# Validate number input
-def getN(text):
-    err = 0
-    myIn = input(text)
-
-    while not (myIn.isdigit()):
-        print("That's not a number.")
-        err += 1
-
-        # Too many errors, exit.
-        if (err == 3):
-            print("You are an idiot.")
-            exit()
-
-        myIn = input(text)
-
-    
-    return int(myIn)
-
-
-# Validate text input, make sure the name has a letter in it at least
-def getT(text):
-    err = 0
-    myIn = input(text)
-
-    while not (re.search("[a-zA-Z]", myIn)):
-        print("Not a valid name.")
-
-        err += 1
-
-        # Too many errors, exit.
-        if (err == 3):
-            print("You are an idiot.")
-            exit()
-        
-        myIn = input(text)
- 
-    return myIn
-
+# Headless simulation instead of a game, e.g. python3 guessing.py --simulate --strategy human --games 1000000
+if (len(sys.argv) > 1):
+    import guess_sim
+    guess_sim.main(sys.argv[1:], "single", {"E": easy, "H": hard})
+    quit()
 
 print("Number Guessing V.1\n")
 print("Hi " + getT("What is your name? : ") + "!\n")
 print("What level game do you want to play?\n(H)ard\n(E)asy")
 
-level = input(": ")
 # Validation for game level input
-while not (re.search("^[EH]$", level, re.IGNORECASE)):
-    level = input(": ")
+level = ask_until(": ", LEVEL_PATTERN.search)
 
 
 # Split the min and max numbers into an array and then get a random num
@@ -0,0 +1,257 @@
+#!/usr/bin/python3.9
+# Host reachability prober for test.py.
+# Reads a list of hosts, one per line (IP addresses, host names or whole networks like 10.1.0.0/16), and
+# checks which ones answer, either by opening a TCP connection to a port or by running ping once per host.
+# Hosts are read as they are needed and checked by a fixed number of asyncio workers at a time, each with a
+# timeout, so a /16 finishes in seconds and memory use doesn't grow with the list. ping is run directly
+# rather than through a shell, and anything that isn't a plain host name or address is skipped, so a line in
+# the file can't add options or commands. Each result is printed as it arrives, as text or as a JSON line.
+#
+# Run it directly, or through test.py: python3 test.py hosts.txt --method tcp --port 22
+# Try it against loopback listeners with: python3 bench_probe.py
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Global variables
+CONCURRENCY = 256  # Hosts checked at once
+TIMEOUT = 1.0  # Seconds to wait for each host
+PORT = 80  # Port for TCP checks
+MAX_NETWORK = 1 << 20  # Largest number of addresses a network line may expand to
+HOST_PATTERN = re.compile(r'^[A-Za-z0-9_.:%\[\]-]+$')
+PING_TIME_PATTERN = re.compile(r'time[=<]\s*([\d.]+)\s*ms')
+
+# Statuses a host can get
+UP = 'up'  # Answered: the port accepted the connection, or ping got a reply
+REFUSED = 'refused'  # The host is there, but refused the connection to the port
+TIMED_OUT = 'timeout'  # No answer in time
+UNREACHABLE = 'unreachable'  # The network said the host can't be reached, or the name didn't resolve
+ERROR = 'error'  # The check itself failed, e.g. ping isn't installed
+
+class Probe:
+    """
+    The result of checking one host. latency is in seconds, or None if the host didn't answer.
+    """
+    __slots__ = ('host', 'status', 'latency', 'detail')
+
+    def __init__(self, host, status, latency=None, detail=None):
+        self.host = host
+        self.status = status
+        self.latency = latency
+        self.detail = detail
+
+    @property
+    def reachable(self):
+        # A refused connection still means the host answered
+        return self.status in (UP, REFUSED)
+
+    def as_dict(self):
+        result = {'host': self.host, 'status': self.status, 'reachable': self.reachable,
+                  'latency_ms': None if self.latency is None else round(self.latency * 1000, 3)}
+        if self.detail:
+            result['detail'] = self.detail
+        return result
+
+    def __str__(self):
+        latency = "" if self.latency is None else f" {self.latency * 1000:.2f} ms"
+        detail = f" ({self.detail})" if self.detail else ""
+        return f"{self.host} {self.status}{latency}{detail}"
+
+def iter_hosts(lines):
+    """
+    Yield the hosts to check from lines of host names, addresses and networks in CIDR notation, skipping
+    blank lines and # comments. Networks are expanded as they are read, without listing them in memory.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if '/' in line:
+            try:
+                network = ipaddress.ip_network(line, strict=False)
+                if network.num_addresses > MAX_NETWORK:
+                    raise ValueError(f"it has more than {MAX_NETWORK:,} addresses")
+            except ValueError as e:
+                logging.error(f"Skipping line {number}: {line}. Error: {e}")
+                continue
+            for address in network.hosts():
+                yield str(address)
+        elif HOST_PATTERN.match(line) and not line.startswith('-'):
+            yield line
+        else:
+            logging.error(f"Skipping line {number}: {line}. Error: not a host name or address")
+
+async def tcp_probe(host, port=PORT, timeout=TIMEOUT):
+    """
+    Check a host by opening a TCP connection to port, which is closed again straight away.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        transport, _ = await asyncio.wait_for(loop.create_connection(asyncio.Protocol, host, port), timeout)
+    except asyncio.TimeoutError:
+        return Probe(host, TIMED_OUT)
+    except ConnectionRefusedError:
+        return Probe(host, REFUSED, time.perf_counter() - start)
+    except OSError as e:
+        return Probe(host, UNREACHABLE, detail=e.strerror or str(e))
+    latency = time.perf_counter() - start
+    transport.abort()
+    return Probe(host, UP, latency)
+
+def ping_command(host, timeout):
+    """
+    Return the arguments to ping host once, waiting up to timeout seconds for the reply.
+    """
+    if sys.platform == 'win32':
+        return ['ping', '-n', '1', '-w', str(max(int(timeout * 1000), 1)), host]
+    if sys.platform == 'darwin':
+        return ['ping', '-n', '-c', '1', '-W', str(max(int(timeout * 1000), 1)), host]
+    return ['ping', '-n', '-c', '1', '-W', str(max(int(timeout + 0.999), 1)), host]
+
+async def ping_probe(host, timeout=TIMEOUT):
+    """
+    Check a host with one ping. The latency is the round trip ping reports, or the time ping took if its
+    output can't be read.
+    """
+    start = time.perf_counter()
+    try:
+        process = await asyncio.create_subprocess_exec(*ping_command(host, timeout), stdin=subprocess.DEVNULL,
+                                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        return Probe(host, ERROR, detail=f"can't run ping: {e.strerror or e}")
+    try:
+        # ping is given its own timeout as well; this one is for when it ignores it
+        output, _ = await asyncio.wait_for(process.communicate(), timeout + 1)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return Probe(host, TIMED_OUT)
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        return Probe(host, TIMED_OUT if process.returncode == 1 else UNREACHABLE)
+    match = PING_TIME_PATTERN.search(output.decode('utf-8', errors='replace'))
+    return Probe(host, UP, float(match.group(1)) / 1000 if match else elapsed)
+
+async def probe_hosts(hosts, check, concurrency=CONCURRENCY, report=None):
+    """
+    Run check(host) on every host, at most concurrency at a time, and call report(result) as each finishes.
+    Hosts are taken from the iterable only as workers become free, so it can be a generator of any length.
+    Returns the number of hosts checked.
+    """
+    concurrency = max(concurrency, 1)
+    queue = asyncio.Queue(concurrency)
+    checked = 0
+
+    async def worker():
+        nonlocal checked
+        while True:
+            host = await queue.get()
+            if host is None:
+                return
+            try:
+                result = await check(host)
+            except Exception as e:
+                # e.g. a host name that can't be encoded
+                result = Probe(host, ERROR, detail=str(e))
+            checked += 1
+            if report:
+                report(result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        for host in hosts:
+            await queue.put(host)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+    return checked
+
+class Summary:
+    """
+    Counts of each status and the latencies of the hosts that answered.
+    """
+
+    def __init__(self):
+        self.statuses = {}
+        self.latencies = []
+
+    def add(self, result):
+        self.statuses[result.status] = self.statuses.get(result.status, 0) + 1
+        if result.latency is not None:
+            self.latencies.append(result.latency)
+
+    def percentile(self, fraction):
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check which hosts in a list are reachable.")
+    parser.add_argument('file', help="File of host names, addresses and networks like 10.0.0.0/16, or - for "
+                                     "standard input")
+    parser.add_argument('--method', choices=['tcp', 'ping'], default='tcp',
+                        help="Open a TCP connection, or run ping (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=PORT, help="Port for TCP checks (default: %(default)s)")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT,
+                        help="Seconds to wait for each host (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help="Hosts checked at once (default: %(default)s)")
+    parser.add_argument('--json', action='store_true', help="Print each result as a JSON line")
+    parser.add_argument('--reachable', action='store_true', help="Only print the hosts that answered")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Check the hosts in a file and print the results and a summary.
+    """
+    args = parse_args(argv)
+    if args.file != '-' and not os.path.isfile(args.file):
+        print(f"File '{args.file}' doesn't exist.")
+        return
+    if args.method == 'tcp':
+        def check(host):
+            return tcp_probe(host, args.port, args.timeout)
+    else:
+        def check(host):
+            return ping_probe(host, args.timeout)
+
+    summary = Summary()
+
+    def report(result):
+        summary.add(result)
+        if args.reachable and not result.reachable:
+            return
+        print(json.dumps(result.as_dict()) if args.json else result)
+
+    stream = sys.stdin if args.file == '-' else open(args.file, 'r')
+    start = time.perf_counter()
+    try:
+        checked = asyncio.run(probe_hosts(iter_hosts(stream), check, args.concurrency, report))
+    except KeyboardInterrupt:
+        print("Stopped.")
+        return
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    seconds = time.perf_counter() - start
+
+    counts = ", ".join(f"{status} {count:,}" for status, count in sorted(summary.statuses.items()))
+    print(f"{checked:,} hosts in {seconds:.2f} s ({checked / max(seconds, 1e-9):,.0f} hosts/s): {counts}",
+          file=sys.stderr)
+    if summary.latencies:
+        print(f"Latency: p50 {summary.percentile(0.5) * 1000:.2f} ms, p99 {summary.percentile(0.99) * 1000:.2f} ms",
+              file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
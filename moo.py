@@ -1,3 +1,11 @@
+import sys
+
+# Split a file of bills instead, e.g. python3 moo.py bills.csv --numpy
+if (len(sys.argv) > 1):
+    import bill_split
+    bill_split.main(sys.argv[1:])
+    exit()
+
 totalBill = 100
 numPeople = 1
 share = totalBill/numPeople
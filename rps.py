@@ -1,46 +1,16 @@
 #!/usr/bin/python3.9
-import re
-import time
-
-# Validate text input, make sure the name has a letter in it at least
-def getT(text):
-    err = 0
-    myIn = input(text)
-
-    while not (re.search("[a-zA-Z]", myIn)):
-        print("Not a valid name.")
-
-        err += 1
-
-        # Too many errors, exit.
-        if (err == 3):
-            print("You are an idiot.")
-            exit()
-        
-        myIn = input(text)
- 
-    return myIn
-
-
-# Get choice and do some validation
-def getC():
-    print("Please choose:\n[R]ock\n[P]aper\n[S]cissors")
-    choice = input(": ")
-    while not (re.search("^[RPS]$", choice, re.IGNORECASE)):
-        print("Only enter R, P or S.")
-        choice = input(": ")
-
-    return choice.upper()
-
+import sys
+import rps_engine
+from game_input import ask, getC, getT, pause, YES_PATTERN
 
 def game():
     # Make it so we can modify the variables
     global score1
     global score2
 
-    time.sleep(1)
+    pause(1)
     print(play2, "please close your eyes.\n")
-    time.sleep(3)
+    pause(3)
 
     print(play1, "please choose what you want.")
     choice1 = getC()
@@ -52,39 +22,30 @@ def game():
 
     # Game logic
     print("\n\n")
-    if (choice1 == choice2):
+    outcome, verdict = rps_engine.resolve(choice1, choice2)
+    if (outcome == rps_engine.TIE):
         print("It's a tie!")
-    elif (choice1 == "R"):
-        if (choice2 == "P"):
-            print("[ %s ] WINS! Paper covers rock!" % play2)
-            score2 += 1
-        else:
-            print("[ %s ] WINS! Rock smashes scissors!" % play1)
-            score1 += 1
-    elif (choice1 == "P"):
-        if (choice2 == "S"):
-            print("[ %s ] WINS! Scissors cuts paper!" % play2)
-            score2 += 1
-        else:
-            print("[ %s ] WINS! Paper covers rock!" % play1)
-            score1 += 1
-    elif (choice1 == "S"):
-        if (choice2 == "R"):
-            print("[ %s ] WINS! Rock smashes scissors!" % play2)
-            score2 += 1
-        else:
-            print("[ %s ] WINS! Scissors cuts paper" % play1);
-            score1 += 1
+    elif (outcome == rps_engine.FIRST):
+        print("[ %s ] WINS! %s" % (play1, verdict))
+        score1 += 1
+    else:
+        print("[ %s ] WINS! %s" % (play2, verdict))
+        score2 += 1
 
     print("Scores: [%s has %s point(s)] and [%s - %s point(s)]\n" % (play1, score1, play2, score2)) 
 
 
+# Headless bot tournament instead of a game, e.g. python3 rps.py --tournament --bots random frequency
+if (len(sys.argv) > 1):
+    rps_engine.main(sys.argv[1:])
+    exit()
+
 score1 = 0
 score2 = 0
 
 print("Rock Paper Scissors V.1\n")
 
-time.sleep(2)
+pause(2)
 
 play1 = getT("[ Player 1 ] What is your name? : ")
 play2 = getT("[ Player 2 ] What is your name? : ")
@@ -94,8 +55,8 @@ print("\nHi " + play1 + " and " + play2 + "!\n")
 while (1):
     game()
 
-    play = input("Play again? ")
-    if (re.search("^Y(ES)?$", play, re.IGNORECASE)):
+    play = ask("Play again? ")
+    if (YES_PATTERN.search(play)):
         print("\n"*1000)
     else:
         exit()
@@ -0,0 +1,336 @@
+#!/usr/bin/python3.9
+# Headless Rock Paper Scissors engine.
+# Moves are the integers 0, 1 and 2 for rock, paper and scissors, and outcomes come from a 3x3 table, so
+# whole arrays of rounds are resolved with NumPy lookups instead of an if-chain. Bots are small classes (see Bot below), and a
+# round-robin tournament plays every pair of bots against each other across a process pool and reports the
+# standings and how many rounds per second were played.
+#
+# Run it directly, or through the game: python3 rps.py --tournament --bots random cycle frequency --rounds 10000000
+
+import argparse
+import importlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+import numpy as np
+
+# Global variables
+MOVES = "RPS"  # Move letters, indexed by move number
+TIE, FIRST, SECOND = 0, 1, 2  # Outcomes of a round
+# OUTCOME[a, b] is the outcome when the first player plays a and the second plays b. A move beats the one just
+# before it, wrapping around: paper beats rock, scissors beat paper and rock beats scissors.
+OUTCOME = np.array([[(TIE, SECOND, FIRST)[(b - a) % 3] for b in range(3)] for a in range(3)], dtype=np.int8)
+VERDICTS = {
+    (1, 0): "Paper covers rock!",
+    (2, 1): "Scissors cuts paper!",
+    (0, 2): "Rock smashes scissors!",
+}
+CHUNK_SIZE = 1_000_000  # Rounds resolved per NumPy batch when neither bot looks at earlier rounds
+LANES = 4096  # Games played side by side when a bot does look at earlier rounds
+JOB_ROUNDS = 50_000_000  # Longer matches are split into jobs of this many rounds for the process pool
+
+def move_number(letter):
+    """
+    Convert an 'R', 'P' or 'S' choice to its move number.
+    """
+    return MOVES.index(letter.upper())
+
+def resolve(choice1, choice2):
+    """
+    Resolve one round between two 'R', 'P' or 'S' choices.
+    Returns the outcome (TIE, FIRST or SECOND) and a line saying why the winner won, or None for a tie.
+    """
+    first, second = move_number(choice1), move_number(choice2)
+    outcome = int(OUTCOME[first, second])
+    if outcome == TIE:
+        return outcome, None
+    winner, loser = (first, second) if outcome == FIRST else (second, first)
+    return outcome, VERDICTS[(winner, loser)]
+
+def resolve_moves(first, second):
+    """
+    Resolve arrays of move numbers round by round, returning an array of outcomes.
+    """
+    return np.take(OUTCOME.ravel(), first * np.int8(3) + second)
+
+def tally_moves(first, second):
+    """
+    Count the ties, first wins and second wins in arrays of move numbers.
+    The nine move pairs are counted first and then folded through OUTCOME, which is cheaper than looking up
+    the outcome of every round.
+    """
+    pairs = np.bincount(first * np.int8(3) + second, minlength=9)
+    return np.bincount(OUTCOME.ravel(), weights=pairs, minlength=3).astype(np.int64)
+
+def beating(moves):
+    """
+    Return the moves that beat the given ones.
+    """
+    return (moves + 1) % 3
+
+class Bot:
+    """
+    Base class for Rock Paper Scissors bots.
+    A memoryless bot (the default) only implements block(), returning a whole array of moves at once. A bot
+    that reacts to earlier rounds sets memoryless = False and implements start() and respond() instead;
+    matches involving one are played as LANES independent games side by side, one round at a time, so
+    respond() gets arrays with one entry per game. Moves are numbers: 0 rock, 1 paper, 2 scissors.
+    """
+    memoryless = True
+
+    def block(self, rng, size):
+        """
+        Return size moves as an int8 array.
+        """
+        raise NotImplementedError
+
+    def start(self, rng, lanes):
+        """
+        Reset for a new match of lanes games and return the first move of each.
+        """
+        return self.block(rng, lanes)
+
+    def respond(self, rng, own, other):
+        """
+        Return the next move of each game, given the moves both players just made.
+        """
+        return self.block(rng, len(own))
+
+class RockBot(Bot):
+    """
+    Always plays rock.
+    """
+
+    def block(self, rng, size):
+        return np.zeros(size, dtype=np.int8)
+
+class RandomBot(Bot):
+    """
+    Plays each move with equal chance, which can't be beaten on average.
+    """
+
+    def block(self, rng, size):
+        return rng.integers(0, 3, size=size, dtype=np.int8)
+
+class BiasedBot(Bot):
+    """
+    Plays at random with a lean towards rock, as people tend to.
+    """
+    weights = (0.4, 0.35, 0.25)
+
+    def block(self, rng, size):
+        # Count how many of the cumulative weights each uniform draw is past
+        draws = rng.random(size)
+        return (draws >= self.weights[0]).astype(np.int8) + (draws >= self.weights[0] + self.weights[1])
+
+class CycleBot(Bot):
+    """
+    Plays rock, paper, scissors, rock, ... in every game.
+    """
+    memoryless = False
+
+    def start(self, rng, lanes):
+        return np.zeros(lanes, dtype=np.int8)
+
+    def respond(self, rng, own, other):
+        return beating(own)
+
+class CopyBot(Bot):
+    """
+    Plays whatever the opponent played last.
+    """
+    memoryless = False
+
+    def start(self, rng, lanes):
+        return rng.integers(0, 3, size=lanes, dtype=np.int8)
+
+    def respond(self, rng, own, other):
+        return other
+
+class BeatLastBot(Bot):
+    """
+    Plays the move that beats the opponent's last move.
+    """
+    memoryless = False
+
+    def start(self, rng, lanes):
+        return rng.integers(0, 3, size=lanes, dtype=np.int8)
+
+    def respond(self, rng, own, other):
+        return beating(other)
+
+class WinStayLoseShiftBot(Bot):
+    """
+    Keeps a winning move, and otherwise switches to what would have beaten the opponent. A common human habit.
+    """
+    memoryless = False
+
+    def start(self, rng, lanes):
+        return rng.integers(0, 3, size=lanes, dtype=np.int8)
+
+    def respond(self, rng, own, other):
+        won = resolve_moves(own, other) == FIRST
+        return np.where(won, own, beating(other)).astype(np.int8)
+
+class FrequencyBot(Bot):
+    """
+    Plays the move that beats the opponent's most frequent move so far.
+    """
+    memoryless = False
+
+    def start(self, rng, lanes):
+        self.seen = np.zeros((lanes, 3), dtype=np.int64)
+        self.lanes = np.arange(lanes)
+        return rng.integers(0, 3, size=lanes, dtype=np.int8)
+
+    def respond(self, rng, own, other):
+        self.seen[self.lanes, other] += 1
+        return beating(self.seen.argmax(axis=1)).astype(np.int8)
+
+BOTS = {
+    'rock': RockBot,
+    'random': RandomBot,
+    'biased': BiasedBot,
+    'cycle': CycleBot,
+    'copy': CopyBot,
+    'beat-last': BeatLastBot,
+    'win-stay': WinStayLoseShiftBot,
+    'frequency': FrequencyBot,
+}
+
+def load_bot(spec):
+    """
+    Create a bot from a name in BOTS, or from a plugin given as module:ClassName.
+    """
+    if spec in BOTS:
+        return BOTS[spec]()
+    if ':' in spec:
+        module_name, class_name = spec.split(':', 1)
+        return getattr(importlib.import_module(module_name), class_name)()
+    raise ValueError(f"unknown bot '{spec}', choose from {', '.join(BOTS)} or give module:ClassName")
+
+def play_match(first, second, rounds, seed=None, lanes=LANES, chunk_size=CHUNK_SIZE):
+    """
+    Play rounds rounds between two bots and return how many were ties, first wins and second wins.
+    """
+    rng = np.random.default_rng(seed)
+    totals = np.zeros(3, dtype=np.int64)
+    if first.memoryless and second.memoryless:
+        for start in range(0, rounds, chunk_size):
+            size = min(chunk_size, rounds - start)
+            totals += tally_moves(first.block(rng, size), second.block(rng, size))
+        return totals
+
+    lanes = max(1, min(lanes, rounds))
+    own, other = first.start(rng, lanes), second.start(rng, lanes)
+    played = 0
+    while played < rounds:
+        # The last step can have more games going than rounds left, so only count as many as are needed
+        counted = min(lanes, rounds - played)
+        totals += tally_moves(own[:counted], other[:counted])
+        played += counted
+        own, other = first.respond(rng, own, other), second.respond(rng, other, own)
+    return totals
+
+def play_job(first_spec, second_spec, rounds, seed, lanes, chunk_size):
+    """
+    Play part of a match in a worker process. Bots are created from their specs here, so each job starts with
+    fresh ones.
+    """
+    return play_match(load_bot(first_spec), load_bot(second_spec), rounds, seed, lanes, chunk_size)
+
+def run_tournament(specs, rounds, seed=None, processes=1, lanes=LANES, chunk_size=CHUNK_SIZE,
+                   job_rounds=JOB_ROUNDS):
+    """
+    Play every pair of bots against each other for rounds rounds, spread over processes worker processes.
+    Returns {(first, second): [ties, first wins, second wins]}. Long matches are split into jobs of at most
+    job_rounds rounds, each with its own random stream from seed, so a big tournament keeps every process
+    busy. Every job of a reactive match starts its games afresh.
+    """
+    jobs = []
+    for first, second in combinations(specs, 2):
+        for start in range(0, rounds, job_rounds):
+            jobs.append((first, second, min(job_rounds, rounds - start)))
+    seeds = np.random.SeedSequence(seed).spawn(len(jobs))
+    arguments = [(first, second, size, job_seed, lanes, chunk_size)
+                 for (first, second, size), job_seed in zip(jobs, seeds)]
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(play_job, *zip(*arguments)))
+    else:
+        results = [play_job(*job) for job in arguments]
+
+    matches = {}
+    for (first, second, _), totals in zip(jobs, results):
+        matches.setdefault((first, second), np.zeros(3, dtype=np.int64))
+        matches[(first, second)] += totals
+    return matches
+
+def standings(specs, matches):
+    """
+    Return (bot, wins, losses, ties) rows, best first. Bots are ranked by wins minus losses.
+    """
+    rows = {spec: [0, 0, 0] for spec in specs}
+    for (first, second), (ties, first_wins, second_wins) in matches.items():
+        rows[first][0] += first_wins
+        rows[first][1] += second_wins
+        rows[second][0] += second_wins
+        rows[second][1] += first_wins
+        rows[first][2] += ties
+        rows[second][2] += ties
+    ranked = [(spec, int(wins), int(losses), int(ties)) for spec, (wins, losses, ties) in rows.items()]
+    return sorted(ranked, key=lambda row: row[2] - row[1])
+
+def print_tournament(specs, matches, seconds):
+    """
+    Print each match result, the standings and the throughput of a tournament.
+    """
+    total = sum(int(totals.sum()) for totals in matches.values())
+    width = max(len(spec) for spec in specs)
+    print("Matches:")
+    for (first, second), (ties, first_wins, second_wins) in matches.items():
+        rounds = ties + first_wins + second_wins
+        print(f"  {first:>{width}} vs {second:<{width}}  {100.0 * first_wins / rounds:6.2f}% - "
+              f"{100.0 * second_wins / rounds:6.2f}%  ({100.0 * ties / rounds:.2f}% ties)")
+    print("\nStandings:")
+    for place, (spec, wins, losses, ties) in enumerate(standings(specs, matches), 1):
+        rounds = wins + losses + ties
+        print(f"  {place:2}. {spec:<{width}}  wins {100.0 * wins / rounds:6.2f}%  losses "
+              f"{100.0 * losses / rounds:6.2f}%  net {wins - losses:+,}")
+    print(f"\n{total:,} rounds in {seconds:.2f} s ({total / max(seconds, 1e-9):,.0f} rounds/s)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Play a Rock Paper Scissors tournament between bots.")
+    parser.add_argument('--tournament', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--bots', nargs='+', default=list(BOTS),
+                        help="Bots to enter, by name or as module:ClassName (default: all built-in bots)")
+    parser.add_argument('--rounds', type=int, default=1_000_000, help="Rounds played by each pair of bots")
+    parser.add_argument('--processes', type=int, default=1, help="Worker processes to spread the matches over")
+    parser.add_argument('--lanes', type=int, default=LANES,
+                        help="Games played side by side when a bot reacts to earlier rounds")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rounds per NumPy batch")
+    parser.add_argument('--seed', type=int, help="Random seed, for repeatable results")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Run a tournament from the command line.
+    """
+    args = parse_args(argv)
+    try:
+        specs = list(dict.fromkeys(args.bots))
+        for spec in specs:
+            load_bot(spec)
+        if len(specs) < 2:
+            raise ValueError("a tournament needs at least two different bots")
+        if min(args.rounds, args.processes, args.lanes, args.chunk_size) < 1:
+            raise ValueError("--rounds, --processes, --lanes and --chunk-size must be at least 1")
+    except (ValueError, ImportError, AttributeError) as e:
+        print(f"Error: {e}")
+        return
+    start = time.perf_counter()
+    matches = run_tournament(specs, args.rounds, args.seed, args.processes, args.lanes, args.chunk_size)
+    print_tournament(specs, matches, time.perf_counter() - start)
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,13 @@
 #!/usr/bin/python3.9
 import os.path
 import re
+import sys
+
+# Check which hosts in a file are reachable, e.g. python3 test.py hosts.txt --method tcp --port 22
+if (len(sys.argv) > 1):
+    import host_probe
+    host_probe.main(sys.argv[1:])
+    quit()
 
 """
 
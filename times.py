@@ -1,59 +1,21 @@
 #!/usr/bin/python3.9
 
-import re
+import sys
+from game_input import ask, getN, getT
 
-# Validate text input, make sure the name has a letter in it at least
-def getT(text):
-    err = 0
-    myIn = input(text)
-
-    while not (re.search("[a-zA-Z]", myIn)):
-        print("Not a valid name.")
-
-        err += 1
-
-        # Too many errors, exit.
-        if (err == 3):
-            print("You are an idiot.")
-            exit()
-        
-        myIn = input(text)
- 
-    return myIn
-
-# Validate number input
-def getN(text):
-    err = 0
-    myIn = input(text)
-
-    while (1):
-
-        # Really wanted to use myIn.isdigit() here but I couldn't get it working
-        if (re.search("^\d+$", myIn)):
-            myIn = int(myIn)
-            if (myIn > 0 and myIn < 13):
-               break
-        
-        print("That's not a correct number.")
-        err += 1
-
-        # Too many errors, exit.
-        if (err == 3):
-            print("You are an idiot.")
-            exit()
-
-        myIn = input(text)
-
-    
-    return int(myIn)
+# Generate tables instead of playing, e.g. python3 times.py --tables 1-12 --multipliers 1-10000 --format csv
+if (len(sys.argv) > 1):
+    import times_tables
+    times_tables.main(sys.argv[1:])
+    exit()
 
 name = getT("Welcome to Maths Quest!  What is your name? ")
-table = getN(name + ", which times table would you like to practice? (1-12)  ")
+table = getN(name + ", which times table would you like to practice? (1-12)  ", 1, 12, "That's not a correct number.")
 
 print("Ok",  name + ": on a piece of paper, write down the", table, "times table from 1 to 12.  When you’re ready I’ll show you the answer so you can check your work.")
 
 while (1):
-    play = input("Are you ready? (Enter ‘y’ to start) ")
+    play = ask("Are you ready? (Enter ‘y’ to start) ")
     if play.lower() == "y":
         break
 
@@ -66,7 +28,7 @@ for i in l:
 
 
 while (1):
-    ans = input("Did you get them all correct? (y/n) ")
+    ans = ask("Did you get them all correct? (y/n) ")
     if ans.lower() == "y":
         print("Great job! Thank you for playing Maths Quest.")
         break
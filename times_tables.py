@@ -0,0 +1,219 @@
+#!/usr/bin/python3.9
+# Times table generator for Maths Quest (times.py).
+# Writes any range of times tables, from one 1-12 table to a 1-10000 by 1-10000 grid, as the game's
+# "i x table = product" lines, as CSV, or as a NumPy .npy file of products that is filled through a memory map.
+# Tables are produced in blocks of at most CHUNK_LINES lines: each block's products come from a NumPy outer
+# product and its lines are rendered to ASCII digits with array arithmetic, then written straight to a buffered
+# byte stream, so memory use stays the same however big the table is. Small tables and numbers too big for
+# 64-bit integers are rendered with Python integers instead.
+#
+# Run it directly, or through the game: python3 times.py --tables 1-12 --multipliers 1-12 --headings
+
+import argparse
+import re
+import sys
+import numpy as np
+
+# Global variables
+CHUNK_LINES = 1 << 16  # Lines generated per block, about 2 MB of text
+SMALL_TABLE = 2048  # Below this many lines, plain Python is quicker than setting up the arrays
+WRITE_BUFFER = 1 << 20  # Bytes buffered by the output file
+RANGE_PATTERN = re.compile(r'^\s*(\d+)\s*(?:-\s*(\d+)\s*)?$')
+INT64_MAX = 2**63 - 1
+
+def parse_range(text):
+    """
+    Read "7" or "1-12" and return (first, last). Raises ValueError if it isn't one.
+    """
+    match = RANGE_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"'{text}' is not a number or a range like 1-12")
+    first = int(match.group(1))
+    last = int(match.group(2)) if match.group(2) else first
+    if last < first:
+        raise ValueError(f"the range {text} ends before it starts")
+    return first, last
+
+def iter_blocks(tables, multipliers, per_table=False):
+    """
+    Split the tables x multipliers grid into blocks of at most CHUNK_LINES lines.
+    Yields (table_first, table_last, multiplier_first, multiplier_last) ranges in output order: table by table,
+    and multiplier by multiplier within a table. With per_table=True no block spans two tables.
+    """
+    table_first, table_last = tables
+    multiplier_first, multiplier_last = multipliers
+    width = multiplier_last - multiplier_first + 1
+    if width >= CHUNK_LINES or per_table:
+        for table in range(table_first, table_last + 1):
+            for start in range(multiplier_first, multiplier_last + 1, CHUNK_LINES):
+                yield table, table, start, min(start + CHUNK_LINES - 1, multiplier_last)
+        return
+    step = CHUNK_LINES // width
+    for start in range(table_first, table_last + 1, step):
+        yield start, min(start + step - 1, table_last), multiplier_first, multiplier_last
+
+def digit_width(values):
+    """
+    Return the number of digits in the largest of the non-negative values.
+    """
+    return len(str(int(values.max(initial=0))))
+
+def ascii_digits(values, out):
+    """
+    Render non-negative integers into out, a uint8 array with one row per value and one column per digit of
+    the longest value. Digits are right-aligned, and the unused columns on the left are set to 0 so they can
+    be dropped when the lines are joined.
+    """
+    width = out.shape[1]
+    # Unsigned 32-bit division is quicker, and most products fit
+    remaining = values.astype(np.uint32 if values.max(initial=0) < 2**32 else np.uint64)
+    ten = remaining.dtype.type(10)
+    lengths = np.ones(len(values), dtype=np.int8)
+    for column in range(width - 1, -1, -1):
+        quotient = remaining // ten
+        out[:, column] = remaining - quotient * ten + 48
+        lengths += quotient > 0
+        remaining = quotient
+    out[np.arange(width) < (width - lengths)[:, None]] = 0
+
+def render_block(table_values, multiplier_values, separators):
+    """
+    Render the lines for every multiplier of every table in a block as bytes, joining the multiplier, table
+    and product columns with separators, e.g. (b" x ", b" = ", b"\n") for the game's lines or
+    (b",", b",", b"\n") for CSV.
+    Each line is laid out in a fixed-width row of a byte array, padded with zeros that are removed at the end.
+    The multiplier and table digits are only rendered once per distinct value and broadcast to their rows.
+    """
+    products = np.outer(table_values, multiplier_values).ravel()
+    widths = [digit_width(multiplier_values), digit_width(table_values), digit_width(products)]
+    offsets = []
+    position = 0
+    for width, separator in zip(widths, separators):
+        offsets.append(position)
+        position += width + len(separator)
+    lines = np.zeros((len(table_values), len(multiplier_values), position), dtype=np.uint8)
+    for offset, width, separator in zip(offsets, widths, separators):
+        lines[:, :, offset + width:offset + width + len(separator)] = np.frombuffer(separator, dtype=np.uint8)
+
+    multiplier_digits = np.empty((len(multiplier_values), widths[0]), dtype=np.uint8)
+    ascii_digits(multiplier_values, multiplier_digits)
+    lines[:, :, offsets[0]:offsets[0] + widths[0]] = multiplier_digits[None, :, :]
+    table_digits = np.empty((len(table_values), widths[1]), dtype=np.uint8)
+    ascii_digits(table_values, table_digits)
+    lines[:, :, offsets[1]:offsets[1] + widths[1]] = table_digits[:, None, :]
+    product_digits = np.empty((len(products), widths[2]), dtype=np.uint8)
+    ascii_digits(products, product_digits)
+    lines.reshape(len(products), position)[:, offsets[2]:offsets[2] + widths[2]] = product_digits
+
+    lines = lines.ravel()
+    return lines[lines != 0].tobytes()
+
+def render_block_exact(table_first, table_last, multiplier_first, multiplier_last, separators):
+    """
+    Render a block with Python integers, for numbers that don't fit in 64 bits and for small tables.
+    """
+    first, second, end = (separator.decode('ascii') for separator in separators)
+    multiplier_text = [str(multiplier) for multiplier in range(multiplier_first, multiplier_last + 1)]
+    parts = []
+    for table in range(table_first, table_last + 1):
+        middle = f"{first}{{}}{second}".format(table)
+        if table:
+            products = map(str, range(table * multiplier_first, table * (multiplier_last + 1), table))
+        else:
+            # Every product is 0, and range() can't step by 0
+            products = ["0"] * len(multiplier_text)
+        parts.append(end.join(map(middle.join, zip(multiplier_text, products))) + end)
+    return "".join(parts).encode('ascii')
+
+def write_tables(stream, tables, multipliers, separators=(b" x ", b" = ", b"\n"), headings=False):
+    """
+    Write the tables x multipliers grid to a binary stream and return the number of lines written.
+    Each line is multiplier, separator, table, separator, product, separator, in the order times.py prints
+    them. With headings=True each table starts with a "== 7 times table ==" line.
+    """
+    count = 0
+    lines = (tables[1] - tables[0] + 1) * (multipliers[1] - multipliers[0] + 1)
+    exact = tables[1] * multipliers[1] > INT64_MAX or lines < SMALL_TABLE
+    for table_first, table_last, multiplier_first, multiplier_last in iter_blocks(tables, multipliers, headings):
+        if headings and multiplier_first == multipliers[0]:
+            # A blank line between tables
+            stream.write((b"\n" if count else b"") + f"== {table_first} times table ==\n".encode('ascii'))
+        if exact:
+            stream.write(render_block_exact(table_first, table_last, multiplier_first, multiplier_last,
+                                            separators))
+        else:
+            table_values = np.arange(table_first, table_last + 1, dtype=np.int64)
+            multiplier_values = np.arange(multiplier_first, multiplier_last + 1, dtype=np.int64)
+            stream.write(render_block(table_values, multiplier_values, separators))
+        count += (table_last - table_first + 1) * (multiplier_last - multiplier_first + 1)
+    return count
+
+def write_npy(path, tables, multipliers):
+    """
+    Write the products as a tables x multipliers int64 .npy file, filled block by block through a memory map.
+    Row r, column c holds (tables[0] + r) * (multipliers[0] + c). Returns the number of products written.
+    """
+    if tables[1] * multipliers[1] > INT64_MAX:
+        raise ValueError("the products don't fit in 64-bit integers, use --format text or csv")
+    rows = tables[1] - tables[0] + 1
+    shape = (rows, multipliers[1] - multipliers[0] + 1)
+    products = np.lib.format.open_memmap(path, mode='w+', dtype=np.int64, shape=shape)
+    multiplier_values = np.arange(multipliers[0], multipliers[1] + 1, dtype=np.int64)
+    for table_first, table_last, multiplier_first, multiplier_last in iter_blocks(tables, multipliers):
+        row_slice = slice(table_first - tables[0], table_last - tables[0] + 1)
+        column_slice = slice(multiplier_first - multipliers[0], multiplier_last - multipliers[0] + 1)
+        table_values = np.arange(table_first, table_last + 1, dtype=np.int64)
+        products[row_slice, column_slice] = np.outer(table_values, multiplier_values[column_slice])
+    products.flush()
+    del products
+    return shape[0] * shape[1]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate times tables for Maths Quest.")
+    parser.add_argument('--tables', default="1-12", help="Tables to write, e.g. 7 or 1-12 (default: %(default)s)")
+    parser.add_argument('--multipliers', default="1-12",
+                        help="What each table goes up to, e.g. 1-12 or 1-10000 (default: %(default)s)")
+    parser.add_argument('--format', choices=['text', 'csv', 'npy'], default='text',
+                        help="'text' for the game's lines, 'csv', or 'npy' for a memory-mapped NumPy file")
+    parser.add_argument('--output', help="File to write to instead of standard output (required for npy)")
+    parser.add_argument('--headings', action='store_true', help="Start each table with a heading line (text only)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Generate tables from the command line.
+    """
+    args = parse_args(argv)
+    try:
+        tables = parse_range(args.tables)
+        multipliers = parse_range(args.multipliers)
+        if args.format == 'npy':
+            if not args.output:
+                raise ValueError("--format npy needs an --output file")
+            write_npy(args.output, tables, multipliers)
+            return
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    stream = open(args.output, 'wb', buffering=WRITE_BUFFER) if args.output else sys.stdout.buffer
+    try:
+        if args.format == 'csv':
+            stream.write(b"multiplier,table,product\n")
+            write_tables(stream, tables, multipliers, (b",", b",", b"\n"))
+        else:
+            write_tables(stream, tables, multipliers, headings=args.headings)
+    except BrokenPipeError:
+        # The reader (head, less) stopped early
+        pass
+    finally:
+        if args.output:
+            stream.close()
+        else:
+            try:
+                stream.flush()
+            except BrokenPipeError:
+                pass
+
+if __name__ == '__main__':
+    main()
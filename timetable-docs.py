@@ -4,52 +4,31 @@
 # Ensure required Python modules are installed:
 # pip install --upgrade google-api-python-client google-auth-httplib2 google-auth-oauthlib
 
+import argparse
+import json
 import os
-import pickle
-import datetime
 import re
+import time
 import logging
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import timetable_metrics
+import timetable_sync
+from timetable_core import (CREDENTIALS_JSON_PATH, add_sync_arguments, authenticate_google, parse_schedule,
+                            plan_calendar, show_plan, sync_calendar)
+from concurrent.futures import ThreadPoolExecutor
+from timetable_sync import ApiExecutor, LazyService, configure_executor, execute, using_executor
 
 # Global variables
-TIMEZONE = 'Australia/Melbourne'
 SCOPES = ['https://www.googleapis.com/auth/documents', 'https://www.googleapis.com/auth/calendar']
-TOKEN_PICKLE_PATH = 'token.pickle'
-CREDENTIALS_JSON_PATH = 'credentials.json'
 DOCS_URL_FILE = 'docs.url'
-GOOGLE_API_CREDENTIALS_URL = 'https://developers.google.com/docs/api/quickstart/python'
+DOCUMENT_FIELDS = 'revisionId,body(content(endIndex,paragraph(elements(textRun(content)))))'
+WATCH_INTERVAL = 60  # Seconds between revision checks in --watch mode
+TENANT_WORKERS = 16  # Tenants synced at the same time with --tenants
 
 # Set logging level to WARNING by default
 # logging.basicConfig(level=logging.DEBUG)
 logging.basicConfig(level=logging.WARNING)
 
-def authenticate_google():
-    """
-    Authenticate the user with Google API and return the credentials.
-    This function handles the OAuth2 flow and stores the credentials in a token.pickle file.
-    """
-    creds = None
-    if os.path.exists(TOKEN_PICKLE_PATH):
-        with open(TOKEN_PICKLE_PATH, 'rb') as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            if not os.path.exists(CREDENTIALS_JSON_PATH):
-                logging.error(f"Credentials file '{CREDENTIALS_JSON_PATH}' not found.")
-                logging.info(f"Please download credentials.json from {GOOGLE_API_CREDENTIALS_URL}")
-                return None
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_JSON_PATH, SCOPES)
-            creds = flow.run_local_server(port=0)
-            with open(TOKEN_PICKLE_PATH, 'wb') as token:
-                pickle.dump(creds, token)
-    return creds
-
 def get_docs_url():
     """
     Get the Google Docs URL from the file or prompt the user if not available.
@@ -68,225 +47,318 @@ def get_docs_url():
         file.write(url)
     return url
 
-def read_google_doc(doc_id, service):
+def get_document_id(docs_url):
+    """
+    Extract the document ID from a Google Docs URL, or return None if the URL doesn't contain one.
+    """
+    match = re.search(r'/d/([a-zA-Z0-9-_]+)', docs_url)
+    return match.group(1) if match else None
+
+def fetch_document(service, document_id):
     """
-    Read the content of a Google Doc and return it as a string.
-    This function retrieves the content of the specified Google Doc and concatenates all text elements into a single string.
+    Fetch a snapshot of the Google Doc for this run.
+    Only the revision ID, paragraph text runs and indexes are requested, so styles and other metadata are not
+    downloaded. The snapshot is shared by check_pastehere_exists, read_google_doc and reset_document.
     """
     try:
-        document = service.documents().get(documentId=doc_id).execute()
-        doc_content = document.get('body').get('content')
-        lines = []
-        for element in doc_content:
-            if 'paragraph' in element:
-                elements = element['paragraph']['elements']
-                for elem in elements:
-                    if 'textRun' in elem:
-                        lines.append(elem['textRun']['content'])
-        return '\n'.join(lines)
+        return execute(service.documents().get(documentId=document_id, fields=DOCUMENT_FIELDS))
     except HttpError as err:
         logging.error(f"HTTP error occurred while reading the document: {err}")
-        return ""
+        return None
 
-def parse_schedule(input_data):
+def read_google_doc(document):
     """
-    Parse the schedule from the input data.
-    This function extracts the schedule information from the input text and returns a list of tuples containing
-    the day of the week, start datetime, and end datetime for each schedule entry.
+    Read the content of a Google Doc snapshot and return it as a string.
+    This function concatenates all text elements of the document into a single string.
     """
-    schedule = []
-    day_map = {"Mo": "Monday", "Tu": "Tuesday", "We": "Wednesday", "Th": "Thursday", "Fr": "Friday"}
-    pattern = re.compile(r'^(Mo|Tu|We|Th|Fr) (\d{1,2}/\d{1,2}): (\d{2}:\d{2})->(\d{2}:\d{2})$')
-    
-    for line in input_data.strip().splitlines():
-        line = line.strip()
-        if "NO REPLY" in line:
-            break
-        elif pattern.match(line):
-            try:
-                match = pattern.match(line)
-                day = match.group(1)
-                date_str = match.group(2)
-                start_time = match.group(3)
-                end_time = match.group(4)
-                
-                # Parse date and time
-                date_obj = datetime.datetime.strptime(date_str, '%d/%m')
-                current_year = datetime.datetime.now().year
-                start_datetime = datetime.datetime.combine(date_obj.replace(year=current_year),
-                                                           datetime.datetime.strptime(start_time, '%H:%M').time())
-                end_datetime = datetime.datetime.combine(date_obj.replace(year=current_year),
-                                                         datetime.datetime.strptime(end_time, '%H:%M').time())
-                
-                # Adjust for day of the week
-                day_of_week = day_map[day]
-                while start_datetime.weekday() != list(day_map.keys()).index(day):
-                    start_datetime += datetime.timedelta(days=1)
-                    end_datetime += datetime.timedelta(days=1)
-                
-                schedule.append((day_of_week, start_datetime, end_datetime))
-            except Exception as e:
-                logging.error(f"Failed to parse line: {line}. Error: {e}")
-    return schedule
+    doc_content = document.get('body').get('content')
+    lines = []
+    for element in doc_content:
+        if 'paragraph' in element:
+            elements = element['paragraph']['elements']
+            for elem in elements:
+                if 'textRun' in elem:
+                    lines.append(elem['textRun']['content'])
+    return '\n'.join(lines)
 
-def delete_existing_work_events(service, calendar_id, date):
+def reset_document(service, document_id, document):
     """
-    Delete existing work events on the specified date.
-    This function removes all events with the summary 'Work' from the Google Calendar on the specified date.
+    Clear the Google Document and insert 'PASTEHERE' at the beginning in a single batchUpdate.
+    The update is tied to the revision of the snapshot the schedule was read from, so if someone edited the
+    document during the sync it is left alone instead of losing their changes.
+    Returns the new revision ID, or None if the update failed.
     """
-    start_datetime = datetime.datetime.combine(date, datetime.time.min).isoformat() + 'Z'
-    end_datetime = datetime.datetime.combine(date, datetime.time.max).isoformat() + 'Z'
+    requests = []
+    end_index = document['body']['content'][-1]['endIndex'] - 1
+    if end_index > 1:
+        requests.append({
+            'deleteContentRange': {
+                'range': {
+                    'startIndex': 1,
+                    'endIndex': end_index
+                }
+            }
+        })
+    requests.append({
+        'insertText': {
+            'location': {
+                'index': 1,
+            },
+            'text': 'PASTEHERE\n'
+        }
+    })
+    body = {
+        'requests': requests,
+        'writeControl': {
+            'requiredRevisionId': document['revisionId']
+        }
+    }
     try:
-        events_result = service.events().list(calendarId=calendar_id,
-                                              timeMin=start_datetime,
-                                              timeMax=end_datetime,
-                                              singleEvents=True,
-                                              orderBy='startTime').execute()
-        events = events_result.get('items', [])
-        for event in events:
-            if event.get('summary') == 'Work':
-                try:
-                    service.events().delete(calendarId=calendar_id, eventId=event['id']).execute()
-                except HttpError as err:
-                    logging.error(f"HTTP error occurred while deleting event: {event.get('summary')} at {event['start'].get('dateTime')}. Error: {err.content}")
-                except Exception as e:
-                    logging.error(f"Failed to delete event: {event.get('summary')} at {event.get('start').get('dateTime')}. Error: {e}")
+        result = execute(service.documents().batchUpdate(documentId=document_id, body=body))
+        print("Document content cleared successfully.")
+        print("'PASTEHERE' inserted successfully.")
+        return result.get('writeControl', {}).get('requiredRevisionId')
     except HttpError as err:
-        logging.error(f"HTTP error occurred while querying events: {err.content}")
-    except Exception as e:
-        logging.error(f"Failed to query events for {date}. Error: {e}")
+        if err.resp.status == 400 and 'revision' in str(err).lower():
+            logging.error("The document was edited during the sync, so it was not cleared. Run the script again.")
+        else:
+            logging.error(f"An error occurred while clearing the document: {err}")
+        return None
 
-def create_event(service, calendar_id, day, start_datetime, end_datetime):
+def check_pastehere_exists(document):
     """
-    Create a new work event in the calendar.
-    This function adds a new event with the summary 'Work' to the Google Calendar with the specified start and end times.
+    Check if 'PASTEHERE' is already present in the document.
+    This function checks the text of the document snapshot for 'PASTEHERE'.
+    If 'PASTEHERE' is found, the function returns True, otherwise False.
     """
-    event = {
-        'summary': 'Work',
-        'start': {
-            'dateTime': start_datetime.isoformat(),
-            'timeZone': TIMEZONE,
-        },
-        'end': {
-            'dateTime': end_datetime.isoformat(),
-            'timeZone': TIMEZONE,
-        },
-    }
-    try:
-        event = service.events().insert(calendarId=calendar_id, body=event).execute()
-        print(f"-> {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
-    except HttpError as err:
-        logging.error(f"HTTP error occurred while creating event: {err.content}")
+    doc_content = document.get('body').get('content')
+    for element in doc_content:
+        if 'paragraph' in element:
+            elements = element['paragraph']['elements']
+            for elem in elements:
+                if 'textRun' in elem and 'PASTEHERE' in elem['textRun']['content']:
+                    return True
+    return False
 
-def clear_document(service, document_id):
+def sync_document(docs_service, calendar_service, document_id, args):
     """
-    Clear the entire content of the Google Document.
-    This function deletes all content from the specified Google Document.
+    Copy the schedule in the document to the calendar, then reset the document to 'PASTEHERE'.
+    Returns the revision ID the document is at afterwards, or None if it couldn't be read, synced or reset, so
+    the next poll in --watch mode tries again.
     """
+    # Fetch the document once and share the snapshot for the rest of the run
+    document = fetch_document(docs_service, document_id)
+    if document is None:
+        return None
+
+    # Check if 'PASTEHERE' is already in the document
+    if check_pastehere_exists(document):
+        if args.watch:
+            print("'PASTEHERE' already exists in the document. Waiting for the next change.")
+        else:
+            print("'PASTEHERE' already exists in the document. Exiting script.")
+        return document['revisionId']
+
+    # Read and parse schedule from Google Docs, then update the calendar
+    input_data = read_google_doc(document)
+    with timetable_metrics.phase('parse', profile=True):
+        schedule = parse_schedule(input_data)
+    if args.plan:
+        plan, reads = plan_calendar(calendar_service, schedule, args)
+        if plan is None:
+            return None
+        show_plan(plan, dict({'docs.documents.get': 1}, **reads), args, document_writes=1)
+        return document['revisionId']
+    with timetable_metrics.phase('sync calendar'):
+        complete = sync_calendar(calendar_service, schedule, args)
+    if not complete:
+        # Keep the schedule in the document so the next run can resume the sync
+        print("Leaving the document as it is until the calendar sync completes.")
+        return None
+
+    # Clear the document and insert 'PASTEHERE'
+    return reset_document(docs_service, document_id, document)
+
+def watch_document(docs_service, calendar_service, document_id, args):
+    """
+    Keep syncing the document whenever it changes, until interrupted.
+    Credentials and services stay in memory between polls. Each poll only asks for the document's revision ID,
+    and the full document is fetched and synced only when that revision has changed.
+    """
+    print(f"Watching the document for changes every {args.interval} seconds. Press Ctrl+C to stop.")
+    last_revision = None
     try:
-        # Get the current content of the document
-        document = service.documents().get(documentId=document_id).execute()
-        end_index = document['body']['content'][-1]['endIndex'] - 1
-
-        # Clear the content
-        requests = [
-            {
-                'deleteContentRange': {
-                    'range': {
-                        'startIndex': 1,
-                        'endIndex': end_index
-                    }
-                }
-            }
-        ]
-        service.documents().batchUpdate(documentId=document_id, body={'requests': requests}).execute()
-        print("Document content cleared successfully.")
-    except HttpError as err:
-        logging.error(f"An error occurred while clearing the document: {err}")
+        while True:
+            try:
+                # The credentials are cached for the process, so this only refreshes and saves the token
+                # when it is about to expire
+                authenticate_google(SCOPES, interactive=False)
+
+                document = execute(docs_service.documents().get(documentId=document_id, fields='revisionId'))
+                if document['revisionId'] != last_revision:
+                    last_revision = sync_document(docs_service, calendar_service, document_id, args)
+            except HttpError as err:
+                logging.error(f"HTTP error occurred while checking the document for changes: {err}")
+            except Exception as e:
+                logging.error(f"An unexpected error occurred: {e}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("Stopped watching the document.")
 
-def insert_pastehere(service, document_id):
+def load_tenants(path):
     """
-    Insert 'PASTEHERE' at the beginning of the document.
-    This function adds the text 'PASTEHERE' to the start of the specified Google Document.
+    Read the list of tenants from a JSON config file.
+    The file holds a list of objects, one per person, for example:
+        [{"name": "alex", "token": "tokens/alex.pickle", "doc_url": "https://docs.google.com/document/d/...",
+          "calendar_id": "primary"}]
+    "calendar_id" defaults to 'primary', "event_index" (the --upsert index) to events-<name>.sqlite, "mirror"
+    (the calendar mirror) to mirror-<name>.sqlite and "journal" (the resume journal) to journal-<name>.sqlite.
     """
-    requests = [
-        {
-            'insertText': {
-                'location': {
-                    'index': 1,
-                },
-                'text': 'PASTEHERE\n'
-            }
-        }
-    ]
+    with open(path, 'r') as file:
+        tenants = json.load(file)
+    for number, tenant in enumerate(tenants, 1):
+        missing = [key for key in ('name', 'token', 'doc_url') if not tenant.get(key)]
+        if missing:
+            raise ValueError(f"Tenant {number} in '{path}' is missing {', '.join(missing)}.")
+        tenant.setdefault('calendar_id', 'primary')
+        tenant.setdefault('event_index', f"events-{tenant['name']}.sqlite")
+        tenant.setdefault('mirror', f"mirror-{tenant['name']}.sqlite")
+        tenant.setdefault('journal', f"journal-{tenant['name']}.sqlite")
+    return tenants
+
+def sync_tenant(tenant, docs_service, calendar_service, args):
+    """
+    Sync one tenant's document to their calendar with their own credentials.
+    Each tenant gets its own executor, so its API calls reuse the tenant's HTTP connections and count against
+    the tenant's own rate limit. Raises an exception if the tenant couldn't be synced.
+    """
+    document_id = get_document_id(tenant['doc_url'])
+    if not document_id:
+        raise ValueError("invalid Google Docs URL")
+    with timetable_metrics.phase('auth'):
+        creds = authenticate_google(SCOPES, tenant['token'], tenant.get('credentials', CREDENTIALS_JSON_PATH),
+                                    interactive=False)
+    if not creds:
+        raise RuntimeError("failed to authenticate with Google API")
+
+    tenant_args = argparse.Namespace(**vars(args))
+    tenant_args.calendar = tenant['calendar_id']
+    tenant_args.event_index = tenant['event_index']
+    tenant_args.mirror = tenant['mirror']
+    tenant_args.journal = tenant['journal']
+    executor = ApiExecutor(creds, max_workers=args.workers)
     try:
-        service.documents().batchUpdate(documentId=document_id, body={'requests': requests}).execute()
-        print("'PASTEHERE' inserted successfully.")
-    except HttpError as err:
-        logging.error(f"An error occurred while inserting 'PASTEHERE': {err}")
+        with using_executor(executor):
+            if sync_document(docs_service, calendar_service, document_id, tenant_args) is None:
+                raise RuntimeError("the document couldn't be read, synced or reset")
+    finally:
+        executor.shutdown()
 
-def check_pastehere_exists(service, document_id):
+def run_tenants(args):
     """
-    Check if 'PASTEHERE' is already present in the document.
-    This function reads the content of the specified Google Document and checks if 'PASTEHERE' exists.
-    If 'PASTEHERE' is found, the function returns True, otherwise False.
+    Sync every tenant in the --tenants config on a bounded pool of worker threads.
+    A failure only affects its own tenant: it is logged, and the other tenants carry on.
     """
     try:
-        document = service.documents().get(documentId=document_id).execute()
-        doc_content = document.get('body').get('content')
-        for element in doc_content:
-            if 'paragraph' in element:
-                elements = element['paragraph']['elements']
-                for elem in elements:
-                    if 'textRun' in elem and 'PASTEHERE' in elem['textRun']['content']:
-                        return True
-    except HttpError as err:
-        logging.error(f"HTTP error occurred while checking for 'PASTEHERE': {err}")
-    return False
+        tenants = load_tenants(args.tenants)
+    except (OSError, ValueError) as e:
+        logging.error(f"Couldn't read the tenants config: {e}")
+        return
+
+    # Building the clients (the Docs one especially) costs far more CPU than a tenant's sync, so all tenants
+    # share one pair built without credentials. Requests go out over each tenant's own authorized HTTP objects.
+    docs_service = LazyService('docs', 'v1', None)
+    calendar_service = LazyService('calendar', 'v3', None)
+
+    def sync_one(tenant):
+        start = time.perf_counter()
+        try:
+            sync_tenant(tenant, docs_service, calendar_service, args)
+        except Exception as e:
+            logging.error(f"Tenant '{tenant['name']}' failed: {e}")
+            return False, time.perf_counter() - start
+        return True, time.perf_counter() - start
 
-def main():
+    with ThreadPoolExecutor(max_workers=args.tenant_workers) as pool:
+        results = list(pool.map(sync_one, tenants))
+
+    for tenant, (ok, seconds) in zip(tenants, results):
+        print(f"{tenant['name']}: {'synced' if ok else 'FAILED'} in {seconds:.1f}s")
+    failed = sum(1 for ok, _ in results if not ok)
+    print(f"Synced {len(tenants) - failed} of {len(tenants)} tenant(s).")
+
+def parse_args(argv=None):
+    """
+    Parse the command line options.
+    """
+    parser = argparse.ArgumentParser(description="Copy the timetable in a Google Doc into Google Calendar.")
+    add_sync_arguments(parser)
+    parser.add_argument('--tenants', metavar='CONFIG',
+                        help="sync every document and calendar listed in the JSON file CONFIG instead of docs.url")
+    parser.add_argument('--tenant-workers', type=int, default=TENANT_WORKERS,
+                        help="number of tenants to sync at the same time with --tenants (default: %(default)s)")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and sync whenever the document changes")
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL,
+                        help="seconds between checks for changes in --watch mode (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.tenants and args.watch:
+        parser.error("--watch can't be combined with --tenants")
+    if args.plan and args.watch:
+        parser.error("--watch can't be combined with --plan")
+    return args
+
+def main(argv=None):
     """
     Main function to run the script.
     This function orchestrates the authentication, document reading, schedule parsing, calendar management,
     document clearing, and 'PASTEHERE' insertion processes.
     """
+    args = parse_args(argv)
+    timetable_sync.BATCH_SIZE = args.batch_size
+    # A --plan run reads the latencies measured by earlier runs from the --metrics directory instead
+    if (args.metrics or args.profile) and not args.plan:
+        timetable_metrics.enable(profile=args.profile)
+    try:
+        run(args)
+    finally:
+        if timetable_metrics.enabled():
+            timetable_metrics.export(args.metrics or timetable_metrics.DEFAULT_DIRECTORY)
+
+def run(args):
+    """
+    Authenticate, build the services and sync the document once, or keep watching it with --watch.
+    """
+    if args.tenants:
+        run_tenants(args)
+        return
+
     # Authenticate with Google API
-    creds = authenticate_google()
+    with timetable_metrics.phase('auth'):
+        creds = authenticate_google(SCOPES)
     if not creds:
         logging.error("Failed to authenticate with Google API.")
         return
 
+    # Run API calls on a rate-limited worker pool with retries
+    configure_executor(creds, max_workers=args.workers)
+
     try:
-        # Build the Docs and Calendar services
-        docs_service = build('docs', 'v1', credentials=creds)
-        calendar_service = build('calendar', 'v3', credentials=creds)
+        # The Docs and Calendar services are built on first use, so the calendar client is never built
+        # when the document already says 'PASTEHERE'
+        docs_service = LazyService('docs', 'v1', creds)
+        calendar_service = LazyService('calendar', 'v3', creds)
 
         # Get Google Docs URL and extract document ID
-        docs_url = get_docs_url()
-        match = re.search(r'/d/([a-zA-Z0-9-_]+)', docs_url)
-        if not match:
+        document_id = get_document_id(get_docs_url())
+        if not document_id:
             logging.error("Invalid Google Docs URL.")
             return
-        document_id = match.group(1)
-
-        # Check if 'PASTEHERE' is already in the document
-        if check_pastehere_exists(docs_service, document_id):
-            print("'PASTEHERE' already exists in the document. Exiting script.")
-            return
 
-        # Read and parse schedule from Google Docs
-        input_data = read_google_doc(document_id, docs_service)
-        schedule = parse_schedule(input_data)
-
-        # Process each schedule entry
-        calendar_id = 'primary'
-        for day, start_datetime, end_datetime in schedule:
-            delete_existing_work_events(calendar_service, calendar_id, start_datetime.date())
-            create_event(calendar_service, calendar_id, day, start_datetime, end_datetime)
-
-        # Clear the document and insert 'PASTEHERE'
-        clear_document(docs_service, document_id)
-        insert_pastehere(docs_service, document_id)
+        if args.watch:
+            watch_document(docs_service, calendar_service, document_id, args)
+        else:
+            sync_document(docs_service, calendar_service, document_id, args)
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}")
 
@@ -4,169 +4,166 @@
 # Make sure required python modules are installed:
 # pip install --upgrade google-api-python-client google-auth-httplib2 google-auth-oauthlib
 #
+import argparse
 import os
-import pickle
 import sys
-import datetime
-import re
 import logging
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import timetable_metrics
+import timetable_sync
+from timetable_core import add_sync_arguments, authenticate_google, plan_calendar, show_plan, sync_calendar
+from timetable_ics import iter_csv, iter_ics, write_ics
+from timetable_sync import LazyService, configure_executor, iter_schedule, iter_schedule_chunks, sort_schedule
 
 # Global variables
-TIMEZONE = 'Australia/Melbourne'
 SCOPES = ['https://www.googleapis.com/auth/calendar']
-TOKEN_PICKLE_PATH = 'token.pickle'
-CREDENTIALS_JSON_PATH = 'credentials.json'
-
-# URL for obtaining Google API credentials
-GOOGLE_API_CREDENTIALS_URL = 'https://developers.google.com/docs/api/quickstart/python'
 
 logging.basicConfig(level=logging.WARNING)  # Set logging level to WARNING by default
 
-def authenticate_google():
-    creds = None
-
-    if os.path.exists(TOKEN_PICKLE_PATH):
-        with open(TOKEN_PICKLE_PATH, 'rb') as token:
-            creds = pickle.load(token)
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            if not os.path.exists(CREDENTIALS_JSON_PATH):
-                logging.error(f"Credentials file '{CREDENTIALS_JSON_PATH}' not found.")
-                logging.info(f"Please download credentials.json from {GOOGLE_API_CREDENTIALS_URL}")
-                return None
-
-            flow = InstalledAppFlow.from_client_secrets_file(
-                CREDENTIALS_JSON_PATH, SCOPES)
-            creds = flow.run_local_server(port=0)
-
-        with open(TOKEN_PICKLE_PATH, 'wb') as token:
-            pickle.dump(creds, token)
-
-    return creds
-
-def parse_schedule(input_data):
-    schedule = []
-    day_map = {"Mo": "Monday", "Tu": "Tuesday", "We": "Wednesday", "Th": "Thursday", "Fr": "Friday"}
-
-    pattern = re.compile(r'^(Mo|Tu|We|Th|Fr) (\d{1,2}/\d{1,2}): (\d{2}:\d{2})->(\d{2}:\d{2})$')
-
-    for line in input_data.strip().splitlines():
+def read_pasted_lines(stream):
+    """
+    Hand pasted lines to the parser as they are typed, stopping at a blank line or 'NO REPLY'.
+    """
+    for line in stream:
         line = line.strip()
+        if not line:
+            return
         if "NO REPLY" in line:
-            break
-        elif pattern.match(line):
-            try:
-                match = pattern.match(line)
-                day = match.group(1)
-                date_str = match.group(2)
-                start_time = match.group(3)
-                end_time = match.group(4)
-
-                # Parse date and time
-                date_obj = datetime.datetime.strptime(date_str, '%d/%m')
-                current_year = datetime.datetime.now().year
-                start_datetime = datetime.datetime.combine(date_obj.replace(year=current_year),
-                                                           datetime.datetime.strptime(start_time, '%H:%M').time())
-                end_datetime = datetime.datetime.combine(date_obj.replace(year=current_year),
-                                                         datetime.datetime.strptime(end_time, '%H:%M').time())
-
-                # Adjust for day of the week
-                day_of_week = day_map[day]
-                while start_datetime.weekday() != list(day_map.keys()).index(day):
-                    start_datetime += datetime.timedelta(days=1)
-                    end_datetime += datetime.timedelta(days=1)
-
-                schedule.append((day_of_week, start_datetime, end_datetime))
-            except Exception as e:
-                logging.error(f"Failed to parse line: {line}. Error: {e}")
-
-    return schedule
-
-def delete_existing_work_events(service, calendar_id, date):
-    start_datetime = datetime.datetime.combine(date, datetime.time.min).isoformat() + 'Z'
-    end_datetime = datetime.datetime.combine(date, datetime.time.max).isoformat() + 'Z'
-
-    try:
-        events_result = service.events().list(calendarId=calendar_id,
-                                              timeMin=start_datetime,
-                                              timeMax=end_datetime,
-                                              singleEvents=True,
-                                              orderBy='startTime').execute()
-        events = events_result.get('items', [])
-
-        for event in events:
-            if event.get('summary') == 'Work':
-                try:
-                    service.events().delete(calendarId=calendar_id, eventId=event['id']).execute()
-                except HttpError as err:
-                    logging.error(f"HTTP error occurred while deleting event: {event.get('summary')} at {event['start'].get('dateTime')}. Error: {err.content}")
-                except Exception as e:
-                    logging.error(f"Failed to delete event: {event.get('summary')} at {event['start'].get('dateTime')}. Error: {e}")
-
-    except HttpError as err:
-        logging.error(f"HTTP error occurred while querying events: {err.content}")
-    except Exception as e:
-        logging.error(f"Failed to query events for {date}. Error: {e}")
-
-def create_event(service, calendar_id, day, start_datetime, end_datetime):
-    event = {
-        'summary': 'Work',
-        'start': {
-            'dateTime': start_datetime.isoformat(),
-            'timeZone': TIMEZONE,
-        },
-        'end': {
-            'dateTime': end_datetime.isoformat(),
-            'timeZone': TIMEZONE,
-        },
-    }
+            print("Detected 'NO REPLY'. Stopping further input processing.")
+            return
+        yield line
+
+def iter_file_schedule(file, args):
+    """
+    Pick the reader from the file extension: .ics, .csv, or the pasted text format.
+    """
+    extension = os.path.splitext(args.file)[1].lower()
+    if extension == '.ics':
+        return iter_ics(file)
+    if extension == '.csv':
+        return iter_csv(file)
+    return iter_schedule(file, year=args.year, rollover=True)
+
+def sync_file(calendar_service, args):
+    """
+    Bulk mode: stream a roster file through the parser and sync it a chunk of days at a time,
+    so memory use stays flat however many years of history the file holds.
+    """
+    total = 0
+    with open(args.file, 'r') as file:
+        entries = iter_file_schedule(file, args)
+        if os.path.splitext(args.file)[1].lower() in ('.ics', '.csv'):
+            # Chunks must hold whole days, and .ics and CSV files aren't necessarily in date order. Long files
+            # are sorted through temporary files, so memory use stays flat for them too.
+            entries = sort_schedule(entries)
+        plan, reads = [], {}
+        for chunk in iter_schedule_chunks(entries):
+            total += len(chunk)
+            if args.plan:
+                chunk_plan, chunk_reads = plan_calendar(calendar_service, chunk, args)
+                if chunk_plan is None:
+                    return
+                plan += chunk_plan
+                for method, count in chunk_reads.items():
+                    reads[method] = reads.get(method, 0) + count
+                continue
+            if not sync_calendar(calendar_service, chunk, args):
+                # Later chunks wait, so a rerun picks up from this one
+                logging.error(f"Stopped syncing {args.file} at the chunk from {chunk[0][1].strftime('%Y-%m-%d')} "
+                              f"to {chunk[-1][1].strftime('%Y-%m-%d')}. Run it again to carry on from there.")
+                return
+            print(f"Synced {total} schedule entries so far, up to {chunk[-1][1].strftime('%Y-%m-%d')}.")
+
+    if not total:
+        print("No valid schedule data found.")
+    elif args.plan:
+        show_plan(plan, reads, args)
+
+def export_ics(args):
+    """
+    Offline mode: write the schedule to an .ics file for a one-off import, without touching the API.
+    """
+    with open(args.ics, 'w', newline='') as out:
+        if args.file:
+            with open(args.file, 'r') as file:
+                count = write_ics(iter_file_schedule(file, args), out)
+        else:
+            print("Paste your schedule:")
+            count = write_ics(iter_schedule(read_pasted_lines(sys.stdin)), out)
+    print(f"Wrote {count} shift(s) to {args.ics}. Import it in Google Calendar under Settings > Import & export.")
+
+def parse_args(argv=None):
+    """
+    Parse the command line options.
+    """
+    parser = argparse.ArgumentParser(description="Copy a pasted timetable into Google Calendar.")
+    add_sync_arguments(parser)
+    parser.add_argument('--file',
+                        help="read a roster file instead of pasted input, syncing it in chunks of days; "
+                             ".ics and .csv (date,start,end) files are read as well as the pasted format")
+    parser.add_argument('--year', type=int,
+                        help="year of the first entry in --file (default: this year); later entries roll over "
+                             "to the next year when the month goes back to January")
+    parser.add_argument('--ics', metavar='OUT',
+                        help="write the schedule to the iCalendar file OUT instead of syncing it (works offline)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Main function to run the script.
+    """
+    args = parse_args(argv)
+    timetable_sync.BATCH_SIZE = args.batch_size
+    # A --plan run reads the latencies measured by earlier runs from the --metrics directory instead
+    if (args.metrics or args.profile) and not args.plan:
+        timetable_metrics.enable(profile=args.profile)
     try:
-        event = service.events().insert(calendarId=calendar_id, body=event).execute()
-        print(f"-> {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
-    except HttpError as err:
-        logging.error(f"HTTP error occurred while creating event: {err.content}")
+        run(args)
+    finally:
+        if timetable_metrics.enabled():
+            timetable_metrics.export(args.metrics or timetable_metrics.DEFAULT_DIRECTORY)
+
+def run(args):
+    """
+    Authenticate and sync the pasted schedule or the --file roster, or export it with --ics.
+    """
+    if args.ics:
+        with timetable_metrics.phase('export ics'):
+            export_ics(args)
+        return
 
-def main():
-    creds = authenticate_google()
+    with timetable_metrics.phase('auth'):
+        creds = authenticate_google(SCOPES)
 
     if not creds:
         return
 
-    calendar_service = build('calendar', 'v3', credentials=creds)
-
-    print("Paste your schedule:")
-    input_data = ""
-    while True:
-        line = sys.stdin.readline().strip()
-        if not line:
-            break
-        input_data += line + "\n"
-        if "NO REPLY" in line:
-            print("Detected 'NO REPLY'. Stopping further input processing.")
-            break
+    configure_executor(creds, max_workers=args.workers)
+    # Built on first use, after the schedule has been read
+    calendar_service = LazyService('calendar', 'v3', creds)
 
-    print(f"Input data received:\n{input_data}")
+    if args.file:
+        # Parsing and syncing are interleaved in bulk mode, so they are timed as one phase
+        with timetable_metrics.phase('sync file'):
+            sync_file(calendar_service, args)
+        return
 
-    schedule = parse_schedule(input_data)
+    print("Paste your schedule:")
+    with timetable_metrics.phase('parse', profile=True):
+        schedule = list(iter_schedule(read_pasted_lines(sys.stdin)))
     print(f"\nParsed schedule: {schedule}\n")
 
     if not schedule:
         print("No valid schedule data found.")
         return
 
-    calendar_id = 'primary'
+    if args.plan:
+        plan, reads = plan_calendar(calendar_service, schedule, args)
+        if plan is not None:
+            show_plan(plan, reads, args)
+        return
 
-    for day, start_datetime, end_datetime in schedule:
-        delete_existing_work_events(calendar_service, calendar_id, start_datetime.date())
-        create_event(calendar_service, calendar_id, day, start_datetime, end_datetime)
+    with timetable_metrics.phase('sync calendar'):
+        sync_calendar(calendar_service, schedule, args)
 
 if __name__ == '__main__':
     main()
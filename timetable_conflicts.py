@@ -0,0 +1,187 @@
+# Conflict checks for the timetable scripts.
+# Before a schedule is written, the events already in the target calendar (and any other calendars the shifts
+# should not clash with) are loaded in one range query per calendar into an in-memory interval index. Every
+# shift is then checked in O(log n) for overlaps, duplicates and shifts that run past midnight.
+
+import bisect
+import datetime
+import logging
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+from timetable_sync import LIST_PAGE_SIZE, TIMEZONE, execute, run_concurrently
+
+# Global variables
+BUSY_EVENT_FIELDS = 'items(id,summary,status,transparency,start,end),nextPageToken'
+LONG_EVENT = datetime.timedelta(days=2)  # Longer events (leave, holidays) are kept out of the sorted index
+
+class IntervalIndex:
+    """
+    Index of (start, end, item) intervals for overlap queries.
+    Intervals are kept in a sorted array by start time. An interval overlapping [start, end) must start before
+    end and no earlier than start minus the longest duration in the array, so a query is two binary searches
+    plus the matches. Intervals longer than LONG_EVENT would widen that window for every query, so the few of
+    them are kept in a separate list and scanned.
+    """
+
+    def __init__(self, intervals=()):
+        short = []
+        self.long = []
+        for start, end, item in intervals:
+            if end - start > LONG_EVENT:
+                self.long.append((start, end, item))
+            else:
+                short.append((start, end, item))
+        short.sort(key=lambda interval: interval[:2])
+        self.starts = [start for start, _, _ in short]
+        self.intervals = short
+        self.max_duration = max((end - start for start, end, _ in short), default=datetime.timedelta(0))
+
+    def __len__(self):
+        return len(self.intervals) + len(self.long)
+
+    def overlapping(self, start, end):
+        """
+        Return the (start, end, item) intervals that overlap [start, end), in start order.
+        """
+        low = bisect.bisect_right(self.starts, start - self.max_duration)
+        high = bisect.bisect_left(self.starts, end)
+        found = [interval for interval in self.intervals[low:high] if interval[1] > start]
+        found += [interval for interval in self.long if interval[0] < end and interval[1] > start]
+        return found
+
+def busy_interval(event):
+    """
+    Return the (start, end) of an event as naive local datetimes. All-day events span whole days.
+    """
+    if 'dateTime' in event['start'] and 'dateTime' in event['end']:
+        start = datetime.datetime.fromisoformat(event['start']['dateTime']).replace(tzinfo=None)
+        end = datetime.datetime.fromisoformat(event['end']['dateTime']).replace(tzinfo=None)
+        return start, end
+    start = datetime.datetime.combine(datetime.date.fromisoformat(event['start']['date']), datetime.time.min)
+    end = datetime.datetime.combine(datetime.date.fromisoformat(event['end']['date']), datetime.time.min)
+    return start, end
+
+def fetch_busy_events(service, calendar_ids, start, end):
+    """
+    Load the events between start and end from every calendar into an IntervalIndex of
+    (start, end, (calendar_id, event)) intervals.
+    Each calendar is read with one paginated range query, and the calendars are read side by side. Cancelled
+    events and events marked as free are left out. Returns the index and the number of HTTP round-trips used.
+    """
+    zone = ZoneInfo(TIMEZONE)
+    time_min = start.replace(tzinfo=zone).isoformat()
+    time_max = end.replace(tzinfo=zone).isoformat()
+    events_resource = service.events()
+
+    def fetch(calendar_id):
+        intervals = []
+        round_trips = 0
+        page_token = None
+        while True:
+            events_result = execute(events_resource.list(calendarId=calendar_id,
+                                                         timeMin=time_min,
+                                                         timeMax=time_max,
+                                                         timeZone=TIMEZONE,
+                                                         singleEvents=True,
+                                                         maxResults=LIST_PAGE_SIZE,
+                                                         fields=BUSY_EVENT_FIELDS,
+                                                         pageToken=page_token))
+            round_trips += 1
+            for event in events_result.get('items', []):
+                if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent' \
+                        or 'start' not in event:
+                    continue
+                event_start, event_end = busy_interval(event)
+                intervals.append((event_start, event_end, (calendar_id, event)))
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                return intervals, round_trips
+
+    results = run_concurrently(fetch, [(calendar_id,) for calendar_id in calendar_ids])
+    intervals = [interval for calendar_intervals, _ in results for interval in calendar_intervals]
+    return IntervalIndex(intervals), sum(round_trips for _, round_trips in results)
+
+def find_conflicts(service, calendar_id, schedule, other_calendar_ids=(), known=None, replaces_work=True):
+    """
+    Check a schedule against itself and against the events in calendar_id and other_calendar_ids.
+    known is an optional set of (start_datetime, end_datetime) shifts already in calendar_id, such as the ones
+    in the calendar mirror. Those were checked when they were written, so they aren't checked against the
+    calendars again, and when every shift is known no events are fetched at all.
+    With replaces_work=False, for syncs such as --upsert that only know the events they created themselves,
+    the 'Work' events in calendar_id are checked like any other event, so one with the same times as a new
+    shift is reported as a 'duplicate'.
+    Returns a list of (kind, entry, other) conflicts and the number of HTTP round-trips used, where kind is:
+      'cross-midnight' - the shift runs past midnight into the next day;
+      'duplicate'      - another shift, or a 'Work' event in another calendar, has exactly the same times;
+      'overlap'        - the shift overlaps another shift or an existing event.
+    other is the clashing schedule entry or (calendar_id, event), or None. The target calendar's own 'Work'
+    events are not conflicts, since the sync itself keeps, moves or deletes them.
+    """
+    shifts = []
+    conflicts = []
+    for entry in schedule:
+        day, start_datetime, end_datetime = entry
+        # The parsers already moved the end of these to the next day, so only report them
+        if end_datetime.date() > start_datetime.date():
+            conflicts.append(('cross-midnight', entry, None))
+        shifts.append((start_datetime, end_datetime, entry))
+    new = [shift for shift in shifts if known is None or (shift[2][1], shift[2][2]) not in known]
+
+    busy, round_trips = IntervalIndex(), 0
+    calendar_ids = [calendar_id] + [other for other in other_calendar_ids if other != calendar_id]
+    if new:
+        first = min(start for start, _, _ in new)
+        last = max(end for _, end, _ in new)
+        try:
+            busy, round_trips = fetch_busy_events(service, calendar_ids, first, last)
+        except HttpError as err:
+            logging.error(f"HTTP error occurred while loading events to check for conflicts: {err.content}")
+
+    own = IntervalIndex((start, end, (position, entry)) for position, (start, end, entry) in enumerate(shifts))
+    for position, (start_datetime, end_datetime, entry) in enumerate(shifts):
+        for other_start, other_end, (other_position, other) in own.overlapping(start_datetime, end_datetime):
+            # Report each pair of shifts once
+            if other_position <= position:
+                continue
+            same = (other_start, other_end) == (start_datetime, end_datetime)
+            conflicts.append(('duplicate' if same else 'overlap', entry, other))
+        if known is not None and (entry[1], entry[2]) in known:
+            continue
+        for other_start, other_end, (other_calendar, event) in busy.overlapping(start_datetime, end_datetime):
+            is_work = event.get('summary') == 'Work'
+            if is_work and other_calendar == calendar_id and replaces_work:
+                continue
+            same = (other_start, other_end) == (start_datetime, end_datetime)
+            conflicts.append(('duplicate' if same and is_work else 'overlap', entry, (other_calendar, event)))
+    return conflicts, round_trips
+
+def describe_conflict(kind, entry, other):
+    """
+    Describe a conflict from find_conflicts in one line.
+    """
+    day, start_datetime, end_datetime = entry
+    shift = f"{day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}"
+    if kind == 'cross-midnight':
+        return f"{shift} runs past midnight and finishes the next day"
+    if len(other) == 2:
+        other_calendar, event = other
+        other_start, other_end = busy_interval(event)
+        what = (f"'{event.get('summary', '(no title)')}' {other_start.strftime('%Y-%m-%d %H:%M')} to "
+                f"{other_end.strftime('%H:%M')} in calendar {other_calendar}")
+    else:
+        other_day, other_start, other_end = other
+        what = f"the shift {other_day}, {other_start.strftime('%Y-%m-%d %H:%M')} to {other_end.strftime('%H:%M')}"
+    if kind == 'duplicate':
+        return f"{shift} duplicates {what}"
+    return f"{shift} overlaps {what}"
+
+def print_conflicts(conflicts):
+    """
+    Print the conflicts found by find_conflicts, one per line.
+    """
+    if not conflicts:
+        print("No conflicts with existing events.")
+        return
+    print(f"Found {len(conflicts)} conflict(s):")
+    for kind, entry, other in conflicts:
+        print(f"  {kind}: {describe_conflict(kind, entry, other)}")
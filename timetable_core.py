@@ -0,0 +1,404 @@
+# Shared core of timetable-docs.py and timetable-input.py.
+# Authentication, the single-shift Calendar helpers, and the conflict check, sync and plan steps and command
+# line options used by both scripts, which only differ in where the schedule comes from.
+# Credentials are kept in a process-wide cache, one per token file, and refreshed a few minutes before they
+# expire rather than after.
+# Token files are replaced atomically under a lock file, so several runs sharing a token don't all hit the
+# token endpoint at once and a run that is killed mid-write never leaves a half-written pickle behind.
+
+import contextlib
+import datetime
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from googleapiclient.errors import HttpError
+import timetable_metrics
+import timetable_sync
+from timetable_conflicts import find_conflicts, print_conflicts
+from timetable_sync import (EVENT_INDEX_PATH, JOURNAL_PATH, MAX_WORKERS, MIRROR_PATH, TIMEZONE, estimate_plan, execute,
+                            fetch_work_events, indexed_shift_times, iter_schedule, mirrored_shift_times,
+                            open_event_index, open_journal, open_mirror, plan_reconcile, plan_upsert, print_plan,
+                            reconcile_schedule, record_event, run_concurrently, sync_schedule_batched, upsert_event,
+                            upsert_schedule)
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows, so runs there only coordinate within the process
+    fcntl = None
+
+# Global variables
+TOKEN_PICKLE_PATH = 'token.pickle'
+CREDENTIALS_JSON_PATH = 'credentials.json'
+GOOGLE_API_CREDENTIALS_URL = 'https://developers.google.com/docs/api/quickstart/python'
+REFRESH_MARGIN = datetime.timedelta(minutes=5)  # Refresh access tokens this long before they expire
+USE_BATCH_REQUESTS = True  # Set to False to send one HTTP request per Calendar call
+RECONCILE = True  # Only write the changes needed to match the schedule instead of recreating every day
+USE_MIRROR = True  # Read existing events from a local mirror refreshed with sync tokens instead of listing them
+USE_JOURNAL = True  # Journal reconcile writes so an interrupted sync resumes where it stopped
+CHECK_CONFLICTS = True  # Check shifts against existing events for overlaps and duplicates before writing
+EVENTS_UNREADABLE = "Couldn't read the existing 'Work' events, so nothing was written to the calendar."
+
+_sessions = {}  # Credentials by absolute token path, shared by every caller in the process
+_session_locks = {}  # One lock per token path, so tenants with their own tokens don't wait on each other
+_sessions_lock = threading.Lock()
+
+def session_lock(key):
+    """
+    Return the lock guarding the cached credentials for one token path.
+    """
+    with _sessions_lock:
+        return _session_locks.setdefault(key, threading.Lock())
+
+def needs_refresh(creds):
+    """
+    Return True if the access token has expired or will within REFRESH_MARGIN.
+    google-auth keeps expiry as a naive UTC datetime.
+    """
+    if not creds.valid:
+        return True
+    if creds.expiry is None:
+        return False
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now < REFRESH_MARGIN
+
+@contextlib.contextmanager
+def token_file_lock(token_path):
+    """
+    Hold an exclusive lock on token_path + '.lock' so only one process refreshes or rewrites the token.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(token_path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def load_token(token_path):
+    """
+    Read saved credentials, or return None if the file is missing or can't be read.
+    """
+    if not os.path.exists(token_path):
+        return None
+    try:
+        with open(token_path, 'rb') as token:
+            return pickle.load(token)
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        logging.error(f"Failed to read token file '{token_path}'. Error: {e}")
+        return None
+
+def save_token(creds, token_path):
+    """
+    Write credentials to token_path atomically.
+    The pickle goes to a temporary file in the same directory which then replaces the old one, so readers see
+    either the old token or the new one and never a partial file.
+    """
+    directory = os.path.dirname(os.path.abspath(token_path))
+    handle, temp_path = tempfile.mkstemp(prefix=os.path.basename(token_path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as token:
+            pickle.dump(creds, token)
+            token.flush()
+            os.fsync(token.fileno())
+        os.replace(temp_path, token_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def refresh_credentials(creds, token_path):
+    """
+    Refresh creds ahead of expiry and save them, unless another process already has.
+    Under the token file lock the saved token is read again first. If it was refreshed meanwhile by another
+    run, its access token is copied into creds instead of asking the token endpoint for a new one. creds is
+    updated in place, so executors and services already holding it pick up the new token.
+    """
+    with token_file_lock(token_path):
+        saved = load_token(token_path)
+        if saved is not None and saved.refresh_token == creds.refresh_token and not needs_refresh(saved):
+            creds.token = saved.token
+            creds.expiry = saved.expiry
+            return
+        # Only import the HTTP transport when a refresh is actually needed
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+        save_token(creds, token_path)
+
+def authenticate_google(scopes, token_path=TOKEN_PICKLE_PATH, credentials_path=CREDENTIALS_JSON_PATH,
+                        interactive=True):
+    """
+    Authenticate the user with Google API and return the credentials.
+    This function handles the OAuth2 flow and stores the credentials in a token.pickle file. The credentials
+    are cached for the rest of the process, so calling it again (every poll in --watch mode, say) only touches
+    the token file when the access token is about to expire. A saved token without all of scopes triggers a
+    new login that asks for its scopes as well, so the token keeps working for both scripts.
+    With interactive=False it never opens a browser, and returns None if the saved token can't be used.
+    """
+    key = os.path.abspath(token_path)
+    with session_lock(key):
+        creds = _sessions.get(key) or load_token(token_path)
+        granted = []
+        if creds and creds.scopes is not None and not creds.has_scopes(scopes):
+            granted = list(creds.scopes or [])
+            creds = None
+        if creds and needs_refresh(creds) and creds.refresh_token:
+            try:
+                refresh_credentials(creds, token_path)
+            except Exception as e:
+                logging.error(f"Failed to refresh the token in '{token_path}'. Error: {e}")
+                creds = None
+        if not creds or not creds.valid:
+            _sessions.pop(key, None)
+            if not interactive:
+                logging.error(f"Token file '{token_path}' is missing or can't be refreshed.")
+                return None
+            if not os.path.exists(credentials_path):
+                logging.error(f"Credentials file '{credentials_path}' not found.")
+                logging.info(f"Please download credentials.json from {GOOGLE_API_CREDENTIALS_URL}")
+                return None
+            # The OAuth flow modules are slow to import and only needed for an interactive login
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(credentials_path, sorted(set(scopes) | set(granted)))
+            creds = flow.run_local_server(port=0)
+            with token_file_lock(token_path):
+                save_token(creds, token_path)
+        _sessions[key] = creds
+        return creds
+
+def parse_schedule(input_data):
+    """
+    Parse the schedule from the input data.
+    This function extracts the schedule information from the input text and returns a list of tuples containing
+    the day of the week, start datetime, and end datetime for each schedule entry.
+    """
+    return list(iter_schedule(input_data.strip().splitlines()))
+
+def delete_existing_work_events(service, calendar_id, date, existing=None):
+    """
+    Delete existing work events on the specified date.
+    This function removes all events with the summary 'Work' from the Google Calendar on the specified date.
+    If an index from fetch_work_events is passed as existing, it is used instead of querying the calendar.
+    """
+    start_datetime = datetime.datetime.combine(date, datetime.time.min).isoformat() + 'Z'
+    end_datetime = datetime.datetime.combine(date, datetime.time.max).isoformat() + 'Z'
+    try:
+        if existing is not None:
+            # Events already fetched for the whole schedule by fetch_work_events. Pop them so a
+            # second shift on the same day doesn't try to delete them again.
+            events = existing.pop(date, [])
+        else:
+            events_result = execute(service.events().list(calendarId=calendar_id,
+                                                          timeMin=start_datetime,
+                                                          timeMax=end_datetime,
+                                                          singleEvents=True,
+                                                          orderBy='startTime'))
+            events = events_result.get('items', [])
+        for event in events:
+            if event.get('summary') == 'Work':
+                try:
+                    execute(service.events().delete(calendarId=calendar_id, eventId=event['id']))
+                except HttpError as err:
+                    logging.error(f"HTTP error occurred while deleting event: {event.get('summary')} at {event['start'].get('dateTime')}. Error: {err.content}")
+                except Exception as e:
+                    logging.error(f"Failed to delete event: {event.get('summary')} at {event.get('start').get('dateTime')}. Error: {e}")
+    except HttpError as err:
+        logging.error(f"HTTP error occurred while querying events: {err.content}")
+    except Exception as e:
+        logging.error(f"Failed to query events for {date}. Error: {e}")
+
+def create_event(service, calendar_id, day, start_datetime, end_datetime, upsert=False, index=None):
+    """
+    Create a new work event in the calendar.
+    This function adds a new event with the summary 'Work' to the Google Calendar with the specified start and end times.
+    With upsert=True the event gets a deterministic ID and an existing event with that ID is patched instead,
+    so running it twice for the same shift is harmless. The ID is recorded in index when one is given.
+    """
+    if upsert:
+        try:
+            event_id = upsert_event(service, calendar_id, start_datetime, end_datetime)
+            if index is not None:
+                record_event(index, calendar_id, event_id, start_datetime, end_datetime)
+            print(f"-> {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
+        except HttpError as err:
+            logging.error(f"HTTP error occurred while creating event: {err.content}")
+        return
+
+    event = {
+        'summary': 'Work',
+        'start': {
+            'dateTime': start_datetime.isoformat(),
+            'timeZone': TIMEZONE,
+        },
+        'end': {
+            'dateTime': end_datetime.isoformat(),
+            'timeZone': TIMEZONE,
+        },
+    }
+    try:
+        event = execute(service.events().insert(calendarId=calendar_id, body=event))
+        print(f"-> {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
+    except HttpError as err:
+        logging.error(f"HTTP error occurred while creating event: {err.content}")
+
+def check_conflicts(calendar_service, schedule, args):
+    """
+    Check the schedule for overlaps, duplicates and cross-midnight shifts before anything is written, against
+    the target calendar and any --check-calendars. With --upsert the shifts known to the event index are left
+    out of the check, so the calendar is only listed when the schedule has new shifts, and 'Work' events the
+    index doesn't know about are reported as duplicates or overlaps, since the upsert sync won't replace them.
+    Returns whether the sync may go ahead (False only with --strict) and the number of HTTP round-trips used.
+    """
+    upsert = args.upsert and USE_BATCH_REQUESTS
+    with timetable_metrics.phase('check conflicts'):
+        known = None
+        # Shifts already in the calendar were checked when they were written
+        if upsert:
+            index = open_event_index(args.event_index)
+            try:
+                known = indexed_shift_times(index, args.calendar, schedule)
+            finally:
+                index.close()
+        elif USE_MIRROR:
+            mirror = open_mirror(args.mirror)
+            try:
+                known = mirrored_shift_times(mirror, args.calendar, schedule)
+            finally:
+                mirror.close()
+        conflicts, round_trips = find_conflicts(calendar_service, args.calendar, schedule, args.check_calendars, known,
+                                                replaces_work=not upsert)
+    print_conflicts(conflicts)
+    if conflicts and args.strict:
+        print("Not writing anything because of the conflicts (--strict).")
+        return False, round_trips
+    return True, round_trips
+
+def sync_calendar(calendar_service, schedule, args):
+    """
+    Write the parsed schedule to the calendar.
+    This function picks the sync strategy from the settings and command line options.
+    Returns False if some journaled changes are still waiting to be sent, the existing events couldn't be read
+    (nothing is written then), or --strict found conflicts.
+    """
+    calendar_id = args.calendar
+    ok, check_round_trips = check_conflicts(calendar_service, schedule, args) if CHECK_CONFLICTS else (True, 0)
+    if not ok:
+        return False
+    if args.upsert and USE_BATCH_REQUESTS:
+        with contextlib.closing(open_event_index(args.event_index)) as index:
+            round_trips = upsert_schedule(calendar_service, calendar_id, schedule, index)
+        print(f"Calendar sync used {check_round_trips + round_trips} HTTP round-trip(s).")
+        return True
+
+    mirror = open_mirror(args.mirror) if USE_MIRROR else None
+    journal = open_journal(args.journal) if USE_JOURNAL and RECONCILE else None
+    try:
+        if RECONCILE:
+            round_trips, pending = reconcile_schedule(calendar_service, calendar_id, schedule, mirror, journal)
+            print(f"Calendar sync used {check_round_trips + round_trips} HTTP round-trip(s).")
+            if pending is None:
+                print(EVENTS_UNREADABLE)
+                return False
+            if pending:
+                print(f"{pending} change(s) couldn't be sent. They will be resumed on the next run.")
+                return False
+        elif USE_BATCH_REQUESTS:
+            round_trips = sync_schedule_batched(calendar_service, calendar_id, schedule, mirror)
+            if round_trips is None:
+                print(EVENTS_UNREADABLE)
+                return False
+            print(f"Calendar sync used {check_round_trips + round_trips} HTTP round-trip(s).")
+        else:
+            existing, _ = fetch_work_events(calendar_service, calendar_id, schedule, mirror)
+            if existing is None:
+                print(EVENTS_UNREADABLE)
+                return False
+
+            def sync_entry(day, start_datetime, end_datetime):
+                delete_existing_work_events(calendar_service, calendar_id, start_datetime.date(), existing)
+                create_event(calendar_service, calendar_id, day, start_datetime, end_datetime, upsert=args.upsert)
+
+            # Entries don't depend on each other, so they run side by side on the executor's thread pool
+            run_concurrently(sync_entry, schedule)
+    finally:
+        if mirror is not None:
+            mirror.close()
+        if journal is not None:
+            journal.close()
+    return True
+
+def plan_calendar(calendar_service, schedule, args):
+    """
+    Work out the calendar writes sync_calendar would make, without making any.
+    Returns the plan and the read calls made to build it. The plan is None if the existing events couldn't be
+    read.
+    """
+    check_round_trips = check_conflicts(calendar_service, schedule, args)[1] if CHECK_CONFLICTS else 0
+    calendar_id = args.calendar
+    if args.upsert and USE_BATCH_REQUESTS:
+        reads = {'calendar.events.list': check_round_trips} if check_round_trips else {}
+        with contextlib.closing(open_event_index(args.event_index)) as index:
+            return plan_upsert(calendar_id, schedule, index), reads
+
+    mirror = open_mirror(args.mirror) if USE_MIRROR else None
+    try:
+        existing, round_trips = fetch_work_events(calendar_service, calendar_id, schedule, mirror)
+    finally:
+        if mirror is not None:
+            mirror.close()
+    round_trips += check_round_trips
+    reads = {'calendar.events.list': round_trips} if round_trips else {}
+    if existing is None:
+        print("Couldn't read the existing 'Work' events, so no plan was made.")
+        return None, reads
+    if RECONCILE:
+        return plan_reconcile(schedule, existing), reads
+    # Without reconciling, every existing 'Work' event on a scheduled day is replaced
+    plan = [('delete', None, None, None, event) for date in sorted(existing) for event in existing[date]]
+    plan += [('insert', day, start_datetime, end_datetime, None) for day, start_datetime, end_datetime in schedule]
+    return plan, reads
+
+def show_plan(plan, reads, args, document_writes=0):
+    """
+    Print a plan from plan_calendar with its cost estimated from the latencies saved in the --metrics directory.
+    """
+    latencies = timetable_metrics.load_latencies(args.metrics or timetable_metrics.DEFAULT_DIRECTORY)
+    print_plan(plan, estimate_plan(plan, reads, latencies, document_writes=document_writes,
+                                   batched=USE_BATCH_REQUESTS, workers=args.workers))
+
+def add_sync_arguments(parser):
+    """
+    Add the calendar sync options both scripts take to an argparse parser.
+    """
+    parser.add_argument('--upsert', action='store_true',
+                        help="create events with deterministic IDs and skip shifts already in the local event index")
+    parser.add_argument('--mirror', default=MIRROR_PATH,
+                        help="SQLite file holding the local mirror of the calendar (default: %(default)s)")
+    parser.add_argument('--journal', default=JOURNAL_PATH,
+                        help="SQLite file holding the journal used to resume interrupted syncs (default: %(default)s)")
+    parser.add_argument('--plan', action='store_true',
+                        help="only print the calendar changes a sync would make and estimate their cost in "
+                             "round-trips, quota and time from the latencies an earlier run saved in the --metrics "
+                             "directory; nothing is written")
+    parser.add_argument('--batch-size', type=int, default=timetable_sync.BATCH_SIZE,
+                        help="calls per Calendar batch request (default: %(default)s)")
+    parser.add_argument('--check-calendars', nargs='*', default=[], metavar='CALENDAR_ID',
+                        help="other calendars to check the shifts against for overlaps and duplicates")
+    parser.add_argument('--strict', action='store_true',
+                        help="don't write anything if the conflict check finds a problem")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                        help="number of API calls to run at the same time (default: %(default)s)")
+    parser.add_argument('--metrics', metavar='DIR',
+                        help="time every API call and phase and write a JSON summary, a Prometheus textfile "
+                             "and a Chrome trace to DIR")
+    parser.add_argument('--profile', action='store_true',
+                        help="like --metrics, and also save a cProfile of schedule parsing "
+                             f"(default DIR: {timetable_metrics.DEFAULT_DIRECTORY})")
+    parser.add_argument('--calendar', default='primary',
+                        help="ID of the calendar to write the shifts to (default: %(default)s)")
+    parser.add_argument('--event-index', default=EVENT_INDEX_PATH,
+                        help="SQLite file that --upsert keeps its event index in (default: %(default)s)")
+    return parser
@@ -0,0 +1,181 @@
+# Offline roster formats for timetable-input.py.
+# Schedules can be written to an RFC 5545 .ics file instead of being synced through the API, so a large
+# backfill becomes a single import in Google Calendar (Settings > Import & export), and rosters can be read
+# from .ics and CSV files as well as the pasted text format. Everything here streams line by line.
+
+import csv
+import datetime
+import hashlib
+import logging
+import re
+from zoneinfo import ZoneInfo
+from timetable_sync import TIMEZONE
+
+# Global variables
+PRODUCT_ID = '-//timetable//timetable-input//EN'
+UID_DOMAIN = 'timetable'
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+ICS_PROPERTY_PATTERN = re.compile(r'([A-Z-]+)((?:;[^:]*)?):(.*)')
+ICS_DURATION_PATTERN = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+CSV_TIME_FORMATS = ('%H:%M', '%H%M', '%H.%M')
+
+def shift_uid(start_datetime, end_datetime):
+    """
+    Derive a stable UID for a shift, so importing the same shift twice updates it instead of duplicating it.
+    """
+    key = f"{start_datetime.isoformat()}|{end_datetime.isoformat()}"
+    return f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}@{UID_DOMAIN}"
+
+def write_ics(schedule, stream):
+    """
+    Write (day, start_datetime, end_datetime) entries to stream as an iCalendar file of 'Work' events.
+    Local times in TIMEZONE are written as UTC, so the file needs no VTIMEZONE block, and X-WR-TIMEZONE tells
+    calendar apps which zone to show them in. Entries are written as they arrive; returns how many there were.
+    """
+    zone = ZoneInfo(TIMEZONE)
+    utc = datetime.timezone.utc
+    stamp = datetime.datetime.now(utc).strftime('%Y%m%dT%H%M%SZ')
+    stream.write("BEGIN:VCALENDAR\r\n"
+                 "VERSION:2.0\r\n"
+                 f"PRODID:{PRODUCT_ID}\r\n"
+                 "CALSCALE:GREGORIAN\r\n"
+                 "METHOD:PUBLISH\r\n"
+                 f"X-WR-TIMEZONE:{TIMEZONE}\r\n")
+    count = 0
+    for _, start_datetime, end_datetime in schedule:
+        start = start_datetime.replace(tzinfo=zone).astimezone(utc)
+        end = end_datetime.replace(tzinfo=zone).astimezone(utc)
+        stream.write("BEGIN:VEVENT\r\n"
+                     f"UID:{shift_uid(start_datetime, end_datetime)}\r\n"
+                     f"DTSTAMP:{stamp}\r\n"
+                     f"DTSTART:{start.strftime('%Y%m%dT%H%M%SZ')}\r\n"
+                     f"DTEND:{end.strftime('%Y%m%dT%H%M%SZ')}\r\n"
+                     "SUMMARY:Work\r\n"
+                     "END:VEVENT\r\n")
+        count += 1
+    stream.write("END:VCALENDAR\r\n")
+    return count
+
+def unfold_ics(lines):
+    """
+    Join iCalendar continuation lines (ones starting with a space or tab) back onto the line they continue.
+    """
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+def parse_ics_time(parameters, value, zone):
+    """
+    Convert a DTSTART/DTEND value to a naive local datetime in zone, or None for all-day dates.
+    UTC times end in 'Z', zoned times carry a TZID parameter, and anything else is already local.
+    """
+    if 'VALUE=DATE' in parameters.upper() and 'VALUE=DATE-TIME' not in parameters.upper():
+        return None
+    value = value.strip()
+    if len(value) == 8:
+        return None
+    if value.endswith('Z'):
+        moment = datetime.datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=datetime.timezone.utc)
+        return moment.astimezone(zone).replace(tzinfo=None)
+    moment = datetime.datetime.strptime(value, '%Y%m%dT%H%M%S')
+    for parameter in parameters.split(';'):
+        if parameter.upper().startswith('TZID='):
+            tzid = parameter[5:].strip('"')
+            if tzid != zone.key:
+                return moment.replace(tzinfo=ZoneInfo(tzid)).astimezone(zone).replace(tzinfo=None)
+    return moment
+
+def parse_ics_duration(value):
+    """
+    Convert a simple iCalendar DURATION such as PT8H or PT7H30M to a timedelta, or None if it isn't one.
+    """
+    match = ICS_DURATION_PATTERN.match(value.strip())
+    if match is None:
+        return None
+    days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return datetime.timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+def iter_ics(lines):
+    """
+    Read timed events from iCalendar lines and yield (day, start_datetime, end_datetime) tuples in TIMEZONE.
+    Every VEVENT is taken as a shift, whatever its summary, except cancelled and all-day ones. Events are
+    yielded in file order, which for .ics files from other apps isn't necessarily date order.
+    """
+    zone = ZoneInfo(TIMEZONE)
+    event = None
+    for line in unfold_ics(lines):
+        if line == 'BEGIN:VEVENT':
+            event = {}
+            continue
+        if event is None:
+            continue
+        if line == 'END:VEVENT':
+            try:
+                start_datetime = parse_ics_time(*event['DTSTART'], zone) if 'DTSTART' in event else None
+                if start_datetime is None or event.get('STATUS', ('', ''))[1].upper() == 'CANCELLED':
+                    event = None
+                    continue
+                if 'DTEND' in event:
+                    end_datetime = parse_ics_time(*event['DTEND'], zone)
+                else:
+                    duration = parse_ics_duration(event.get('DURATION', ('', ''))[1])
+                    end_datetime = start_datetime + duration if duration is not None else None
+                if end_datetime is None:
+                    logging.error(f"Skipping event at {start_datetime} without a usable end time.")
+                elif end_datetime < start_datetime:
+                    logging.error(f"Skipping event at {start_datetime} that ends before it starts.")
+                else:
+                    yield (WEEKDAY_NAMES[start_datetime.weekday()], start_datetime, end_datetime)
+            except (ValueError, KeyError) as e:
+                logging.error(f"Failed to read event {event.get('UID', ('', '?'))[1]}. Error: {e}")
+            event = None
+            continue
+        match = ICS_PROPERTY_PATTERN.match(line)
+        if match:
+            name, parameters, value = match.groups()
+            event[name] = (parameters, value)
+
+def parse_csv_time(value):
+    """
+    Read a time of day written as HH:MM, HHMM or HH.MM.
+    """
+    value = value.strip()
+    for time_format in CSV_TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, time_format).time()
+        except ValueError:
+            pass
+    raise ValueError(f"unrecognised time '{value}'")
+
+def iter_csv(lines):
+    """
+    Read a CSV roster with date, start and end columns (e.g. 2026-10-19,09:00,17:00) and yield
+    (day, start_datetime, end_datetime) tuples. A header row and blank rows are skipped. A shift ending at or
+    before its start time is taken to finish the next day.
+    """
+    for row in csv.reader(lines):
+        if len(row) < 3 or not row[0].strip():
+            continue
+        try:
+            date = datetime.date.fromisoformat(row[0].strip())
+        except ValueError:
+            if row[0].strip().lower() != 'date':
+                logging.error(f"Failed to parse row: {','.join(row)}. Error: unrecognised date '{row[0]}'")
+            continue
+        try:
+            start_datetime = datetime.datetime.combine(date, parse_csv_time(row[1]))
+            end_datetime = datetime.datetime.combine(date, parse_csv_time(row[2]))
+        except ValueError as e:
+            logging.error(f"Failed to parse row: {','.join(row)}. Error: {e}")
+            continue
+        if end_datetime <= start_datetime:
+            end_datetime += datetime.timedelta(days=1)
+        yield (WEEKDAY_NAMES[date.weekday()], start_datetime, end_datetime)
@@ -0,0 +1,220 @@
+# Instrumentation for the timetable scripts.
+# When enabled, every API call made through timetable_sync.execute() and every timed phase (auth, client
+# builds, parsing, syncing) is recorded, and the records can be exported as a JSON summary, a Prometheus
+# textfile or a Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev).
+
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+
+DEFAULT_DIRECTORY = 'metrics'  # Where --profile writes its files when no --metrics directory is given
+SUMMARY_FILE = 'timetable-metrics.json'
+
+_recorder = None
+_local = threading.local()
+
+class Recorder:
+    """
+    Collects API call and phase records from all threads.
+    """
+
+    def __init__(self, profile=False):
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.calls = []
+        self.phases = []
+        self.profile = profile
+        self.profiles = {}
+
+    def add_call(self, method, start, duration, status, request_bytes, response_bytes, retries):
+        with self.lock:
+            self.calls.append({
+                'method': method,
+                'start': start - self.origin,
+                'seconds': duration,
+                'status': status,
+                'request_bytes': request_bytes,
+                'response_bytes': response_bytes,
+                'retries': retries,
+                'thread': threading.get_ident(),
+            })
+
+    def add_phase(self, name, start, duration):
+        with self.lock:
+            self.phases.append({
+                'name': name,
+                'start': start - self.origin,
+                'seconds': duration,
+                'thread': threading.get_ident(),
+            })
+
+def enable(profile=False):
+    """
+    Start recording. With profile=True, phases timed with phase(name, profile=True) are also run under cProfile.
+    Returns the recorder.
+    """
+    global _recorder
+    _recorder = Recorder(profile)
+    return _recorder
+
+def enabled():
+    return _recorder is not None
+
+@contextlib.contextmanager
+def phase(name, profile=False):
+    """
+    Time a block of code as a named phase, if recording is enabled.
+    With profile=True the block is also profiled when the recorder was enabled with profiling.
+    """
+    if _recorder is None:
+        yield
+        return
+    profiler = cProfile.Profile() if profile and _recorder.profile else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _recorder.profiles[name] = profiler
+        _recorder.add_phase(name, start, time.perf_counter() - start)
+
+class MeteredHttp:
+    """
+    Wraps an httplib2-style HTTP object and counts the bytes and status of each request on this thread.
+    """
+
+    def __init__(self, http):
+        self.http = http
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        resp, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+        _local.request_bytes = getattr(_local, 'request_bytes', 0) + len(uri) + len(body or b'')
+        _local.response_bytes = getattr(_local, 'response_bytes', 0) + len(content or b'')
+        _local.status = resp.status
+        return resp, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+def start_call():
+    """
+    Reset this thread's byte counters before an API call and return its start time.
+    """
+    _local.request_bytes = 0
+    _local.response_bytes = 0
+    _local.status = None
+    return time.perf_counter()
+
+def end_call(method, start, status, retries):
+    """
+    Record an API call started with start_call(). status is used when no HTTP status was seen.
+    """
+    if _recorder is None:
+        return
+    _recorder.add_call(method, start, time.perf_counter() - start, _local.status or status,
+                       _local.request_bytes, _local.response_bytes, retries)
+
+def summary():
+    """
+    Summarise the recorded calls per method and the recorded phases.
+    """
+    methods = {}
+    for call in _recorder.calls:
+        stats = methods.setdefault(call['method'], {
+            'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'request_bytes': 0, 'response_bytes': 0,
+            'retries': 0, 'statuses': {},
+        })
+        stats['calls'] += 1
+        stats['seconds'] += call['seconds']
+        stats['max_seconds'] = max(stats['max_seconds'], call['seconds'])
+        stats['request_bytes'] += call['request_bytes']
+        stats['response_bytes'] += call['response_bytes']
+        stats['retries'] += call['retries']
+        status = str(call['status'])
+        stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+    phases = {}
+    for record in _recorder.phases:
+        phases[record['name']] = phases.get(record['name'], 0.0) + record['seconds']
+    return {'methods': methods, 'phases': phases, 'calls': len(_recorder.calls)}
+
+def write_json(path):
+    with open(path, 'w') as file:
+        json.dump(summary(), file, indent=2)
+
+def write_prometheus(path):
+    """
+    Write the summary in the Prometheus textfile collector format.
+    The file is written under a temporary name and renamed, so the collector never reads half a file.
+    """
+    data = summary()
+    lines = [
+        "# HELP timetable_api_calls_total Google API calls made by the timetable sync.",
+        "# TYPE timetable_api_calls_total counter",
+    ]
+    for method, stats in sorted(data['methods'].items()):
+        for status, count in sorted(stats['statuses'].items()):
+            lines.append(f'timetable_api_calls_total{{method="{method}",status="{status}"}} {count}')
+    metrics = [
+        ('timetable_api_call_seconds_total', 'Time spent in Google API calls, including retries.', 'seconds'),
+        ('timetable_api_retries_total', 'Retries of Google API calls.', 'retries'),
+        ('timetable_api_request_bytes_total', 'Bytes sent to Google APIs.', 'request_bytes'),
+        ('timetable_api_response_bytes_total', 'Bytes received from Google APIs.', 'response_bytes'),
+    ]
+    for name, help_text, key in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for method, stats in sorted(data['methods'].items()):
+            lines.append(f'{name}{{method="{method}"}} {stats[key]}')
+    lines.append("# HELP timetable_phase_seconds Time spent in each phase of the last run.")
+    lines.append("# TYPE timetable_phase_seconds gauge")
+    for name, seconds in sorted(data['phases'].items()):
+        lines.append(f'timetable_phase_seconds{{phase="{name}"}} {seconds}')
+    with open(path + '.tmp', 'w') as file:
+        file.write("\n".join(lines) + "\n")
+    os.replace(path + '.tmp', path)
+
+def write_chrome_trace(path):
+    """
+    Write the phases and API calls as a Chrome trace timeline, one row per thread.
+    """
+    events = []
+    for record in _recorder.phases:
+        events.append({'name': record['name'], 'cat': 'phase', 'ph': 'X', 'pid': 1, 'tid': record['thread'],
+                       'ts': record['start'] * 1e6, 'dur': record['seconds'] * 1e6})
+    for call in _recorder.calls:
+        args = {key: call[key] for key in ('status', 'request_bytes', 'response_bytes', 'retries')}
+        events.append({'name': call['method'], 'cat': 'api', 'ph': 'X', 'pid': 1, 'tid': call['thread'],
+                       'ts': call['start'] * 1e6, 'dur': call['seconds'] * 1e6, 'args': args})
+    with open(path, 'w') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+def export(directory):
+    """
+    Write the JSON summary, Prometheus textfile and Chrome trace into directory, plus a .prof file for every
+    profiled phase (read it with python -m pstats).
+    """
+    os.makedirs(directory, exist_ok=True)
+    write_json(os.path.join(directory, SUMMARY_FILE))
+    write_prometheus(os.path.join(directory, 'timetable.prom'))
+    write_chrome_trace(os.path.join(directory, 'timetable-trace.json'))
+    for name, profiler in _recorder.profiles.items():
+        profiler.dump_stats(os.path.join(directory, f"{name.replace(' ', '-')}.prof"))
+    print(f"Metrics written to {directory}.")
+
+def load_latencies(directory=DEFAULT_DIRECTORY):
+    """
+    Read the mean seconds per call of each API method from the JSON summary an earlier run wrote to directory.
+    Returns an empty dict if there is no summary to read.
+    """
+    try:
+        with open(os.path.join(directory, SUMMARY_FILE), 'r') as file:
+            methods = json.load(file)['methods']
+    except (OSError, ValueError, KeyError):
+        return {}
+    return {method: stats['seconds'] / stats['calls'] for method, stats in methods.items() if stats['calls']}
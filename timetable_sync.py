@@ -0,0 +1,1193 @@
+# Calendar sync helpers shared by timetable-docs.py and timetable-input.py.
+# Instead of one HTTP round-trip per list/delete/insert call, the calls for a whole run are
+# grouped into Calendar batch requests, so a 10-shift fortnight costs a couple of round-trips.
+
+import contextlib
+import datetime
+import hashlib
+import heapq
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+import timetable_metrics
+
+# Global variables
+TIMEZONE = 'Australia/Melbourne'
+BATCH_SIZE = 50  # Google recommends no more than 50 calls in a single Calendar batch request
+LIST_PAGE_SIZE = 2500  # Largest page events.list will return
+WORK_EVENT_FIELDS = 'items(id,summary,start,end),nextPageToken'
+EVENT_INDEX_PATH = 'events.sqlite'  # Maps schedule entries to the event IDs created for them
+MIRROR_PATH = 'calendar-mirror.sqlite'  # Local copy of the calendar's 'Work' events, kept fresh with sync tokens
+JOURNAL_PATH = 'journal.sqlite'  # Write-ahead journal of planned calendar changes, for resuming interrupted syncs
+MIRROR_EVENT_FIELDS = 'items(id,status,summary,start,end,recurrence),nextPageToken,nextSyncToken'
+MAX_WORKERS = 8  # Threads used to run independent API calls at the same time
+REQUESTS_PER_SECOND = 10  # Calendar allows 600 queries per minute per user by default
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5  # Seconds; doubled on every retry, with full jitter
+BACKOFF_MAX = 32
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CHUNK_SIZE = 500  # Schedule entries synced at a time in bulk file mode
+SORT_RUN_SIZE = 100000  # Schedule entries sorted in memory at a time before they are spilled to a temporary file
+DISCOVERY_CACHE_DIR = 'discovery'  # Optional local discovery documents, e.g. discovery/calendar.v3.json
+DEFAULT_CALL_SECONDS = 0.25  # Assumed latency of an API call that no earlier run has measured
+DEFAULT_BATCH_SECONDS = 1.0  # Assumed latency of a batch request that no earlier run has measured
+
+def event_body(start_datetime, end_datetime):
+    """
+    Build the request body for a 'Work' event.
+    """
+    return {
+        'summary': 'Work',
+        'start': {
+            'dateTime': start_datetime.isoformat(),
+            'timeZone': TIMEZONE,
+        },
+        'end': {
+            'dateTime': end_datetime.isoformat(),
+            'timeZone': TIMEZONE,
+        },
+    }
+
+DAY_NAMES = {"Mo": "Monday", "Tu": "Tuesday", "We": "Wednesday", "Th": "Thursday", "Fr": "Friday"}
+WEEKDAYS = {"Mo": 0, "Tu": 1, "We": 2, "Th": 3, "Fr": 4}
+SCHEDULE_PATTERN = re.compile(r'^(Mo|Tu|We|Th|Fr) (\d{1,2})/(\d{1,2}): (\d{2}):(\d{2})->(\d{2}):(\d{2})$')
+
+def iter_schedule(lines, year=None, rollover=False):
+    """
+    Parse schedule lines as they arrive and yield (day, start_datetime, end_datetime) tuples.
+    Each line is matched once and its numbers are read straight from the regex groups. The date is moved
+    forward to the named weekday in one step. Parsing stops at the first line containing 'NO REPLY'.
+    Dates use the current year unless year is given. With rollover=True the year goes up by one whenever the
+    month goes backwards (December to January), so several years of roster history can be read in order.
+    A shift ending at or before its start time is taken to finish the next day, as in iter_csv.
+    """
+    if year is None:
+        year = datetime.date.today().year
+    match_line = SCHEDULE_PATTERN.match
+    last_month = 0
+    for line in lines:
+        line = line.strip()
+        if "NO REPLY" in line:
+            break
+        match = match_line(line)
+        if match is None:
+            continue
+        day, day_of_month, month, start_hour, start_minute, end_hour, end_minute = match.groups()
+        try:
+            month = int(month)
+            if rollover and month < last_month:
+                year += 1
+            last_month = month
+            date = datetime.date(year, month, int(day_of_month))
+            # Adjust for day of the week
+            date += datetime.timedelta(days=(WEEKDAYS[day] - date.weekday()) % 7)
+            start_datetime = datetime.datetime(date.year, date.month, date.day, int(start_hour), int(start_minute))
+            end_datetime = datetime.datetime(date.year, date.month, date.day, int(end_hour), int(end_minute))
+            if end_datetime <= start_datetime:
+                end_datetime += datetime.timedelta(days=1)
+            yield (DAY_NAMES[day], start_datetime, end_datetime)
+        except ValueError as e:
+            logging.error(f"Failed to parse line: {line}. Error: {e}")
+
+def iter_schedule_chunks(schedule, size=CHUNK_SIZE):
+    """
+    Group a stream of schedule entries into lists of about size entries.
+    A day is never split across two chunks, because each chunk is reconciled against the calendar on its own.
+    """
+    chunk = []
+    for entry in schedule:
+        if len(chunk) >= size and entry[1].date() != chunk[-1][1].date():
+            yield chunk
+            chunk = []
+        chunk.append(entry)
+    if chunk:
+        yield chunk
+
+def spill_run(run):
+    """
+    Sort a run of schedule entries by start time and write it to a temporary file, one entry per line.
+    Returns the file, rewound to the start.
+    """
+    run.sort(key=lambda entry: entry[1])
+    file = tempfile.TemporaryFile('w+', encoding='utf-8')
+    for day, start_datetime, end_datetime in run:
+        file.write(f"{day}\t{start_datetime.isoformat()}\t{end_datetime.isoformat()}\n")
+    file.seek(0)
+    return file
+
+def read_run(file):
+    """
+    Yield the schedule entries in a file written by spill_run.
+    """
+    for line in file:
+        day, start, end = line.rstrip('\n').split('\t')
+        yield (day, datetime.datetime.fromisoformat(start), datetime.datetime.fromisoformat(end))
+
+def sort_schedule(schedule, run_size=SORT_RUN_SIZE):
+    """
+    Yield a stream of schedule entries in start time order, holding at most run_size of them in memory.
+    A schedule that fits in one run is sorted in memory. A longer one is sorted run_size entries at a time,
+    each sorted run is spilled to a temporary file, and the runs are merged as the entries are read back.
+    """
+    runs = []
+    try:
+        run = []
+        for entry in schedule:
+            run.append(entry)
+            if len(run) >= run_size:
+                runs.append(spill_run(run))
+                run = []
+        if not runs:
+            run.sort(key=lambda entry: entry[1])
+            yield from run
+            return
+        if run:
+            runs.append(spill_run(run))
+        run = None  # Let the last run go before merging
+        yield from heapq.merge(*(read_run(file) for file in runs), key=lambda entry: entry[1])
+    finally:
+        for file in runs:
+            file.close()
+
+def build_service(name, version, creds):
+    """
+    Build a Google API client without fetching its discovery document over the network.
+    A copy saved in DISCOVERY_CACHE_DIR is used when there is one, otherwise the document bundled with
+    google-api-python-client (static discovery). googleapiclient is imported here so scripts that exit early
+    never pay for it.
+    With creds=None the client has no credentials of its own, so it can be shared by several accounts as long as
+    every request is executed with the account's authorized HTTP object, as ApiExecutor does.
+    """
+    with timetable_metrics.phase(f'build {name} {version}'):
+        from googleapiclient.discovery import build, build_from_document
+        if creds is None:
+            import httplib2
+            auth = {'http': httplib2.Http()}
+        else:
+            auth = {'credentials': creds}
+        path = os.path.join(DISCOVERY_CACHE_DIR, f'{name}.{version}.json')
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                return build_from_document(file.read(), **auth)
+        return build(name, version, static_discovery=True, cache_discovery=False, **auth)
+
+class LazyService:
+    """
+    Stand-in for a Google API client that is only built the first time it is used.
+    Collections such as documents() and events() are also built once and reused: googleapiclient builds a new
+    resource object, docstrings and all, on every call, which costs about 0.1 seconds for the Docs API.
+    """
+
+    def __init__(self, name, version, creds):
+        self.name = name
+        self.version = version
+        self.creds = creds
+        self.service = None
+        self.collections = {}
+        self.lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        with self.lock:
+            if self.service is None:
+                self.service = build_service(self.name, self.version, self.creds)
+            value = getattr(self.service, attr)
+            if attr not in self.service._resourceDesc.get('resources', {}):
+                return value
+            if attr not in self.collections:
+                self.collections[attr] = value()
+            collection = self.collections[attr]
+        return lambda: collection
+
+class TokenBucket:
+    """
+    Rate limiter shared by all worker threads.
+    Tokens refill at rate per second up to capacity, and every API call takes one. Calendar counts each call
+    inside a batch request against the quota on its own, so a batch takes one token per call.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """
+        Block until count tokens are available and take them.
+        A count above the capacity waits for a full bucket and leaves it in debt, so the calls after it wait
+        until the excess has refilled and the average rate still holds.
+        """
+        needed = min(count, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= count
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ApiExecutor:
+    """
+    Runs Google API requests on a bounded thread pool with rate limiting and retries.
+    httplib2 is not thread-safe, so every worker thread sends its requests over its own AuthorizedHttp.
+    """
+
+    def __init__(self, creds, max_workers=MAX_WORKERS, rate=None):
+        self.creds = creds
+        self.limiter = TokenBucket(rate or REQUESTS_PER_SECOND)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.local = threading.local()
+
+    def new_http(self):
+        """
+        Create an authorized HTTP object for one worker thread.
+        """
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        return AuthorizedHttp(self.creds, http=httplib2.Http())
+
+    def http(self):
+        if not hasattr(self.local, 'http'):
+            self.local.http = self.new_http()
+            if timetable_metrics.enabled():
+                self.local.http = timetable_metrics.MeteredHttp(self.local.http)
+        return self.local.http
+
+    def execute(self, request, calls=1):
+        """
+        Execute a request (or batch request of calls calls) on the calling thread's HTTP object.
+        """
+        return execute_with_retry(request, http=self.http(), limiter=self.limiter, calls=calls)
+
+    def map(self, function, items):
+        """
+        Call function(*item) for every item on the thread pool and return the results in order.
+        """
+        def call(item):
+            # Pool threads keep using this executor for the nested execute() calls, even when it isn't the shared one
+            with using_executor(self):
+                return function(*item)
+        return list(self.pool.map(call, items))
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+_executor = None
+_thread_executor = threading.local()
+
+def configure_executor(creds, max_workers=MAX_WORKERS, rate=None):
+    """
+    Set up the shared executor that execute() and run_concurrently() use.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+    _executor = ApiExecutor(creds, max_workers=max_workers, rate=rate)
+    return _executor
+
+@contextlib.contextmanager
+def using_executor(executor):
+    """
+    Route execute() and run_concurrently() on the calling thread through executor instead of the shared one.
+    Multi-tenant runs use this to give every tenant its own credentials, rate limit and HTTP connections.
+    """
+    previous = getattr(_thread_executor, 'executor', None)
+    _thread_executor.executor = executor
+    try:
+        yield executor
+    finally:
+        _thread_executor.executor = previous
+
+def current_executor():
+    """
+    Return the executor for the calling thread: the one set by using_executor(), else the shared one.
+    """
+    return getattr(_thread_executor, 'executor', None) or _executor
+
+def is_retryable(err):
+    """
+    Check whether a failed call is worth retrying: rate limits, server errors and dropped connections.
+    """
+    if isinstance(err, HttpError):
+        if err.resp.status in RETRY_STATUSES:
+            return True
+        return err.resp.status == 403 and b'ratelimitexceeded' in (err.content or b'').lower()
+    return isinstance(err, OSError)
+
+def backoff_delay(attempt):
+    """
+    Return how long to sleep before retry number attempt (0-based), using full jitter.
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def execute_with_retry(request, http=None, limiter=None, calls=1):
+    """
+    Execute a request, retrying rate-limit and server errors with jittered exponential backoff.
+    calls is the number of API calls the request carries, one per call in a batch request, and each attempt
+    takes that many tokens from limiter. The last error is raised once MAX_RETRIES retries have been used up.
+    """
+    # Batch requests have no methodId of their own
+    method = getattr(request, 'methodId', None) or 'batch'
+    start = timetable_metrics.start_call()
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire(calls)
+        try:
+            result = request.execute(http=http)
+            timetable_metrics.end_call(method, start, 200, attempt)
+            return result
+        except (HttpError, OSError) as err:
+            if attempt >= MAX_RETRIES or not is_retryable(err):
+                status = err.resp.status if isinstance(err, HttpError) else 'error'
+                timetable_metrics.end_call(method, start, status, attempt)
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"Retrying API call in {delay:.1f}s after error: {err}")
+            time.sleep(delay)
+            attempt += 1
+
+def execute(request, calls=1):
+    """
+    Execute a request through the shared executor, or directly with retries if none is configured.
+    Every API call in the timetable scripts goes through here instead of calling .execute() itself. A batch
+    request passes the number of calls in it as calls, so the rate limit counts them as the quota does.
+    """
+    executor = current_executor()
+    if executor is not None:
+        return executor.execute(request, calls)
+    return execute_with_retry(request, calls=calls)
+
+def run_concurrently(function, items):
+    """
+    Call function(*item) for every item, on the shared executor's thread pool when one is configured.
+    """
+    executor = current_executor()
+    if executor is not None:
+        return executor.map(function, items)
+    return [function(*item) for item in items]
+
+def execute_batch(service, calls):
+    """
+    Execute a list of (request, callback) pairs through the Calendar batch endpoint.
+    The calls are sent in chunks of BATCH_SIZE and the number of HTTP round-trips used is returned.
+    Each callback receives (request_id, response, exception) for its own call. Calls that fail with a
+    retryable error are sent again in a later batch, and only the final outcome reaches the callback.
+    """
+    round_trips = 0
+    pending = list(calls)
+    attempt = 0
+    while pending:
+        retry = []
+
+        def retrying(request, callback):
+            def wrapper(request_id, response, exception):
+                if exception is not None and attempt < MAX_RETRIES and is_retryable(exception):
+                    retry.append((request, callback))
+                else:
+                    callback(request_id, response, exception)
+            return wrapper
+
+        for i in range(0, len(pending), BATCH_SIZE):
+            batch = service.new_batch_http_request()
+            chunk = pending[i:i + BATCH_SIZE]
+            for request, callback in chunk:
+                batch.add(request, callback=retrying(request, callback))
+            try:
+                execute(batch, calls=len(chunk))
+            except HttpError as err:
+                logging.error(f"HTTP error occurred while executing batch request: {err.content}")
+            round_trips += 1
+
+        pending = retry
+        if pending:
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+    return round_trips
+
+def event_date(event):
+    """
+    Return the local date an event starts on.
+    """
+    start = event['start']
+    return datetime.date.fromisoformat(start.get('dateTime', start.get('date'))[:10])
+
+def open_mirror(path=MIRROR_PATH):
+    """
+    Open the local SQLite mirror of calendars' 'Work' events, creating it if needed.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE IF NOT EXISTS mirror_events (
+                        calendar_id TEXT NOT NULL,
+                        event_id TEXT NOT NULL,
+                        date TEXT NOT NULL,
+                        body TEXT NOT NULL,
+                        PRIMARY KEY (calendar_id, event_id))""")
+    conn.execute("CREATE INDEX IF NOT EXISTS mirror_events_by_date ON mirror_events (calendar_id, date)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS mirror_state (
+                        calendar_id TEXT PRIMARY KEY,
+                        sync_token TEXT NOT NULL,
+                        first_date TEXT)""")
+    # Mirrors made before the window was recorded get the column added, with no window for their calendars
+    if 'first_date' not in {row[1] for row in conn.execute("PRAGMA table_info(mirror_state)")}:
+        conn.execute("ALTER TABLE mirror_state ADD COLUMN first_date TEXT")
+    return conn
+
+def list_changes(service, calendar_id, mirror, sync_token, first_date=None):
+    """
+    Page through events.list and apply every item to the mirror.
+    With a sync token only the events changed since that token are listed, deleted ones included.
+    Without one the calendar is listed from first_date on, or in full if first_date is None.
+    Returns the next sync token and the number of round-trips used.
+    """
+    events_resource = service.events()
+    round_trips = 0
+    page_token = None
+    while True:
+        if sync_token:
+            request = events_resource.list(calendarId=calendar_id, syncToken=sync_token, timeZone=TIMEZONE,
+                                           maxResults=LIST_PAGE_SIZE, fields=MIRROR_EVENT_FIELDS,
+                                           pageToken=page_token)
+        elif first_date is not None:
+            # timeMin can't be sent with a sync token, but the token from a bounded listing still reports
+            # later changes anywhere in the calendar. A day early, so the whole first date is covered in UTC.
+            time_min = datetime.datetime.combine(first_date - datetime.timedelta(days=1), datetime.time.min)
+            request = events_resource.list(calendarId=calendar_id, timeMin=time_min.isoformat() + 'Z',
+                                           timeZone=TIMEZONE, maxResults=LIST_PAGE_SIZE,
+                                           fields=MIRROR_EVENT_FIELDS, pageToken=page_token)
+        else:
+            request = events_resource.list(calendarId=calendar_id, timeZone=TIMEZONE,
+                                           maxResults=LIST_PAGE_SIZE, fields=MIRROR_EVENT_FIELDS,
+                                           pageToken=page_token)
+        events_result = execute(request)
+        round_trips += 1
+        for event in events_result.get('items', []):
+            # Only timed, one-off 'Work' events are ones the sync could have made. Cancelled events and events
+            # renamed to something else drop out of the mirror.
+            if (event.get('status') == 'cancelled' or event.get('summary') != 'Work' or 'recurrence' in event
+                    or 'dateTime' not in event.get('start', {})):
+                mirror.execute("DELETE FROM mirror_events WHERE calendar_id = ? AND event_id = ?",
+                               (calendar_id, event['id']))
+            else:
+                mirror.execute("INSERT OR REPLACE INTO mirror_events VALUES (?, ?, ?, ?)",
+                               (calendar_id, event['id'], event_date(event).isoformat(), json.dumps(event)))
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            return events_result.get('nextSyncToken'), round_trips
+
+def refresh_mirror(service, calendar_id, mirror, first_date=None):
+    """
+    Bring the mirror of a calendar up to date from first_date on.
+    The first refresh lists the calendar from first_date, rather than its whole history. Later ones send the
+    saved sync token, so only the events changed since the last refresh are downloaded. The calendar is
+    listed again from scratch if Google has expired the token (410 Gone), or if first_date is earlier than
+    the mirror reaches back, since events there that haven't changed would never reach it through the token.
+    With first_date=None the whole calendar is mirrored. Returns the number of HTTP round-trips used.
+    """
+    row = mirror.execute("SELECT sync_token, first_date FROM mirror_state WHERE calendar_id = ?",
+                         (calendar_id,)).fetchone()
+    sync_token = row[0] if row else None
+    if row and row[1] is not None and (first_date is None or first_date.isoformat() < row[1]):
+        logging.info(f"The mirror of calendar '{calendar_id}' starts after {first_date}. Doing a full resync.")
+        sync_token = None
+    elif row:
+        # Keep the window the mirror already covers
+        first_date = None if row[1] is None else datetime.date.fromisoformat(row[1])
+    round_trips = 0
+    try:
+        if sync_token:
+            try:
+                sync_token, round_trips = list_changes(service, calendar_id, mirror, sync_token)
+            except HttpError as err:
+                if err.resp.status != 410:
+                    raise
+                logging.info(f"Sync token for calendar '{calendar_id}' expired. Doing a full resync.")
+                mirror.rollback()
+                sync_token = None
+                round_trips = 1
+        if not sync_token:
+            mirror.execute("DELETE FROM mirror_events WHERE calendar_id = ?", (calendar_id,))
+            sync_token, full_round_trips = list_changes(service, calendar_id, mirror, None, first_date)
+            round_trips += full_round_trips
+        if sync_token:
+            mirror.execute("INSERT OR REPLACE INTO mirror_state VALUES (?, ?, ?)",
+                           (calendar_id, sync_token, first_date.isoformat() if first_date else None))
+        mirror.commit()
+    except Exception:
+        # Leave the mirror as it was after the last complete refresh
+        mirror.rollback()
+        raise
+    return round_trips
+
+def mirrored_work_events(mirror, calendar_id, dates):
+    """
+    Read the mirrored 'Work' events on the given dates, indexed by date like fetch_work_events.
+    """
+    if not dates:
+        return {}
+    wanted = set(dates)
+    rows = mirror.execute("SELECT date, body FROM mirror_events WHERE calendar_id = ? AND date BETWEEN ? AND ? "
+                          "ORDER BY date", (calendar_id, min(dates).isoformat(), max(dates).isoformat()))
+    existing = {}
+    for date, body in rows:
+        date = datetime.date.fromisoformat(date)
+        if date in wanted:
+            existing.setdefault(date, []).append(json.loads(body))
+    for events in existing.values():
+        events.sort(key=lambda event: event['start']['dateTime'])
+    return existing
+
+def mirrored_shift_times(mirror, calendar_id, schedule):
+    """
+    Return the (start_datetime, end_datetime) of the mirrored 'Work' events on the schedule's days, as of the
+    mirror's last refresh.
+    """
+    dates = {start_datetime.date() for _, start_datetime, _ in schedule}
+    existing = mirrored_work_events(mirror, calendar_id, dates)
+    return {event_times(event) for events in existing.values() for event in events}
+
+def fetch_work_events(service, calendar_id, schedule, mirror=None):
+    """
+    Fetch the existing 'Work' events for the whole schedule and index them by date.
+    This function makes one paginated events.list call spanning the first to the last day of the schedule,
+    asking only for the fields the sync needs. With a mirror from open_mirror, the mirror is refreshed
+    incrementally and read instead. Returns the index and the number of HTTP round-trips used. The index is
+    None if the events couldn't all be read, since syncing against a partial index would duplicate shifts.
+    """
+    dates = sorted({start_datetime.date() for _, start_datetime, _ in schedule})
+    if not dates:
+        return {}, 0
+
+    if mirror is not None:
+        try:
+            round_trips = refresh_mirror(service, calendar_id, mirror, dates[0])
+        except HttpError as err:
+            logging.error(f"HTTP error occurred while refreshing the calendar mirror: {err.content}")
+            return None, 0
+        except Exception as e:
+            logging.error(f"Failed to refresh the calendar mirror. Error: {e}")
+            return None, 0
+        return mirrored_work_events(mirror, calendar_id, dates), round_trips
+
+    time_min = datetime.datetime.combine(dates[0], datetime.time.min).isoformat() + 'Z'
+    time_max = datetime.datetime.combine(dates[-1], datetime.time.max).isoformat() + 'Z'
+    wanted = set(dates)
+    existing = {}
+    round_trips = 0
+    page_token = None
+    events_resource = service.events()
+    try:
+        while True:
+            events_result = execute(events_resource.list(calendarId=calendar_id,
+                                                         timeMin=time_min,
+                                                         timeMax=time_max,
+                                                         timeZone=TIMEZONE,
+                                                         q='Work',
+                                                         singleEvents=True,
+                                                         orderBy='startTime',
+                                                         maxResults=LIST_PAGE_SIZE,
+                                                         fields=WORK_EVENT_FIELDS,
+                                                         pageToken=page_token))
+            round_trips += 1
+            for event in events_result.get('items', []):
+                # q is a full-text search, so it also matches titles like 'Work drinks'
+                if event.get('summary') != 'Work':
+                    continue
+                date = event_date(event)
+                if date in wanted:
+                    existing.setdefault(date, []).append(event)
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                break
+    except HttpError as err:
+        logging.error(f"HTTP error occurred while querying events: {err.content}")
+        return None, round_trips
+    except Exception as e:
+        logging.error(f"Failed to query events from {dates[0]} to {dates[-1]}. Error: {e}")
+        return None, round_trips
+    return existing, round_trips
+
+def sync_schedule_batched(service, calendar_id, schedule, mirror=None):
+    """
+    Replace the 'Work' events for every day in the schedule using batch requests.
+    The existing events for all days are fetched with a single range query (or read from the mirror), then all
+    deletes and inserts are sent together. Errors are logged per event, the same as the one-call-at-a-time path.
+    Returns the number of HTTP round-trips used, or None if the existing events couldn't be read, in which
+    case nothing is written.
+    """
+    existing, round_trips = fetch_work_events(service, calendar_id, schedule, mirror)
+    if existing is None:
+        return None
+
+    def on_delete(event):
+        def callback(request_id, response, exception):
+            if isinstance(exception, HttpError):
+                logging.error(f"HTTP error occurred while deleting event: {event.get('summary')} at {event['start'].get('dateTime')}. Error: {exception.content}")
+            elif exception is not None:
+                logging.error(f"Failed to delete event: {event.get('summary')} at {event['start'].get('dateTime')}. Error: {exception}")
+        return callback
+
+    def on_insert(day, start_datetime, end_datetime):
+        def callback(request_id, response, exception):
+            if exception is None:
+                print(f"-> {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
+            elif isinstance(exception, HttpError):
+                logging.error(f"HTTP error occurred while creating event: {exception.content}")
+            else:
+                logging.error(f"Failed to create event: {day} {start_datetime}. Error: {exception}")
+        return callback
+
+    events_resource = service.events()
+    mutation_calls = []
+    for date in sorted(existing):
+        for event in existing[date]:
+            request = events_resource.delete(calendarId=calendar_id, eventId=event['id'])
+            mutation_calls.append((request, on_delete(event)))
+    for day, start_datetime, end_datetime in schedule:
+        request = events_resource.insert(calendarId=calendar_id, body=event_body(start_datetime, end_datetime))
+        mutation_calls.append((request, on_insert(day, start_datetime, end_datetime)))
+    round_trips += execute_batch(service, mutation_calls)
+
+    return round_trips
+
+def event_times(event):
+    """
+    Return the start and end of a timed event as naive local datetimes, or None for all-day events.
+    Events are listed with timeZone=TIMEZONE, so dropping the UTC offset leaves local time.
+    """
+    if 'dateTime' not in event['start'] or 'dateTime' not in event['end']:
+        return None
+    start = datetime.datetime.fromisoformat(event['start']['dateTime']).replace(tzinfo=None)
+    end = datetime.datetime.fromisoformat(event['end']['dateTime']).replace(tzinfo=None)
+    return start, end
+
+def plan_reconcile(schedule, existing):
+    """
+    Work out the smallest set of calendar changes that makes the 'Work' events match the schedule.
+    For each day, shifts that already exist are left alone, moved shifts are patched onto a leftover event,
+    and anything still unmatched is inserted or deleted. Returns the plan as a list of
+    (action, day, start_datetime, end_datetime, event) tuples, where action is 'insert', 'patch',
+    'delete' or 'keep'.
+    """
+    wanted = {}
+    for day, start_datetime, end_datetime in schedule:
+        shifts = wanted.setdefault(start_datetime.date(), [])
+        # A line pasted twice is still one shift
+        if (day, start_datetime, end_datetime) not in shifts:
+            shifts.append((day, start_datetime, end_datetime))
+
+    plan = []
+    for date in sorted(wanted):
+        leftover = []
+        by_times = {}
+        for event in existing.get(date, []):
+            times = event_times(event)
+            if times is None or times in by_times:
+                leftover.append(event)
+            else:
+                by_times[times] = event
+
+        unmatched = []
+        for day, start_datetime, end_datetime in wanted[date]:
+            event = by_times.pop((start_datetime, end_datetime), None)
+            if event is not None:
+                plan.append(('keep', day, start_datetime, end_datetime, event))
+            else:
+                unmatched.append((day, start_datetime, end_datetime))
+
+        # Reuse timed events that no longer match for the moved shifts, in start time order
+        movable = sorted(by_times.items())
+        for (day, start_datetime, end_datetime), (_, event) in zip(unmatched, movable):
+            plan.append(('patch', day, start_datetime, end_datetime, event))
+        for day, start_datetime, end_datetime in unmatched[len(movable):]:
+            plan.append(('insert', day, start_datetime, end_datetime, None))
+        for _, event in movable[len(unmatched):]:
+            leftover.append(event)
+        for event in leftover:
+            plan.append(('delete', None, None, None, event))
+    return plan
+
+def apply_plan(service, calendar_id, plan, on_done=None):
+    """
+    Send the inserts, patches and deletes of a reconcile plan through the Calendar batch endpoint.
+    Kept shifts cost nothing. An insert whose plan entry carries an event with an ID is created under that ID,
+    and a 409 conflict for it means an earlier attempt already created it. If on_done is given, it is called
+    as on_done(position, ok) once each write in the plan has its final outcome. A write that still failed with
+    a rate-limit or server error after every retry has no final outcome yet, so on_done isn't called for it.
+    Returns the number of HTTP round-trips used.
+    """
+    def finished(position, exception):
+        # Transient errors are left for the next run to send again
+        if on_done is not None and (exception is None or not is_retryable(exception)):
+            on_done(position, exception is None)
+
+    def on_write(position, action, day, start_datetime, end_datetime):
+        def callback(request_id, response, exception):
+            if action == 'insert' and isinstance(exception, HttpError) and exception.resp.status == 409 \
+                    and plan[position][4] is not None:
+                exception = None
+            if exception is None:
+                print(f"-> {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
+            elif isinstance(exception, HttpError):
+                verb = 'creating' if action == 'insert' else 'updating'
+                logging.error(f"HTTP error occurred while {verb} event: {exception.content}")
+            else:
+                logging.error(f"Failed to {action} event: {day} {start_datetime}. Error: {exception}")
+            finished(position, exception)
+        return callback
+
+    def on_delete(position, event):
+        def callback(request_id, response, exception):
+            # 404 and 410 mean someone already removed it, which is what we wanted
+            if isinstance(exception, HttpError) and exception.resp.status in (404, 410):
+                exception = None
+            if isinstance(exception, HttpError):
+                logging.error(f"HTTP error occurred while deleting event: {event.get('summary')} at {event['start'].get('dateTime')}. Error: {exception.content}")
+            elif exception is not None:
+                logging.error(f"Failed to delete event: {event.get('summary')} at {event['start'].get('dateTime')}. Error: {exception}")
+            finished(position, exception)
+        return callback
+
+    # Building the events resource parses its discovery description, so do it once rather than per call
+    events_resource = service.events()
+    calls = []
+    for position, (action, day, start_datetime, end_datetime, event) in enumerate(plan):
+        if action == 'insert':
+            body = event_body(start_datetime, end_datetime)
+            if event is not None:
+                body['id'] = event['id']
+            request = events_resource.insert(calendarId=calendar_id, body=body)
+            calls.append((request, on_write(position, action, day, start_datetime, end_datetime)))
+        elif action == 'patch':
+            request = events_resource.patch(calendarId=calendar_id, eventId=event['id'],
+                                            body=event_body(start_datetime, end_datetime))
+            calls.append((request, on_write(position, action, day, start_datetime, end_datetime)))
+        elif action == 'delete':
+            request = events_resource.delete(calendarId=calendar_id, eventId=event['id'])
+            calls.append((request, on_delete(position, event)))
+        else:
+            print(f"== {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')} (unchanged)")
+    return execute_batch(service, calls)
+
+def open_journal(path=JOURNAL_PATH):
+    """
+    Open the write-ahead journal of planned calendar changes, creating it if needed.
+    Every operation is committed on its own, so the journal uses SQLite's WAL mode to keep commits cheap.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        calendar_id TEXT NOT NULL,
+                        schedule_key TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        first_date TEXT,
+                        last_date TEXT)""")
+    # Journals written before jobs had a date span get the columns added, with no span for their old jobs
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column in ('first_date', 'last_date'):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+    conn.execute("""CREATE TABLE IF NOT EXISTS operations (
+                        job_id INTEGER NOT NULL,
+                        seq INTEGER NOT NULL,
+                        action TEXT NOT NULL,
+                        day TEXT,
+                        start TEXT,
+                        end TEXT,
+                        event TEXT,
+                        status TEXT NOT NULL,
+                        PRIMARY KEY (job_id, seq))""")
+    conn.commit()
+    return conn
+
+def schedule_key(schedule):
+    """
+    Fingerprint a schedule, so a restarted run can tell whether it is syncing the same schedule as the
+    interrupted one.
+    """
+    entries = sorted({(start_datetime.isoformat(), end_datetime.isoformat())
+                      for _, start_datetime, end_datetime in schedule})
+    return hashlib.sha1(repr(entries).encode('utf-8')).hexdigest()
+
+def schedule_span(schedule):
+    """
+    Return the first and last dates of a schedule as ISO strings, or (None, None) for an empty schedule.
+    """
+    dates = [start_datetime.date() for _, start_datetime, _ in schedule]
+    if not dates:
+        return None, None
+    return min(dates).isoformat(), max(dates).isoformat()
+
+def open_job(journal, calendar_id, key, span):
+    """
+    Return the ID of the unfinished job for this calendar and schedule, or None if there isn't one.
+    Unfinished jobs for a different schedule on any of the same days are abandoned: a fresh plan against the
+    calendar supersedes them. Jobs for other days are left alone, so each chunk of a bulk --file sync keeps its
+    own job and an interrupted bulk sync resumes every chunk that still has writes pending.
+    span is the (first, last) ISO dates of the schedule, from schedule_span.
+    """
+    first, last = span
+    job_id = None
+    for found_id, found_key in journal.execute("SELECT job_id, schedule_key FROM jobs "
+                                               "WHERE calendar_id = ? AND status = 'open' "
+                                               "AND (first_date IS NULL OR (first_date <= ? AND last_date >= ?))",
+                                               (calendar_id, last, first)):
+        if found_key == key:
+            job_id = found_id
+        else:
+            journal.execute("UPDATE jobs SET status = 'abandoned' WHERE job_id = ?", (found_id,))
+    journal.commit()
+    return job_id
+
+def start_job(journal, calendar_id, key, span, plan):
+    """
+    Record the writes of a reconcile plan in the journal before any of them is sent, and return the job ID.
+    Inserts are given their event IDs here, so sending one again after a crash can't create a duplicate.
+    """
+    cursor = journal.execute("INSERT INTO jobs (calendar_id, schedule_key, status, first_date, last_date) "
+                             "VALUES (?, ?, 'open', ?, ?)", (calendar_id, key) + span)
+    job_id = cursor.lastrowid
+    rows = []
+    for action, day, start_datetime, end_datetime, event in plan:
+        if action == 'keep':
+            continue
+        if action == 'insert':
+            event = {'id': uuid.uuid4().hex}
+        rows.append((job_id, len(rows), action, day,
+                     start_datetime.isoformat() if start_datetime else None,
+                     end_datetime.isoformat() if end_datetime else None,
+                     json.dumps(event), 'pending'))
+    journal.executemany("INSERT INTO operations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    journal.commit()
+    return job_id
+
+def pending_operations(journal, job_id):
+    """
+    Return the writes of a job that haven't been acknowledged yet, as (seq, plan entry) pairs.
+    """
+    rows = journal.execute("SELECT seq, action, day, start, end, event FROM operations "
+                           "WHERE job_id = ? AND status = 'pending' ORDER BY seq", (job_id,))
+    return [(seq, (action, day,
+                   datetime.datetime.fromisoformat(start) if start else None,
+                   datetime.datetime.fromisoformat(end) if end else None,
+                   json.loads(event)))
+            for seq, action, day, start, end, event in rows]
+
+def run_job(service, calendar_id, journal, job_id):
+    """
+    Send a job's pending writes and mark each one in the journal as soon as its outcome is known.
+    Writes rejected by Calendar (4xx errors) are marked 'failed' rather than retried forever. Writes without an
+    outcome, because they ran out of retries on rate-limit or server errors, the batch itself failed or the
+    process died, stay pending for the next run. The job is closed once
+    nothing is pending. Returns the number of HTTP round-trips used and the number of writes still pending.
+    """
+    operations = pending_operations(journal, job_id)
+
+    def on_done(position, ok):
+        journal.execute("UPDATE operations SET status = ? WHERE job_id = ? AND seq = ?",
+                        ('done' if ok else 'failed', job_id, operations[position][0]))
+        journal.commit()
+
+    round_trips = apply_plan(service, calendar_id, [entry for _, entry in operations], on_done)
+    remaining = journal.execute("SELECT COUNT(*) FROM operations WHERE job_id = ? AND status = 'pending'",
+                                (job_id,)).fetchone()[0]
+    if not remaining:
+        journal.execute("UPDATE jobs SET status = 'done' WHERE job_id = ?", (job_id,))
+        journal.commit()
+    return round_trips, remaining
+
+def reconcile_schedule(service, calendar_id, schedule, mirror=None, journal=None):
+    """
+    Bring the calendar in line with the schedule using the minimal insert/patch/delete plan.
+    With a mirror, the plan is made against the mirrored events after an incremental refresh.
+    With a journal, the plan is recorded before it is sent and each write is acknowledged as it completes. If an
+    earlier run for the same schedule was interrupted, only its unacknowledged writes are sent, without
+    querying the calendar again. Returns the number of HTTP round-trips used, including the query for existing
+    events, and the number of journaled writes still pending (always 0 without a journal). The number pending
+    is None if the existing events couldn't be read: the reconcile is abandoned without writing anything, as
+    planning against a partial view of the calendar would insert duplicates.
+    """
+    if journal is None:
+        existing, round_trips = fetch_work_events(service, calendar_id, schedule, mirror)
+        if existing is None:
+            return round_trips, None
+        plan = plan_reconcile(schedule, existing)
+        return round_trips + apply_plan(service, calendar_id, plan), 0
+
+    key = schedule_key(schedule)
+    span = schedule_span(schedule)
+    job_id = open_job(journal, calendar_id, key, span)
+    round_trips = 0
+    if job_id is None:
+        existing, round_trips = fetch_work_events(service, calendar_id, schedule, mirror)
+        if existing is None:
+            return round_trips, None
+        plan = plan_reconcile(schedule, existing)
+        for action, day, start_datetime, end_datetime, event in plan:
+            if action == 'keep':
+                print(f"== {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')} (unchanged)")
+        job_id = start_job(journal, calendar_id, key, span, plan)
+    else:
+        left = len(pending_operations(journal, job_id))
+        print(f"Resuming an interrupted sync with {left} change(s) left.")
+    job_round_trips, remaining = run_job(service, calendar_id, journal, job_id)
+    return round_trips + job_round_trips, remaining
+
+def event_id_for(calendar_id, start_datetime, end_datetime):
+    """
+    Derive a stable event ID for a shift from the calendar, date, start and end.
+    Calendar IDs must use the base32hex alphabet, which lowercase hex digits are part of.
+    """
+    key = f"{calendar_id}|{start_datetime.date().isoformat()}|{start_datetime.isoformat()}|{end_datetime.isoformat()}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def open_event_index(path=EVENT_INDEX_PATH):
+    """
+    Open the local SQLite index of events created by upserts, creating it if needed.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE IF NOT EXISTS events (
+                        calendar_id TEXT NOT NULL,
+                        event_id TEXT NOT NULL,
+                        date TEXT NOT NULL,
+                        start TEXT NOT NULL,
+                        end TEXT NOT NULL,
+                        PRIMARY KEY (calendar_id, event_id))""")
+    conn.execute("CREATE INDEX IF NOT EXISTS events_by_date ON events (calendar_id, date)")
+    return conn
+
+def indexed_event_ids(index, calendar_id, date):
+    """
+    Return the IDs of the indexed events on a date.
+    """
+    rows = index.execute("SELECT event_id FROM events WHERE calendar_id = ? AND date = ?",
+                         (calendar_id, date.isoformat()))
+    return {row[0] for row in rows}
+
+def indexed_shift_times(index, calendar_id, schedule):
+    """
+    Return the (start_datetime, end_datetime) of the indexed events on the schedule's days.
+    """
+    dates = sorted({start_datetime.date().isoformat() for _, start_datetime, _ in schedule})
+    if not dates:
+        return set()
+    rows = index.execute("SELECT date, start, end FROM events WHERE calendar_id = ? AND date BETWEEN ? AND ?",
+                         (calendar_id, dates[0], dates[-1]))
+    wanted = set(dates)
+    return {(datetime.datetime.fromisoformat(start), datetime.datetime.fromisoformat(end))
+            for date, start, end in rows if date in wanted}
+
+def record_event(index, calendar_id, event_id, start_datetime, end_datetime):
+    """
+    Remember that a shift exists in the calendar under event_id.
+    """
+    index.execute("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)",
+                  (calendar_id, event_id, start_datetime.date().isoformat(),
+                   start_datetime.isoformat(), end_datetime.isoformat()))
+    index.commit()
+
+def forget_event(index, calendar_id, event_id):
+    """
+    Drop an event from the index after it has been deleted.
+    """
+    index.execute("DELETE FROM events WHERE calendar_id = ? AND event_id = ?", (calendar_id, event_id))
+    index.commit()
+
+def upsert_event(service, calendar_id, start_datetime, end_datetime):
+    """
+    Insert a 'Work' event under its deterministic ID, or patch it if that ID already exists.
+    An ID that was deleted earlier still exists as a cancelled event, so the patch also sets the status back
+    to confirmed. Returns the event ID; HttpError is raised for anything other than a conflict.
+    """
+    event_id = event_id_for(calendar_id, start_datetime, end_datetime)
+    body = dict(event_body(start_datetime, end_datetime), id=event_id)
+    try:
+        execute(service.events().insert(calendarId=calendar_id, body=body))
+    except HttpError as err:
+        if err.resp.status != 409:
+            raise
+        body = dict(event_body(start_datetime, end_datetime), status='confirmed')
+        execute(service.events().patch(calendarId=calendar_id, eventId=event_id, body=body))
+    return event_id
+
+def plan_upsert(calendar_id, schedule, index):
+    """
+    Work out the writes an upsert sync would make, from the local index alone.
+    Returns a plan in the same form as plan_reconcile: indexed events that dropped off a scheduled day are
+    deleted, shifts already in the index are kept, and the rest are inserted. Every entry's event carries the
+    deterministic event ID.
+    """
+    wanted = {}
+    for day, start_datetime, end_datetime in schedule:
+        event_id = event_id_for(calendar_id, start_datetime, end_datetime)
+        wanted.setdefault(start_datetime.date(), {})[event_id] = (day, start_datetime, end_datetime)
+
+    plan = []
+    for date in sorted(wanted):
+        indexed = indexed_event_ids(index, calendar_id, date)
+        for event_id in sorted(indexed - set(wanted[date])):
+            plan.append(('delete', None, None, None, {'id': event_id}))
+        for event_id, (day, start_datetime, end_datetime) in wanted[date].items():
+            action = 'keep' if event_id in indexed else 'insert'
+            plan.append((action, day, start_datetime, end_datetime, {'id': event_id}))
+    return plan
+
+def upsert_schedule(service, calendar_id, schedule, index):
+    """
+    Sync the schedule using deterministic event IDs and the local index, without listing the calendar.
+    Shifts already in the index cost nothing, new shifts are inserted (falling back to a patch when the ID
+    already exists), and indexed events that dropped off a scheduled day are deleted.
+    Only events created by this function are known to the index. Returns the number of HTTP round-trips used.
+    """
+    conflicts = []
+
+    def on_insert(event_id, day, start_datetime, end_datetime):
+        def callback(request_id, response, exception):
+            if exception is None:
+                record_event(index, calendar_id, event_id, start_datetime, end_datetime)
+                print(f"-> {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
+            elif isinstance(exception, HttpError) and exception.resp.status == 409:
+                conflicts.append((event_id, day, start_datetime, end_datetime))
+            elif isinstance(exception, HttpError):
+                logging.error(f"HTTP error occurred while creating event: {exception.content}")
+            else:
+                logging.error(f"Failed to create event: {day} {start_datetime}. Error: {exception}")
+        return callback
+
+    def on_patch(event_id, day, start_datetime, end_datetime):
+        def callback(request_id, response, exception):
+            if exception is None:
+                record_event(index, calendar_id, event_id, start_datetime, end_datetime)
+                print(f"-> {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
+            elif isinstance(exception, HttpError):
+                logging.error(f"HTTP error occurred while updating event: {exception.content}")
+            else:
+                logging.error(f"Failed to update event: {day} {start_datetime}. Error: {exception}")
+        return callback
+
+    def on_delete(event_id):
+        def callback(request_id, response, exception):
+            # 404 and 410 mean someone already removed it, which is what we wanted
+            if exception is None or (isinstance(exception, HttpError) and exception.resp.status in (404, 410)):
+                forget_event(index, calendar_id, event_id)
+            elif isinstance(exception, HttpError):
+                logging.error(f"HTTP error occurred while deleting event: {event_id}. Error: {exception.content}")
+            else:
+                logging.error(f"Failed to delete event: {event_id}. Error: {exception}")
+        return callback
+
+    events_resource = service.events()
+    calls = []
+    for action, day, start_datetime, end_datetime, event in plan_upsert(calendar_id, schedule, index):
+        if action == 'delete':
+            request = events_resource.delete(calendarId=calendar_id, eventId=event['id'])
+            calls.append((request, on_delete(event['id'])))
+        elif action == 'insert':
+            body = dict(event_body(start_datetime, end_datetime), id=event['id'])
+            request = events_resource.insert(calendarId=calendar_id, body=body)
+            calls.append((request, on_insert(event['id'], day, start_datetime, end_datetime)))
+    round_trips = execute_batch(service, calls)
+
+    calls = []
+    for event_id, day, start_datetime, end_datetime in conflicts:
+        body = dict(event_body(start_datetime, end_datetime), status='confirmed')
+        request = events_resource.patch(calendarId=calendar_id, eventId=event_id, body=body)
+        calls.append((request, on_patch(event_id, day, start_datetime, end_datetime)))
+    round_trips += execute_batch(service, calls)
+
+    return round_trips
+
+def estimate_plan(plan, reads, latencies, document_writes=0, batched=True, workers=MAX_WORKERS):
+    """
+    Estimate what carrying out a plan would cost: HTTP round-trips, quota units and wall time.
+    reads maps the read calls already made while planning (e.g. 'calendar.events.list') to how many were made.
+    latencies maps API methods, and 'batch' for batch requests, to their mean seconds per call as measured by
+    an earlier run (see timetable_metrics.load_latencies); DEFAULT_CALL_SECONDS and DEFAULT_BATCH_SECONDS fill
+    the gaps. Every call inside a batch still counts against the Calendar quota on its own.
+    """
+    def latency(method):
+        return latencies.get(method, DEFAULT_BATCH_SECONDS if method == 'batch' else DEFAULT_CALL_SECONDS)
+
+    writes = {}
+    for action, *_ in plan:
+        if action != 'keep':
+            writes[action] = writes.get(action, 0) + 1
+    write_count = sum(writes.values())
+
+    read_seconds = sum(count * latency(method) for method, count in reads.items())
+    if batched:
+        write_calls = -(-write_count // BATCH_SIZE)
+        write_seconds = write_calls * latency('batch')
+    else:
+        # One request per write, run side by side on the worker pool
+        write_calls = write_count
+        write_seconds = sum(count * latency(f'calendar.events.{action}') for action, count in writes.items()) / workers
+    # The token bucket lets through at most REQUESTS_PER_SECOND calls however fast the API answers, and every
+    # write inside a batch counts as a call of its own
+    write_seconds = max(write_seconds, write_count / REQUESTS_PER_SECOND)
+    document_seconds = document_writes * latency('docs.documents.batchUpdate')
+
+    measured = [method for method in list(reads) + ['batch' if batched else 'calendar.events.insert']
+                if method in latencies]
+    return {
+        'writes': writes,
+        'reads': dict(reads),
+        'round_trips': sum(reads.values()) + write_calls + document_writes,
+        'write_round_trips': write_calls,
+        'quota': {
+            'calendar': sum(count for method, count in reads.items() if method.startswith('calendar.')) + write_count,
+            'docs_read': sum(count for method, count in reads.items() if method.startswith('docs.')),
+            'docs_write': document_writes,
+        },
+        'seconds': read_seconds + write_seconds + document_seconds,
+        'measured': bool(measured),
+    }
+
+def print_plan(plan, estimate):
+    """
+    Print the writes in a plan, one per line, followed by the cost estimate from estimate_plan.
+    """
+    for method, count in estimate['reads'].items():
+        print(f"READ    {method} x{count} (made while planning)")
+    for action, day, start_datetime, end_datetime, event in plan:
+        if action == 'delete':
+            start = event.get('start', {}).get('dateTime', '?')
+            print(f"DELETE  event {event['id']} (starting {start})")
+        elif action == 'patch':
+            print(f"PATCH   event {event['id']} -> {day}, "
+                  f"{start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
+        elif action == 'insert':
+            print(f"INSERT  {day}, {start_datetime.strftime('%Y-%m-%d %H:%M')} to {end_datetime.strftime('%H:%M')}")
+    if estimate['quota']['docs_write']:
+        print(f"UPDATE  docs.documents.batchUpdate x{estimate['quota']['docs_write']} (reset to 'PASTEHERE')")
+
+    writes = estimate['writes']
+    kept = sum(1 for entry in plan if entry[0] == 'keep')
+    print(f"\nPlan: {writes.get('insert', 0)} insert(s), {writes.get('patch', 0)} patch(es), "
+          f"{writes.get('delete', 0)} delete(s), {kept} unchanged.")
+    print(f"HTTP round-trips: {estimate['round_trips']} ({estimate['write_round_trips']} for calendar writes, "
+          f"batch size {BATCH_SIZE}).")
+    quota = estimate['quota']
+    print(f"Quota units: Calendar {quota['calendar']}, Docs {quota['docs_read']} read(s) and "
+          f"{quota['docs_write']} write(s).")
+    if estimate['measured']:
+        source = 'latencies measured by an earlier run'
+    else:
+        source = 'default latencies (run once with --metrics to measure them)'
+    print(f"Estimated wall time: {estimate['seconds']:.1f}s, from {source}.")
+    print("No changes were made.")